@@ -0,0 +1,92 @@
+import argparse
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import requests
+import fmpfetch
+import httpclient
+import responsecache
+
+# Benchmarks the shared FMP fetch engine against the old one-symbol-at-a-time loop
+# using a local stub server, so no API quota is spent.
+
+OLD_REQUEST_DELAY = 0.2  # fixed sleep the loaders used between requests
+
+
+class StubHandler(BaseHTTPRequestHandler):
+    latency = 0.05
+
+    def do_GET(self):
+        time.sleep(self.latency)
+        symbol = self.path.split('?')[0].rsplit('/', 1)[-1]
+        body = json.dumps([{'symbol': symbol, 'date': '2024-12-31'}]).encode()
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+def start_stub_server(latency):
+    StubHandler.latency = latency
+    server = ThreadingHTTPServer(('127.0.0.1', 0), StubHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+def run_sequential(base_url, symbols):
+    start = time.perf_counter()
+    for symbol in symbols:
+        requests.get(f"{base_url}/{symbol}").json()
+        time.sleep(OLD_REQUEST_DELAY)
+    return time.perf_counter() - start
+
+
+def run_engine(base_url, symbols, max_workers, requests_per_minute):
+    # Every request must reach the stub: cache hits would be timed as fetches, and the stub's
+    # responses must never land in the real response cache
+    responsecache.CACHE_ENABLED = False
+    limiter = fmpfetch.TokenBucket(requests_per_minute)
+
+    def fetch(symbol):
+        return fmpfetch.fetch_json(f"{base_url}/{symbol}", symbol, limiter=limiter)
+
+    start = time.perf_counter()
+    results = [data for _, data in fmpfetch.fetch_all(symbols, fetch, max_workers=max_workers)]
+    elapsed = time.perf_counter() - start
+    assert all(results), "stub server returned no data for some symbols"
+    return elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Wall-clock benchmark of the FMP fetch engine against a local stub server.")
+    parser.add_argument('--symbols', type=int, default=200, help="number of symbols to fetch")
+    parser.add_argument('--latency', type=float, default=0.05, help="simulated server latency in seconds")
+    parser.add_argument('--workers', type=int, default=fmpfetch.MAX_WORKERS, help="fetch engine concurrency")
+    parser.add_argument('--rpm', type=int, default=fmpfetch.FMP_REQUESTS_PER_MINUTE, help="rate limit in requests per minute")
+    parser.add_argument('--skip-sequential', action='store_true', help="only time the fetch engine")
+    args = parser.parse_args()
+
+    server = start_stub_server(args.latency)
+    base_url = f"http://127.0.0.1:{server.server_address[1]}/api/v3/profile"
+    symbols = [f"SYM{i}" for i in range(args.symbols)]
+
+    try:
+        if not args.skip_sequential:
+            elapsed = run_sequential(base_url, symbols)
+            print(f"Sequential loop ({OLD_REQUEST_DELAY}s delay): {elapsed:.2f}s for {len(symbols)} symbols")
+        elapsed = run_engine(base_url, symbols, args.workers, args.rpm)
+        print(f"Fetch engine ({args.workers} workers, {args.rpm} req/min): {elapsed:.2f}s for {len(symbols)} symbols")
+        stats = httpclient.connection_stats()
+        print(f"Connections opened: {stats['connections_opened']}, reused: {stats['connections_reused']}")
+    finally:
+        server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,218 @@
+import argparse
+import os
+import random
+import tempfile
+import threading
+import time
+from types import SimpleNamespace
+
+import fmpfetch
+import ordertracker
+import rebalance
+
+# Runs a rebalance against a local fake broker, first the old way (one blocking quote and order
+# at a time, then polling get_order until the sells fill) and then through rebalance.py and the
+# event-driven ordertracker.py, and compares wall time, broker round-trips, peak concurrency and
+# the orders submitted. No broker account is needed.
+
+OLD_POLL_INTERVAL = 5  # seconds the old ensure_all_sells_complete_before_buy slept between get_order sweeps
+
+
+class FakeBroker:
+    """
+    Stands in for the Alpaca trading and data APIs. Every call sleeps `latency` and is recorded with
+    its timing. Orders other than trailing stops fill after about `fill_delay` seconds, and each fill
+    is sent to `tracker` as a trade-update event, like the trade_updates stream.
+    """
+
+    def __init__(self, prices, latency, fill_delay=0.0, tracker=None, seed=0):
+        self.prices = prices
+        self.latency = latency
+        self.fill_delay = fill_delay
+        self.tracker = tracker
+        self.rng = random.Random(seed)
+        self.calls = []  # (method, start, end)
+        self.orders = []
+        self.statuses = {}
+        self.lock = threading.Lock()
+        self.active = 0
+        self.peak = 0
+
+    def _call(self, method):
+        with self.lock:
+            self.active += 1
+            self.peak = max(self.peak, self.active)
+        start = time.perf_counter()
+        time.sleep(self.latency)
+        with self.lock:
+            self.active -= 1
+            self.calls.append((method, start, time.perf_counter()))
+
+    def get_account(self):
+        self._call('get_account')
+        return SimpleNamespace(portfolio_value='100000', cash='20000')
+
+    def get_latest_trade(self, symbol):
+        self._call('get_latest_trade')
+        return SimpleNamespace(price=self.prices[symbol])
+
+    def get_snapshots(self, symbols):
+        self._call('get_snapshots')
+        return {symbol: SimpleNamespace(latest_trade=SimpleNamespace(price=self.prices[symbol])) for symbol in symbols}
+
+    def submit_order(self, **params):
+        self._call('submit_order')
+        with self.lock:
+            self.orders.append(params)
+            order_id = f"order-{len(self.orders)}"
+            self.statuses[order_id] = 'new'
+            delay = self.fill_delay * self.rng.uniform(0.5, 1.5)
+        if params['type'] != 'trailing_stop':
+            threading.Timer(delay, self._fill, (order_id, params)).start()
+        return SimpleNamespace(id=order_id, status='new', **params)
+
+    def _fill(self, order_id, params):
+        with self.lock:
+            self.statuses[order_id] = 'filled'
+        if self.tracker is not None:
+            self.tracker.on_update({'event': 'fill', 'order': {'id': order_id, 'status': 'filled', 'symbol': params['symbol'], 'side': params['side']}})
+
+    def get_order(self, order_id):
+        self._call('get_order')
+        with self.lock:
+            return SimpleNamespace(id=order_id, status=self.statuses[order_id])
+
+    def max_orders_per_second(self):
+        starts = sorted(start for method, start, _ in self.calls if method == 'submit_order')
+        return max((sum(1 for s in starts if first <= s < first + 1) for first in starts), default=0)
+
+
+def synthetic_portfolio(n_positions, n_targets, seed):
+    rng = random.Random(seed)
+    symbols = [f"S{i:03d}" for i in range(n_positions + n_targets)]
+    prices = {symbol: round(rng.uniform(20, 900), 2) for symbol in symbols}
+    positions = {}
+    for symbol in symbols[:n_positions]:
+        price = prices[symbol]
+        positions[symbol] = SimpleNamespace(symbol=symbol, qty=str(round(rng.uniform(0.3, 40), 4)), current_price=str(price),
+                                            avg_entry_price=str(round(price * rng.uniform(0.8, 1.1), 2)),
+                                            market_value=str(round(rng.uniform(100, 9000), 2)))
+    # Half the targets are held already, so both new buys and top-ups are exercised
+    targets = symbols[n_positions // 2:n_positions // 2 + n_targets]
+    top_stocks = [(symbol, rng.uniform(50, 90), rng.uniform(0.1, 2), rng.uniform(0.1, 2)) for symbol in targets]
+    return prices, positions, top_stocks
+
+
+def submitter(broker):
+    def submit(**order):
+        return broker.submit_order(**rebalance.order_params(**order))
+    return submit
+
+
+def sells_to_wait_on(results, sells):
+    return [order.id for order, plan in zip(results, sells) if order is not None and 'trail_percent' not in plan]
+
+
+def poll_until_filled(broker, order_ids):
+    """The old ensure_all_sells_complete_before_buy loop."""
+    all_sells_completed = False
+    while not all_sells_completed:
+        all_sells_completed = True
+        for order_id in order_ids:
+            if broker.get_order(order_id).status not in ['filled', 'canceled']:
+                all_sells_completed = False
+                break
+        if not all_sells_completed:
+            time.sleep(OLD_POLL_INTERVAL)
+
+
+def run_sequential(broker, positions, top_stocks):
+    """The previous swap_stocks flow: two account calls, every order one at a time, polling for sell fills, a quote per buy."""
+    start = time.perf_counter()
+    submit = submitter(broker)
+    total_account_value = float(broker.get_account().portfolio_value)
+    float(broker.get_account().cash)
+    target = total_account_value * 0.812 / len(top_stocks)
+    keep = {symbol for symbol, *_ in top_stocks}
+    sells = rebalance.plan_sells(positions, keep, lambda symbol: 1, lambda gain, beta: min(1 + gain * 0.1 + beta * 0.5, 20))
+    poll_until_filled(broker, sells_to_wait_on([submit(**order) for order in sells], sells))
+    for symbol, core_score, quality_score, growth_score in top_stocks:
+        price = float(broker.get_latest_trade(symbol).price)
+        for order in rebalance.plan_buys([(symbol, core_score, quality_score, growth_score)], positions, target, {symbol: price}):
+            submit(**order)
+    return time.perf_counter() - start
+
+
+def run_executor(broker, positions, top_stocks, max_workers, limiter):
+    """The rebalance.py flow: one account call, one snapshot, the order lists submitted concurrently, woken by sell fill events."""
+    start = time.perf_counter()
+    total_account_value = float(broker.get_account().portfolio_value)
+    target = total_account_value * 0.812 / len(top_stocks)
+    keep = {symbol for symbol, *_ in top_stocks}
+    sells = rebalance.plan_sells(positions, keep, lambda symbol: 1, lambda gain, beta: min(1 + gain * 0.1 + beta * 0.5, 20))
+    prices = rebalance.latest_prices(broker, [symbol for symbol, *_ in top_stocks])
+    buys = rebalance.plan_buys(top_stocks, positions, target, prices)
+    results = rebalance.submit_all(sells, tracked_submitter(broker), max_workers=max_workers, limiter=limiter)
+    broker.tracker.wait(sells_to_wait_on(results, sells), reconcile=broker.get_order)
+    rebalance.submit_all(buys, submitter(broker), max_workers=max_workers, limiter=limiter)
+    return time.perf_counter() - start
+
+
+def tracked_submitter(broker):
+    submit = submitter(broker)
+
+    def submit_and_track(**order):
+        result = submit(**order)
+        broker.tracker.record(result)
+        return result
+    return submit_and_track
+
+
+def replay_matches(record_path, tracker):
+    """Replays the recorded trade updates into a fresh tracker and checks it ends in the same order states."""
+    replayed = ordertracker.OrderTracker()
+    ordertracker.replay_updates(record_path, replayed)
+    return all(replayed.status(order_id) == tracker.status(order_id) for order_id in replayed.orders)
+
+
+def order_key(order):
+    return tuple(sorted(order.items()))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compares the rebalance executor with the sequential order loop on a fake broker.")
+    parser.add_argument('--positions', type=int, default=12, help="positions currently held")
+    parser.add_argument('--targets', type=int, default=10, help="target portfolio size")
+    parser.add_argument('--latency', type=float, default=0.15, help="seconds per fake broker round-trip")
+    parser.add_argument('--fill-delay', type=float, default=2.0, help="average seconds until a sell order fills")
+    parser.add_argument('--workers', type=int, default=rebalance.ORDER_WORKERS)
+    parser.add_argument('--rpm', type=int, default=rebalance.ALPACA_REQUESTS_PER_MINUTE, help="order rate limit per minute")
+    parser.add_argument('--burst', type=int, default=rebalance.ORDER_BURST, help="orders allowed back to back")
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+
+    prices, positions, top_stocks = synthetic_portfolio(args.positions, args.targets, args.seed)
+    record_path = os.path.join(tempfile.mkdtemp(), 'trade_updates.jsonl')
+    results = {}
+    for name in ['sequential', 'executor']:
+        if name == 'sequential':
+            broker = FakeBroker(prices, args.latency, args.fill_delay, seed=args.seed)
+            elapsed = run_sequential(broker, positions, top_stocks)
+        else:
+            broker = FakeBroker(prices, args.latency, args.fill_delay, ordertracker.OrderTracker(record_path), seed=args.seed)
+            elapsed = run_executor(broker, positions, top_stocks, args.workers, fmpfetch.TokenBucket(args.rpm, capacity=args.burst))
+        results[name] = (elapsed, broker)
+        print(f"{name:>10}: {elapsed:6.2f}s, {len(broker.calls)} broker calls, {len(broker.orders)} orders, "
+              f"peak concurrency {broker.peak}, max {broker.max_orders_per_second()} orders in any second")
+
+    sequential, executor = results['sequential'][1], results['executor'][1]
+    same = sorted(map(order_key, sequential.orders)) == sorted(map(order_key, executor.orders))
+    replayed = replay_matches(record_path, executor.tracker)
+    print(f"Same orders submitted: {same}")
+    print(f"Replayed trade updates reproduce the order states: {replayed}")
+    print(f"Speedup: {results['sequential'][0] / results['executor'][0]:.1f}x")
+    raise SystemExit(0 if same and replayed else 1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,140 @@
+import os
+import logging
+from datetime import datetime, timedelta
+
+import numpy as np
+import pandas as pd
+
+try:
+    import pyarrow as pa
+    import pyarrow.compute as pc
+    import pyarrow.parquet as pq
+except ImportError:  # the columnar backend is optional
+    pa = None
+    pc = None
+    pq = None
+
+# Optional columnar copy of technical_data: one Parquet file per symbol, read back with
+# memory mapping and column projection so screening and research need no SQL round-trips.
+
+# Configuration constants
+STORE_DIR = os.environ.get('COLUMNAR_STORE_DIR', os.path.join(os.path.dirname(os.path.abspath(__file__)), 'columnar_store'))
+TECHNICAL_DATA_DIR = os.path.join(STORE_DIR, 'technical_data')
+KEY_COLUMNS = ['symbol', 'date']
+
+
+def available():
+    return pq is not None
+
+
+def _require_pyarrow():
+    if pq is None:
+        raise ImportError("pyarrow is required for the columnar store (pip install pyarrow)")
+
+
+def _symbol_path(symbol):
+    return os.path.join(TECHNICAL_DATA_DIR, f"{symbol}.parquet")
+
+
+def _to_arrow(frame):
+    frame = frame.reset_index(drop=True)
+    frame['date'] = pd.to_datetime(frame['date']).dt.normalize()
+    # technical_data stores FLOAT columns, so float32 keeps the same precision at half the size;
+    # volume is a BIGINT there and stays float64, which holds it exactly
+    float_columns = frame.select_dtypes(include=['float64']).columns.drop('volume', errors='ignore')
+    frame[float_columns] = frame[float_columns].astype(np.float32)
+    # Columns that are entirely NULL (e.g. read back from technical_data) would otherwise get Arrow's null type
+    null_columns = [column for column in frame.columns if frame[column].dtype == object and frame[column].isna().all()]
+    frame[null_columns] = frame[null_columns].astype(np.float32)
+    return pa.Table.from_pandas(frame, preserve_index=False)
+
+
+def _conform(table, schema):
+    """`table` with exactly `schema`'s columns, in order; columns it lacks are null-filled."""
+    return pa.table([table.column(field.name).cast(field.type) if field.name in table.column_names else pa.nulls(table.num_rows, field.type)
+                     for field in schema], schema=schema)
+
+
+def has_symbol(symbol):
+    return os.path.exists(_symbol_path(symbol))
+
+
+def write_symbol(symbol, frame):
+    """
+    Upserts a symbol's indicator rows by date. A stored row for one of the frame's dates takes the
+    frame's values and keeps its stored values in columns the frame does not have, so frames from
+    different column profiles can be written to the same file; columns new to the file are null for
+    the rows stored before them. The file is rewritten atomically so concurrent readers never see a
+    partial file.
+    """
+    _require_pyarrow()
+    os.makedirs(TECHNICAL_DATA_DIR, exist_ok=True)
+    path = _symbol_path(symbol)
+    table = _to_arrow(frame.copy())
+    if os.path.exists(path):
+        existing = pq.read_table(path, memory_map=True)
+        schema = pa.unify_schemas([existing.schema, table.schema], promote_options='permissive').remove_metadata()
+        # Both sides take the merged types first (pandas also infers the date's timestamp unit per frame)
+        existing = _conform(existing, schema)
+        table = _conform(table, pa.schema([schema.field(name) for name in table.column_names]))
+        stored_columns = [name for name in existing.column_names if name not in table.column_names]
+        if stored_columns:
+            table = table.join(existing.select(['date'] + stored_columns), keys='date', join_type='left outer')
+        keep = pc.invert(pc.is_in(existing.column('date'), value_set=table.column('date')))
+        table = pa.concat_tables([existing.filter(keep), _conform(table, schema)])
+    table = table.sort_by('date')
+    tmp_path = f"{path}.tmp"
+    pq.write_table(table, tmp_path, compression='zstd')
+    os.replace(tmp_path, path)
+    logging.info(f"Wrote {table.num_rows} rows for {symbol} to the columnar store.")
+
+
+def _read_table(columns=None, symbols=None, since=None):
+    _require_pyarrow()
+    if not os.path.isdir(TECHNICAL_DATA_DIR):
+        return None
+    if symbols is None:
+        paths = sorted(os.path.join(TECHNICAL_DATA_DIR, name) for name in os.listdir(TECHNICAL_DATA_DIR) if name.endswith('.parquet'))
+    else:
+        paths = [_symbol_path(symbol) for symbol in symbols if os.path.exists(_symbol_path(symbol))]
+    if not paths:
+        return None
+    read_columns = None if columns is None else list(dict.fromkeys(KEY_COLUMNS + list(columns)))
+    filters = [('date', '>=', pd.Timestamp(since))] if since is not None else None
+    tables = [pq.read_table(path, columns=read_columns, filters=filters, memory_map=True) for path in paths]
+    return pa.concat_tables(tables, promote_options='default') if len(tables) > 1 else tables[0]
+
+
+def load(columns=None, symbols=None, last_n_days=None, since=None):
+    """
+    Loads technical_data rows as a DataFrame with only the requested columns.
+    `last_n_days` is a calendar-day window ending today; `symbols=None` reads every symbol.
+    """
+    if last_n_days is not None:
+        since = datetime.now() - timedelta(days=last_n_days)
+    table = _read_table(columns, symbols, since)
+    if table is None:
+        return pd.DataFrame(columns=KEY_COLUMNS + list(columns or []))
+    # split_blocks/self_destruct let pandas take over Arrow's buffers instead of consolidating copies
+    return table.to_pandas(split_blocks=True, self_destruct=True)
+
+
+def load_arrays(columns, symbols=None, last_n_days=None, since=None):
+    """
+    Loads the requested columns as NumPy arrays (plus 'symbol' and 'date'). Columns without nulls
+    are returned as zero-copy views over the memory-mapped Arrow buffers where Arrow allows it.
+    """
+    if last_n_days is not None:
+        since = datetime.now() - timedelta(days=last_n_days)
+    table = _read_table(columns, symbols, since)
+    if table is None:
+        return {column: np.array([]) for column in KEY_COLUMNS + list(columns)}
+    table = table.combine_chunks()
+    arrays = {}
+    for name in table.column_names:
+        column = table.column(name).chunk(0) if table.column(name).num_chunks else table.column(name)
+        try:
+            arrays[name] = column.to_numpy(zero_copy_only=True)
+        except (pa.ArrowInvalid, TypeError):
+            arrays[name] = column.to_numpy(zero_copy_only=False)
+    return arrays
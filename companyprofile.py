@@ -1,8 +1,8 @@
-import requests
-import time
 import mysql.connector
-import random
 import logging
+import fmpfetch
+import dbpool
+import stagedtable
 
 # Setup logging
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
@@ -10,7 +10,8 @@ logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(
 # Configuration constants
 FMP_API_KEY = 'yourapikeyhere'
 FMP_BASE_URL = 'https://financialmodelingprep.com/api/v3/profile'
-REQUEST_DELAY = 0.2  # seconds between requests to prevent hitting API rate limits
+MAX_WORKERS = 8  # Concurrent requests; the overall rate is capped by fmpfetch.FMP_REQUESTS_PER_MINUTE
+BATCH_SIZE = 100  # Symbols per comma-separated profile request
 DAILY_REQUEST_LIMIT = 9999999  # API limit for FinancialModelingPrep or a safe threshold
 RETRY_LIMIT = 5  # Maximum number of retries for API requests
 MYSQL_CONFIG = {
@@ -20,23 +21,10 @@ MYSQL_CONFIG = {
     'database': 'yourdb'
 }
 
-def execute_query(query, data=None):
-    connection = mysql.connector.connect(**MYSQL_CONFIG)
-    cursor = connection.cursor()
-    try:
-        if data is None:
-            cursor.execute(query)
-        else:
-            cursor.execute(query, data)
-            connection.commit()
-    finally:
-        cursor.close()
-        connection.close()
-
-def create_company_profiles_table():
-    execute_query("DROP TABLE IF EXISTS company_profiles")
-    execute_query("""
-        CREATE TABLE company_profiles (
+def create_company_profiles_table(cursor):
+    """Creates company_profiles if needed and returns a staging copy of it (live rows included) to load into."""
+    return stagedtable.create_staging(cursor, 'company_profiles', """
+        CREATE TABLE IF NOT EXISTS {table} (
             symbol VARCHAR(10),
             price FLOAT,
             beta FLOAT,
@@ -75,63 +63,41 @@ def create_company_profiles_table():
             isFund BOOLEAN,
             PRIMARY KEY(symbol)
         )
-    """)
+    """, copy_existing=True)
 
 def fetch_fmp_data(symbol):
-    retry_count = 0
-    backoff_factor = 0.5
-    while retry_count < RETRY_LIMIT:
-        try:
-            url = f"{FMP_BASE_URL}/{symbol}?apikey={FMP_API_KEY}"
-            response = requests.get(url)
-            if response.status_code == 200:
-                data = response.json()
-                if data:
-                    logging.info(f"Data retrieved successfully for {symbol}.")
-                    return data[0]
-                else:
-                    logging.warning(f"No data found for {symbol} on attempt {retry_count + 1}.")
-            else:
-                logging.error(f"HTTP error {response.status_code} for {symbol} on attempt {retry_count + 1}.")
-        except Exception as e:
-            logging.error(f"Exception {e} occurred for {symbol} on attempt {retry_count + 1}.")
-        
-        retry_count += 1
-        sleep_time = backoff_factor * (2 ** retry_count) + random.uniform(0, 1)
-        logging.info(f"Retrying for {symbol} in {sleep_time:.2f} seconds.")
-        time.sleep(sleep_time)
-
-    logging.error(f"All retries exhausted for {symbol}. Giving up.")
+    url = f"{FMP_BASE_URL}/{symbol}?apikey={FMP_API_KEY}"
+    data = fmpfetch.fetch_json(url, symbol, retry_limit=RETRY_LIMIT)
+    if data:
+        return data[0]
     return None
 
+def batch_url(batch):
+    return f"{FMP_BASE_URL}/{','.join(batch)}?apikey={FMP_API_KEY}"
+
 def main():
-    create_company_profiles_table()
-    connection = mysql.connector.connect(**MYSQL_CONFIG)
+    connection = dbpool.connect(MYSQL_CONFIG)
     cursor = connection.cursor()
+    staging = create_company_profiles_table(cursor)
+    columns = set(stagedtable.table_columns(cursor, staging))
     cursor.execute("SELECT symbol FROM stock_symbols")
     symbols = cursor.fetchall()
-    cursor.close()
-    connection.close()
 
-    requests_today = 0
-    for symbol_tuple in symbols:
-        symbol = symbol_tuple[0]
-        if requests_today >= DAILY_REQUEST_LIMIT:
-            logging.info("API request limit reached for today. Stopping further requests.")
-            break
-        data = fetch_fmp_data(symbol)
-        if data:
-            # Wrap each key in backticks to handle reserved keywords correctly
-            fields = [f"`{key}`" for key in data.keys()]
-            placeholders = ', '.join(['%s'] * len(fields))
-            insert_query = f"INSERT INTO company_profiles ({', '.join(fields)}) VALUES ({placeholders})"
-            try:
-                execute_query(insert_query, tuple(data.values()))
-                logging.info(f"Inserted data for {symbol}.")
-            except mysql.connector.Error as err:
-                logging.error(f"Error inserting data for {symbol}: {err}")
-        time.sleep(REQUEST_DELAY)
-        requests_today += 1
+    symbols = fmpfetch.limit_symbols([symbol_tuple[0] for symbol_tuple in symbols], DAILY_REQUEST_LIMIT)
+    rows = [data for symbol, data in fmpfetch.fetch_batched(symbols, batch_url, fetch_fmp_data, batch_size=BATCH_SIZE, max_workers=MAX_WORKERS) if data]
+
+    # Upsert into the staging copy (symbols not fetched this run keep their rows), then swap it in
+    try:
+        stagedtable.upsert_rows(cursor, staging, rows, ['symbol'], columns)
+        stagedtable.prune_symbols(cursor, staging)
+        connection.commit()
+        stagedtable.swap_in(cursor, 'company_profiles')
+        logging.info(f"Upserted {len(rows)} symbols into company_profiles.")
+    except mysql.connector.Error as err:
+        logging.error(f"Error loading company_profiles; the previous table is left in place: {err}")
+    finally:
+        cursor.close()
+        connection.close()
 
 if __name__ == "__main__":
     main()
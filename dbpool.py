@@ -0,0 +1,221 @@
+import logging
+import threading
+import time
+from contextlib import contextmanager
+
+import mysql.connector
+from mysql.connector import errors
+
+# Shared MySQL access layer. One pool per distinct connection config, so scripts (and pipeline
+# stages running in one process) reuse open connections instead of connecting per statement.
+# Pools open connections lazily, only when a checkout finds none idle, so a single-threaded loader
+# holds one connection and a pool only grows to its size under concurrent use. Connections come
+# back to the pool on close(). The helpers batch INSERTs with executemany (sent as one multi-row
+# statement) and use server-side prepared statements for statements executed repeatedly with
+# different parameters.
+
+# Configuration constants
+POOL_SIZE = 8  # most connections a pool opens per config; callers expecting more concurrency pass their own size
+CHECKOUT_TIMEOUT = 60  # seconds to wait for a free connection before raising PoolError
+
+_pools = {}
+_pools_lock = threading.Lock()
+
+
+class _PooledConnection:
+    """A checked-out connection; close() hands it back to its pool instead of disconnecting."""
+
+    def __init__(self, pool, connection):
+        self._pool = pool
+        self._connection = connection
+
+    def __getattr__(self, name):
+        return getattr(self._connection, name)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def close(self):
+        if self._connection is not None:
+            connection, self._connection = self._connection, None
+            self._pool.release(connection)
+
+
+class _Pool:
+
+    def __init__(self, config, size):
+        self.config = config
+        self.size = size
+        self.idle = []  # open connections not checked out
+        self.opened = 0
+        self.checked_out = 0
+        self.lock = threading.Condition()
+        self.stats = {'checkouts': 0, 'waits': 0, 'wait_seconds': 0.0, 'opened': 0, 'peak_in_use': 0, 'statements': 0}
+
+    def in_use(self):
+        return self.checked_out
+
+    def resize(self, size):
+        with self.lock:
+            if size > self.size:
+                self.size = size
+                self.lock.notify_all()
+
+    def checkout(self):
+        start = time.perf_counter()
+        with self.lock:
+            waited = False
+            while not self.idle and self.opened >= self.size:
+                remaining = CHECKOUT_TIMEOUT - (time.perf_counter() - start)
+                if remaining <= 0:
+                    raise errors.PoolError(f"No free connection after {CHECKOUT_TIMEOUT}s ({self.size} in use)")
+                waited = True
+                self.lock.wait(remaining)
+            connection = self.idle.pop() if self.idle else None
+            if connection is None:
+                self.opened += 1
+                self.stats['opened'] += 1
+            self.checked_out += 1
+            self.stats['checkouts'] += 1
+            if waited:
+                self.stats['waits'] += 1
+                self.stats['wait_seconds'] += time.perf_counter() - start
+            self.stats['peak_in_use'] = max(self.stats['peak_in_use'], self.checked_out)
+        try:
+            if connection is None:
+                connection = mysql.connector.connect(**self.config)
+            else:
+                connection.ping(reconnect=True)  # the server may have dropped it while idle
+        except Exception:
+            self._discard(connection)
+            raise
+        return _PooledConnection(self, connection)
+
+    def release(self, connection):
+        try:
+            if connection.in_transaction:
+                connection.rollback()  # the next borrower must not inherit uncommitted work
+        except errors.Error as e:
+            logging.warning(f"Dropping a pooled connection that failed to roll back: {e}")
+            self._discard(connection)
+            return
+        with self.lock:
+            self.checked_out -= 1
+            self.idle.append(connection)
+            self.lock.notify()
+
+    def _discard(self, connection):
+        with self.lock:
+            self.checked_out -= 1
+            self.opened -= 1
+            self.lock.notify()
+        if connection is not None:
+            try:
+                connection.close()
+            except errors.Error:
+                pass
+
+    def count(self, statements):
+        with self.lock:
+            self.stats['statements'] += statements
+
+
+def _pool(config, size=POOL_SIZE):
+    key = tuple(sorted(config.items()))
+    with _pools_lock:
+        if key not in _pools:
+            _pools[key] = _Pool(dict(config), size)
+        pool = _pools[key]
+    pool.resize(size)
+    return pool
+
+
+def connect(config, size=POOL_SIZE):
+    """
+    A pooled connection for `config` (mysql.connector.connect keyword arguments); close() returns it
+    to the pool. `size` caps how many connections the pool may open, e.g. a caller's worker count;
+    the largest size any caller asked for applies.
+    """
+    return _pool(config, size).checkout()
+
+
+@contextmanager
+def cursor(config, prepared=False, commit=False):
+    """Yields a cursor on a pooled connection, committing on success when `commit` and rolling back on error."""
+    pool = _pool(config)
+    connection = pool.checkout()
+    cur = connection.cursor(prepared=True) if prepared else connection.cursor(buffered=True)
+    try:
+        yield cur
+        if commit:
+            connection.commit()
+    except Exception:
+        connection.rollback()
+        raise
+    finally:
+        cur.close()
+        connection.close()
+
+
+def query(config, sql, params=None, prepared=False):
+    """Runs a SELECT and returns all rows."""
+    with cursor(config, prepared=prepared) as cur:
+        cur.execute(sql, params or ())
+        _pool(config).count(1)
+        return cur.fetchall()
+
+
+def execute(config, sql, params=None):
+    """Runs one statement and commits. Returns the affected row count."""
+    with cursor(config, commit=True) as cur:
+        cur.execute(sql, params or ())
+        _pool(config).count(1)
+        return cur.rowcount
+
+
+def executemany(config, sql, rows, prepared=False):
+    """
+    Runs `sql` for every parameter tuple in `rows` in one transaction. A plain INSERT ... VALUES is
+    sent as a single multi-row statement; with `prepared`, the statement is prepared once on the
+    server and executed per row, which suits UPDATE/DELETE and upserts with extra parameters.
+    """
+    rows = list(rows)
+    if not rows:
+        return 0
+    with cursor(config, prepared=prepared, commit=True) as cur:
+        cur.executemany(sql, rows)
+        _pool(config).count(len(rows))
+        return cur.rowcount
+
+
+def sqlalchemy_engine(config):
+    """
+    A SQLAlchemy engine (for pandas read_sql/to_sql) whose connections are checked out of the pool for
+    `config`. NullPool keeps SQLAlchemy from pooling them a second time: closing one hands it back here.
+    """
+    from sqlalchemy import create_engine  # imported here so only the pandas-based loaders need SQLAlchemy
+    from sqlalchemy.pool import NullPool
+    return create_engine('mysql+mysqlconnector://', creator=lambda: connect(config), poolclass=NullPool)
+
+
+def pool_stats():
+    """Per-pool metrics keyed by 'user@host/database'."""
+    stats = {}
+    with _pools_lock:
+        pools = list(_pools.items())
+    for key, pool in pools:
+        config = dict(key)
+        with pool.lock:
+            stats[f"{config.get('user')}@{config.get('host')}/{config.get('database')}"] = {
+                'size': pool.size, 'in_use': pool.in_use(), 'idle': len(pool.idle), **pool.stats}
+    return stats
+
+
+def log_pool_stats():
+    for name, stats in pool_stats().items():
+        logging.info(f"DB pool {name}: {stats['checkouts']} checkouts, {stats['statements']} helper statements, "
+                     f"{stats['opened']} connections opened, peak {stats['peak_in_use']}/{stats['size']} in use, "
+                     f"{stats['waits']} waits ({stats['wait_seconds']:.2f}s)")
@@ -0,0 +1,148 @@
+import csv
+import time
+import logging
+import threading
+import httpclient
+import responsecache
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+# Configuration constants
+FMP_REQUESTS_PER_MINUTE = 300  # Requests per minute allowed by our FinancialModelingPrep plan
+MAX_WORKERS = 8  # Number of concurrent fetch threads
+RETRY_LIMIT = 5  # Maximum number of retries for API requests
+BATCH_SIZE = 100  # Symbols per comma-separated multi-symbol request
+
+
+class TokenBucket:
+    """Thread-safe token-bucket rate limiter.
+
+    Tokens refill continuously at `rate_per_minute`; bursts are capped at `capacity`.
+    """
+
+    def __init__(self, rate_per_minute, capacity=None):
+        self.rate = rate_per_minute / 60.0
+        self.capacity = capacity if capacity is not None else max(1.0, self.rate)
+        self.tokens = self.capacity
+        self.last_refill = time.monotonic()
+        self.lock = threading.Lock()
+
+    def acquire(self):
+        """Blocks until a token is available and consumes it."""
+        while True:
+            with self.lock:
+                now = time.monotonic()
+                self.tokens = min(self.capacity, self.tokens + (now - self.last_refill) * self.rate)
+                self.last_refill = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                wait = (1 - self.tokens) / self.rate
+            time.sleep(wait)
+
+
+# Shared by every loader running in this process
+rate_limiter = TokenBucket(FMP_REQUESTS_PER_MINUTE)
+
+
+def fetch_json(url, symbol, retry_limit=RETRY_LIMIT, limiter=None):
+    """
+    Fetches a JSON list from FMP, served from the on-disk response cache when fresh. Otherwise the
+    request goes over the shared keep-alive session, retrying errors and empty bodies with
+    httpclient's backoff policy; every attempt takes a rate-limiter token.
+    Returns the decoded list, or None if every attempt failed or returned no data.
+    """
+    return responsecache.get_or_fetch(
+        url, lambda: httpclient.get_json(url, symbol, retry_limit=retry_limit, limiter=limiter or rate_limiter), symbol)
+
+
+def fetch_all(symbols, fetch_fn, max_workers=MAX_WORKERS):
+    """
+    Runs fetch_fn(symbol) for every symbol on a bounded thread pool.
+    Yields (symbol, result) pairs in completion order so callers can write results as they arrive.
+    """
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        futures = {executor.submit(fetch_fn, symbol): symbol for symbol in symbols}
+        for future in as_completed(futures):
+            symbol = futures[future]
+            try:
+                yield symbol, future.result()
+            except Exception as e:
+                logging.error(f"Fetch failed for {symbol}: {e}")
+                yield symbol, None
+    httpclient.log_connection_stats()
+
+
+def fetch_batched(symbols, batch_url, fetch_fn, batch_size=BATCH_SIZE, max_workers=MAX_WORKERS):
+    """
+    Fetches symbols through a multi-symbol endpoint: batch_url(batch) returns the URL for a list of
+    symbols, whose response holds one row per symbol with a 'symbol' key. Symbols missing from their
+    batch response fall back to fetch_fn(symbol). Yields (symbol, row) pairs like fetch_all.
+    """
+    batches = [tuple(symbols[i:i + batch_size]) for i in range(0, len(symbols), batch_size)]
+
+    def fetch_batch(batch):
+        return fetch_json(batch_url(batch), f"{batch[0]}..{batch[-1]} ({len(batch)} symbols)")
+
+    missing = []
+    for batch, rows in fetch_all(batches, fetch_batch, max_workers=max_workers):
+        found = {row.get('symbol'): row for row in rows or [] if isinstance(row, dict)}
+        for symbol in batch:
+            if symbol in found:
+                yield symbol, found[symbol]
+            else:
+                missing.append(symbol)
+    if missing:
+        logging.info(f"{len(missing)} symbols missing from batched responses; fetching them one at a time.")
+        yield from fetch_all(missing, fetch_fn, max_workers=max_workers)
+
+
+def fetch_bulk_csv(url, symbols, description=None, retry_limit=RETRY_LIMIT, limiter=None):
+    """
+    Streams a bulk CSV endpoint line by line and keeps only the rows for `symbols`, so the full
+    payload is never held in memory. Empty cells become None.
+    Returns {symbol: row}; {} if the call fails or in cache-only mode.
+    """
+    if responsecache.CACHE_ONLY:
+        return {}
+    wanted = set(symbols)
+    response = httpclient.get(url, description or url, retry_limit=retry_limit, limiter=limiter or rate_limiter, stream=True)
+    if response is None:
+        return {}
+    rows = {}
+    try:
+        response.encoding = 'utf-8'
+        for row in csv.DictReader(response.iter_lines(decode_unicode=True)):
+            symbol = row.get('symbol')
+            if symbol in wanted:
+                rows[symbol] = {key: (value if value != '' else None) for key, value in row.items()}
+    except Exception as e:
+        logging.error(f"Error streaming {description or url} after {len(rows)} rows: {e}")
+    finally:
+        response.close()
+    logging.info(f"Bulk download {description or url} returned {len(rows)} of {len(wanted)} symbols.")
+    return rows
+
+
+def fetch_bulk(symbols, bulk_url, fetch_fn, max_workers=MAX_WORKERS):
+    """
+    Loads symbols from one bulk CSV download, falling back to fetch_fn(symbol) for any symbol the
+    bulk file lacks (or for all of them if the download fails). Yields (symbol, row) pairs like fetch_all.
+    """
+    rows = fetch_bulk_csv(bulk_url, symbols)
+    missing = []
+    for symbol in symbols:
+        if symbol in rows:
+            yield symbol, rows[symbol]
+        else:
+            missing.append(symbol)
+    if missing:
+        logging.info(f"{len(missing)} symbols missing from the bulk download; fetching them one at a time.")
+        yield from fetch_all(missing, fetch_fn, max_workers=max_workers)
+
+
+def limit_symbols(symbols, daily_request_limit):
+    """Caps the symbol list at the daily request limit, logging when it truncates."""
+    if len(symbols) > daily_request_limit:
+        logging.info("API request limit reached for today. Stopping further requests.")
+        return symbols[:daily_request_limit]
+    return symbols
@@ -0,0 +1,103 @@
+import requests
+from requests.adapters import HTTPAdapter
+import time
+import random
+import logging
+import threading
+
+# Configuration constants
+POOL_CONNECTIONS = 4  # Number of per-host connection pools to keep alive
+POOL_MAXSIZE = 16  # Maximum open connections per host; callers block when all are busy
+REQUEST_TIMEOUT = 30  # seconds
+RETRY_LIMIT = 5  # Maximum number of attempts per request
+BACKOFF_FACTOR = 0.5  # Base for the exponential backoff between retries
+
+_session = None
+_session_lock = threading.Lock()
+
+
+def get_session():
+    """Returns the process-wide keep-alive session, creating it on first use."""
+    global _session
+    with _session_lock:
+        if _session is None:
+            adapter = HTTPAdapter(pool_connections=POOL_CONNECTIONS, pool_maxsize=POOL_MAXSIZE, pool_block=True)
+            session = requests.Session()
+            session.mount('https://', adapter)
+            session.mount('http://', adapter)
+            session.headers.update({'Accept-Encoding': 'gzip, deflate', 'Connection': 'keep-alive'})
+            _session = session
+        return _session
+
+
+def connection_stats():
+    """Returns counters for connections opened vs reused across all pooled hosts."""
+    stats = {'requests': 0, 'connections_opened': 0, 'connections_reused': 0}
+    if _session is None:
+        return stats
+    seen = set()
+    for adapter in _session.adapters.values():
+        if id(adapter) in seen:
+            continue
+        seen.add(id(adapter))
+        for key in list(adapter.poolmanager.pools.keys()):
+            pool = adapter.poolmanager.pools.get(key)
+            if pool is None:
+                continue
+            stats['requests'] += pool.num_requests
+            stats['connections_opened'] += pool.num_connections
+    stats['connections_reused'] = stats['requests'] - stats['connections_opened']
+    return stats
+
+
+def log_connection_stats():
+    stats = connection_stats()
+    logging.info(f"HTTP requests: {stats['requests']}, connections opened: {stats['connections_opened']}, reused: {stats['connections_reused']}")
+
+
+def _request(url, description, retry_limit, limiter, parse_json, retry_on_empty, stream=False):
+    description = description or url
+    session = get_session()
+    attempt = 0
+    while attempt < retry_limit:
+        if limiter is not None:
+            limiter.acquire()
+        try:
+            response = session.get(url, timeout=REQUEST_TIMEOUT, stream=stream)
+            if response.status_code == 200:
+                data = response.json() if parse_json else None
+                if not retry_on_empty or data:
+                    logging.info(f"Data retrieved successfully for {description}.")
+                    return response, data
+                logging.warning(f"No data found for {description} on attempt {attempt + 1}.")
+            else:
+                logging.error(f"HTTP error {response.status_code} for {description} on attempt {attempt + 1}.")
+                response.close()
+        except Exception as e:
+            logging.error(f"Exception {e} occurred for {description} on attempt {attempt + 1}.")
+
+        attempt += 1
+        if attempt < retry_limit:
+            sleep_time = BACKOFF_FACTOR * (2 ** attempt) + random.uniform(0, 1)
+            logging.info(f"Retrying for {description} in {sleep_time:.2f} seconds.")
+            time.sleep(sleep_time)
+
+    logging.error(f"All retries exhausted for {description}. Giving up.")
+    return None, None
+
+
+def get(url, description=None, retry_limit=RETRY_LIMIT, limiter=None, stream=False):
+    """
+    GET with the shared retry policy: exponential backoff with jitter on connection errors
+    and non-200 responses. `limiter` is acquired before every attempt.
+    With `stream=True` the body is not read up front; the caller must close the response.
+    Returns the response, or None once all attempts have failed.
+    """
+    response, _ = _request(url, description, retry_limit, limiter, parse_json=False, retry_on_empty=False, stream=stream)
+    return response
+
+
+def get_json(url, description=None, retry_limit=RETRY_LIMIT, limiter=None, retry_on_empty=True):
+    """Like get(), but returns the decoded JSON body and by default also retries empty bodies."""
+    _, data = _request(url, description, retry_limit, limiter, parse_json=True, retry_on_empty=retry_on_empty)
+    return data
@@ -0,0 +1,179 @@
+import numpy as np
+import talib
+
+# Declarative indicator registry for technicaldata.py. Every technical_data column is declared once
+# as a node over input series; the engine resolves the nodes a caller asks for, computing each
+# distinct (function, inputs, params) call once per series set so shared intermediates such as
+# BBANDS, MACD or the Ichimoku rolling max/min are reused instead of recomputed.
+
+
+def ta(function, *inputs, output=None, **params):
+    """
+    Declares a node: `function` applied to `inputs` with `params`. Inputs are series names (a price
+    field or another declared column) or nested nodes. `output` picks one result of a multi-output
+    function. Functions are talib names or keys of CUSTOM_FUNCTIONS.
+    """
+    return (function, inputs, tuple(sorted(params.items())), output)
+
+
+CUSTOM_FUNCTIONS = {
+    'SHIFT': lambda series, periods: series.shift(periods),
+    'ROLLING_MIN': lambda series, window: series.rolling(window=window).min(),
+    'ROLLING_MAX': lambda series, window: series.rolling(window=window).max(),
+    'MEAN': lambda first, second: (first + second) / 2,
+    'PCT_DIFF': lambda price, average: (price - average) / average * 100,
+    'PERCENT_B': lambda close, upper, lower: (close - lower) / (upper - lower),
+    'VWAP': lambda high, low, close, volume: np.cumsum(volume * ((high + low + close) / 3)) / np.cumsum(volume),
+}
+
+
+def ichimoku(high, low, close):
+    """Ichimoku lines over the given high/low series, sharing the tenkan and kijun nodes with senkou_span_a."""
+    return {
+        'tenkan_sen': ta('MEAN', ta('MAX', high, timeperiod=9), ta('MIN', low, timeperiod=9)),
+        'kijun_sen': ta('MEAN', ta('MAX', high, timeperiod=26), ta('MIN', low, timeperiod=26)),
+        'senkou_span_a': ta('MEAN', 'tenkan_sen', 'kijun_sen'),
+        'senkou_span_b': ta('MEAN', ta('MAX', high, timeperiod=52), ta('MIN', low, timeperiod=52)),
+        'chikou_span': ta('SHIFT', close, periods=-26),
+    }
+
+
+def moving_averages(function, source, periods):
+    return {f"{function.lower()}_{period}": ta(function, source, timeperiod=period) for period in periods}
+
+
+# Columns computed from a stock's own OHLCV bars
+BASE_INDICATORS = {
+    'open_price': 'open',
+    'high': 'high',
+    'low': 'low',
+    'close': 'close',
+    'volume': 'volume',
+    'sma_volume_10': ta('SMA', 'volume', timeperiod=10),
+    'roc': ta('ROC', 'close', timeperiod=10),
+    'rsi': ta('RSI', 'close', timeperiod=14),
+    'macd': ta('MACD', 'close', fastperiod=12, slowperiod=26, signalperiod=9, output=0),
+    'macd_signal': ta('MACD', 'close', fastperiod=12, slowperiod=26, signalperiod=9, output=1),
+    'macd_hist': ta('MACD', 'close', fastperiod=12, slowperiod=26, signalperiod=9, output=2),
+    'ad': ta('AD', 'high', 'low', 'close', 'volume'),
+    'adosc': ta('ADOSC', 'high', 'low', 'close', 'volume', fastperiod=3, slowperiod=10),
+    'adx': ta('ADX', 'high', 'low', 'close', timeperiod=14),
+    'adxr': ta('ADXR', 'high', 'low', 'close', timeperiod=14),
+    'apo': ta('APO', 'close', fastperiod=12, slowperiod=26, matype=0),
+    'aroon_up': ta('AROON', 'high', 'low', timeperiod=14, output=0),
+    'aroon_down': ta('AROON', 'high', 'low', timeperiod=14, output=1),
+    'aroonosc': ta('AROONOSC', 'high', 'low', timeperiod=14),
+    'atr': ta('ATR', 'high', 'low', 'close', timeperiod=14),
+    'avgprice': ta('AVGPRICE', 'open', 'high', 'low', 'close'),
+    'bbands_upper': ta('BBANDS', 'close', timeperiod=20, nbdevup=2, nbdevdn=2, matype=0, output=0),
+    'bbands_middle': ta('BBANDS', 'close', timeperiod=20, nbdevup=2, nbdevdn=2, matype=0, output=1),
+    'bbands_lower': ta('BBANDS', 'close', timeperiod=20, nbdevup=2, nbdevdn=2, matype=0, output=2),
+    'bop': ta('BOP', 'open', 'high', 'low', 'close'),
+    'cci': ta('CCI', 'high', 'low', 'close', timeperiod=14),
+    'min': ta('MINMAX', 'close', timeperiod=30, output=0),
+    'max': ta('MINMAX', 'close', timeperiod=30, output=1),
+    'cmo': ta('CMO', 'close', timeperiod=14),
+    'correl': ta('CORREL', 'high', 'low', timeperiod=30),
+    'dema': ta('DEMA', 'close', timeperiod=30),
+    'dx': ta('DX', 'high', 'low', 'close', timeperiod=14),
+    'ema': ta('EMA', 'close', timeperiod=13),
+    **moving_averages('EMA', 'close', [10, 20, 50, 100, 150, 200]),
+    'kama': ta('KAMA', 'close', timeperiod=30),
+    'ma': ta('MA', 'close', timeperiod=30, matype=0),
+    'mom': ta('MOM', 'close', timeperiod=10),
+    'willr': ta('WILLR', 'high', 'low', 'close', timeperiod=14),
+    'sar': ta('SAR', 'high', 'low', acceleration=0.02, maximum=0.2),
+    'ultosc': ta('ULTOSC', 'high', 'low', 'close', timeperiod1=7, timeperiod2=14, timeperiod3=28),
+    'tsf': ta('TSF', 'close', timeperiod=14),
+    'natr': ta('NATR', 'high', 'low', 'close', timeperiod=14),
+    'obv': ta('OBV', 'close', 'volume'),
+    **ichimoku('high', 'low', 'close'),
+    'stdev': ta('STDDEV', 'close', timeperiod=5),
+    **moving_averages('SMA', 'close', [10, 20, 50, 100, 150, 200]),
+    'roc_sma_50': ta('ROC', 'sma_50', timeperiod=1),
+    'roc_sma_200': ta('ROC', 'sma_200', timeperiod=1),
+    'mfi': ta('MFI', 'high', 'low', 'close', 'volume', timeperiod=14),
+    'vwap': ta('VWAP', 'high', 'low', 'close', 'volume'),
+    'bbands_percent_b': ta('PERCENT_B', 'close', 'bbands_upper', 'bbands_lower'),
+    'prev_close': ta('SHIFT', 'close', periods=1),
+    'macd_prev': ta('SHIFT', 'macd', periods=1),
+    'macd_hist_prev': ta('SHIFT', 'macd_hist', periods=1),
+    'macd_signal_prev': ta('SHIFT', 'macd_signal', periods=1),
+    'pct_diff_50d_sma': ta('PCT_DIFF', 'close', 'sma_50'),
+    'pct_diff_200d_sma': ta('PCT_DIFF', 'close', 'sma_200'),
+}
+
+# Columns computed from a stock/benchmark ratio series; stored as relative_price_* (vs SPY) and relative_sector_* (vs the sector ETF)
+RELATIVE_INDICATORS = {
+    'rsi': ta('RSI', 'close', timeperiod=14),
+    'macd': ta('MACD', 'close', fastperiod=12, slowperiod=26, signalperiod=9, output=0),
+    'macd_signal': ta('MACD', 'close', fastperiod=12, slowperiod=26, signalperiod=9, output=1),
+    'macd_hist': ta('MACD', 'close', fastperiod=12, slowperiod=26, signalperiod=9, output=2),
+    'roc': ta('ROC', 'close', timeperiod=10),
+    'ad': ta('AD', 'high', 'low', 'close', 'volume'),
+    'adosc': ta('ADOSC', 'high', 'low', 'close', 'volume', fastperiod=3, slowperiod=10),
+    'adx': ta('ADX', 'high', 'low', 'close', timeperiod=14),
+    'adxr': ta('ADXR', 'high', 'low', 'close', timeperiod=14),
+    'apo': ta('APO', 'close', fastperiod=12, slowperiod=26, matype=0),
+    'aroon_up': ta('AROON', 'high', 'low', timeperiod=14, output=0),
+    'aroon_down': ta('AROON', 'high', 'low', timeperiod=14, output=1),
+    'aroonosc': ta('AROONOSC', 'high', 'low', timeperiod=14),
+    'atr': ta('ATR', 'high', 'low', 'close', timeperiod=14),
+    'avgprice': ta('AVGPRICE', 'open', 'high', 'low', 'close'),
+    'bbands_upper': ta('BBANDS', 'close', timeperiod=5, nbdevup=2, nbdevdn=2, matype=0, output=0),
+    'bbands_middle': ta('BBANDS', 'close', timeperiod=5, nbdevup=2, nbdevdn=2, matype=0, output=1),
+    'bbands_lower': ta('BBANDS', 'close', timeperiod=5, nbdevup=2, nbdevdn=2, matype=0, output=2),
+    'bop': ta('BOP', 'open', 'high', 'low', 'close'),
+    'cci': ta('CCI', 'high', 'low', 'close', timeperiod=14),
+    'min': ta('ROLLING_MIN', 'close', window=14),
+    'max': ta('ROLLING_MAX', 'close', window=14),
+    'cmo': ta('CMO', 'close', timeperiod=14),
+    'correl': ta('CORREL', 'high', 'close', timeperiod=30),
+    'dema': ta('DEMA', 'close', timeperiod=30),
+    'dx': ta('DX', 'high', 'low', 'close', timeperiod=14),
+    **moving_averages('SMA', 'close', [10, 20, 50, 100, 150, 200]),
+    'ema': ta('EMA', 'close', timeperiod=30),
+    **moving_averages('EMA', 'close', [10, 20, 50, 100, 150, 200]),
+    'kama': ta('KAMA', 'close', timeperiod=30),
+    'ma': ta('MA', 'close', timeperiod=30),
+    'mom': ta('MOM', 'close', timeperiod=10),
+    'willr': ta('WILLR', 'high', 'low', 'close', timeperiod=14),
+    'sar': ta('SAR', 'high', 'low', acceleration=0.02, maximum=0.2),
+    'ultosc': ta('ULTOSC', 'high', 'low', 'close', timeperiod1=7, timeperiod2=14, timeperiod3=28),
+    'tsf': ta('TSF', 'close', timeperiod=14),
+    'natr': ta('NATR', 'high', 'low', 'close', timeperiod=14),
+    'obv': ta('OBV', 'close', 'volume'),
+    'mfi': ta('MFI', 'high', 'low', 'close', 'volume', timeperiod=14),
+    **ichimoku('close', 'close', 'close'),
+    'stdev': ta('STDDEV', 'close', timeperiod=10),
+}
+
+PRICE_FIELDS = ['close', 'open', 'high', 'low', 'volume']
+
+
+def moving_average_periods(registry, functions=('EMA', 'KAMA')):
+    """{column: (function, timeperiod)} for the registry's moving averages of 'close' computed by `functions`."""
+    return {name: (ref[0], dict(ref[2])['timeperiod']) for name, ref in registry.items()
+            if isinstance(ref, tuple) and ref[0] in functions and ref[1] == ('close',)}
+
+
+def compute(registry, series, columns=None, prefix=''):
+    """
+    Evaluates `registry` over `series` (price field -> Series) and returns {prefix + column: Series}
+    in registry order. With `columns`, only those registry columns (unprefixed names) and the
+    nodes they depend on are computed.
+    """
+    cache = {}
+
+    def resolve(ref):
+        if isinstance(ref, str):
+            return series[ref] if ref in series else resolve(registry[ref])
+        function, inputs, params, output = ref
+        key = (function, inputs, params)
+        if key not in cache:
+            args = [resolve(source) for source in inputs]
+            cache[key] = (CUSTOM_FUNCTIONS.get(function) or getattr(talib, function))(*args, **dict(params))
+        return cache[key] if output is None else cache[key][output]
+
+    names = [name for name in registry if columns is None or name in columns]
+    return {prefix + name: resolve(registry[name]) for name in names}
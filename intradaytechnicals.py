@@ -0,0 +1,188 @@
+import argparse
+import csv
+import time
+from datetime import datetime
+
+import dbpool
+import streamingindicators
+
+# Intraday mode for the screener-relevant technical columns. Minute bars build each symbol's
+# forming daily bar, and after every minute bar its RSI, Bollinger %B and MACD histogram are
+# re-evaluated from the symbol's persisted daily kernel state (streamingindicators.py) as if that
+# bar closed now, so no history is replayed. Bars come from any iterable; a CSV replay file stands
+# in for the live feed.
+
+# Database configuration
+db_host = 'localhost'
+db_user = 'user'
+db_password = 'password'
+db_name = 'db'
+MYSQL_CONFIG = {'host': db_host, 'user': db_user, 'password': db_password, 'database': db_name}
+
+# Configuration constants
+INTRADAY_COLUMNS = ['rsi', 'bbands_percent_b', 'macd_hist']  # recomputed from the daily kernels per minute bar
+VOLUME_BASELINE = 'sma_volume_10'  # relative_volume = today's volume so far / last night's sma_volume_10
+CANDIDATE_COUNT = 20  # top stock_screener_scores rows tracked besides the held positions
+REPLAY_FIELDS = ['timestamp', 'symbol', 'open', 'high', 'low', 'close', 'volume']
+
+
+def replay_bars(path, speed=None):
+    """
+    Yields minute bars from a CSV replay file (REPLAY_FIELDS, FMP-style 'YYYY-MM-DD HH:MM:SS'
+    timestamps, in time order). With `speed`, replay is paced at that many times real time.
+    """
+    previous = None
+    with open(path, newline='') as f:
+        for row in csv.DictReader(f):
+            timestamp = datetime.strptime(row['timestamp'], '%Y-%m-%d %H:%M:%S')
+            if speed and previous is not None and timestamp > previous:
+                time.sleep((timestamp - previous).total_seconds() / speed)
+            previous = timestamp
+            yield {'timestamp': timestamp, 'symbol': row['symbol'],
+                   **{field: float(row[field]) for field in ['open', 'high', 'low', 'close', 'volume']}}
+
+
+class IntradayTechnicals:
+    """Per-symbol forming daily bars and the intraday columns derived from them."""
+
+    def __init__(self, symbols):
+        self.states = {}
+        for symbol in symbols:
+            state = streamingindicators.load_state(symbol)
+            missing = [column for column in INTRADAY_COLUMNS + [VOLUME_BASELINE] if state is None or column not in state.columns]
+            if missing:
+                print(f"No streaming state with {', '.join(missing)} for {symbol}; run technicaldata.py first. Skipping.")
+                continue
+            self.states[symbol] = state
+        self.forming = {}  # symbol -> (date, daily bar built from the minute bars so far)
+        self.latest = {}  # symbol -> latest intraday columns
+        self.latencies = []
+
+    def on_bar(self, bar):
+        """Folds one minute bar into its symbol's daily bar and returns the refreshed columns, or None if untracked."""
+        started = time.perf_counter()
+        symbol = bar['symbol']
+        state = self.states.get(symbol)
+        if state is None:
+            return None
+        date = bar['timestamp'].strftime('%Y-%m-%d')
+        if state.last_date is not None and date <= state.last_date:
+            return None  # the daily state already holds this session's close
+
+        forming_date, daily = self.forming.get(symbol, (None, None))
+        if forming_date != date:
+            if daily is not None:
+                # A replay spanning several sessions closes the previous day into the kernels (not persisted)
+                state.update(forming_date, daily)
+            daily = {'open': bar['open'], 'high': bar['high'], 'low': bar['low'], 'close': bar['close'], 'volume': 0.0}
+        daily['high'] = max(daily['high'], bar['high'])
+        daily['low'] = min(daily['low'], bar['low'])
+        daily['close'] = bar['close']
+        daily['volume'] += bar['volume']
+        self.forming[symbol] = (date, daily)
+
+        row = state.peek(daily, INTRADAY_COLUMNS)
+        baseline = state.values.get(VOLUME_BASELINE)
+        row['relative_volume'] = daily['volume'] / baseline if baseline else None
+        row['price'] = daily['close']
+        row['updated_at'] = bar['timestamp']
+        self.latest[symbol] = row
+        self.latencies.append(time.perf_counter() - started)
+        return row
+
+
+def create_intraday_table(cursor, conn):
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS technical_intraday (
+            symbol VARCHAR(10) PRIMARY KEY,
+            updated_at DATETIME,
+            price FLOAT,
+            rsi FLOAT,
+            bbands_percent_b FLOAT,
+            macd_hist FLOAT,
+            relative_volume FLOAT
+        )
+    """)
+    conn.commit()
+
+
+def publish(cursor, conn, rows):
+    """Upserts {symbol: row} into technical_intraday in one statement."""
+    if not rows:
+        return
+    columns = ['symbol', 'updated_at', 'price', 'rsi', 'bbands_percent_b', 'macd_hist', 'relative_volume']
+    values = [(symbol, *[None if row[c] != row[c] else row[c] for c in columns[1:]]) for symbol, row in rows.items()]
+    cursor.executemany(f"""
+        INSERT INTO technical_intraday ({', '.join(columns)}) VALUES ({', '.join(['%s'] * len(columns))})
+        ON DUPLICATE KEY UPDATE {', '.join(f"{c} = VALUES({c})" for c in columns[1:])}
+    """, values)
+    conn.commit()
+
+
+def tracked_symbols(cursor, held=()):
+    """Held positions plus the top CANDIDATE_COUNT symbols by core_score, in database format."""
+    cursor.execute("SELECT symbol FROM stock_screener_scores ORDER BY core_score DESC LIMIT %s", (CANDIDATE_COUNT,))
+    candidates = [symbol for (symbol,) in cursor.fetchall()]
+    return list(dict.fromkeys([symbol.replace('.', '-') for symbol in held] + candidates))
+
+
+def held_symbols():
+    import trade  # imported here so replays without a broker account do not need alpaca_trade_api
+    return list(trade.get_current_positions())
+
+
+def run(feed, symbols, cursor=None, conn=None):
+    """
+    Consumes `feed` (minute bar dicts) for `symbols`. Changed rows are published once per timestamp,
+    i.e. after each minute's bars, when a database cursor is given.
+    """
+    engine = IntradayTechnicals(symbols)
+    pending = {}
+    current = None
+    for bar in feed:
+        if current is not None and bar['timestamp'] != current and cursor is not None:
+            publish(cursor, conn, pending)
+            pending = {}
+        current = bar['timestamp']
+        row = engine.on_bar(bar)
+        if row is not None:
+            pending[bar['symbol']] = row
+    if cursor is not None:
+        publish(cursor, conn, pending)
+    return engine
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Updates intraday RSI, %B, MACD histogram and relative volume from minute bars.")
+    parser.add_argument('--replay', required=True, help="CSV of minute bars standing in for the live feed")
+    parser.add_argument('--speed', type=float, default=None, help="replay pace as a multiple of real time (default: as fast as possible)")
+    parser.add_argument('--symbols', nargs='*', help="symbols to track (default: held positions plus top screener candidates)")
+    parser.add_argument('--no-db', action='store_true', help="print the latest values instead of writing technical_intraday")
+    args = parser.parse_args()
+    if args.no_db and not args.symbols:
+        parser.error("--no-db needs --symbols")
+
+    conn = cursor = None
+    if not args.no_db:
+        conn = dbpool.connect(MYSQL_CONFIG)
+        cursor = conn.cursor(buffered=True)
+        create_intraday_table(cursor, conn)
+    try:
+        symbols = args.symbols or tracked_symbols(cursor, held_symbols())
+        engine = run(replay_bars(args.replay, args.speed), symbols, cursor, conn)
+    finally:
+        if conn:
+            cursor.close()
+            conn.close()
+
+    for symbol, row in sorted(engine.latest.items()):
+        print(f"{symbol} {row['updated_at']}: price {row['price']:.2f}, rsi {row['rsi']:.2f}, %B {row['bbands_percent_b']:.3f}, "
+              f"macd_hist {row['macd_hist']:.4f}, relative volume {row['relative_volume'] or float('nan'):.2f}")
+    if engine.latencies:
+        latencies = sorted(engine.latencies)
+        print(f"{len(latencies)} bars: recompute latency mean {sum(latencies) / len(latencies) * 1000:.3f} ms, "
+              f"p99 {latencies[int(len(latencies) * 0.99)] * 1000:.3f} ms, max {latencies[-1] * 1000:.3f} ms")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,17 +1,20 @@
 import mysql.connector
+import dbpool
+import stagedtable
+
+DB_CONFIG = {
+    'user': 'user',
+    'password': 'pass',
+    'host': 'localhost',
+    'database': 'db',
+}
 
 def execute_db_query(query, params=None, commit=False):
-    db_config = {
-        'user': 'user',
-        'password': 'pass',
-        'host': 'localhost',
-        'database': 'db',
-    }
     result = None
     conn = None
     cursor = None
     try:
-        conn = mysql.connector.connect(**db_config)
+        conn = dbpool.connect(DB_CONFIG)  # pooled; close() hands it back
         cursor = conn.cursor()
         cursor.execute(query, params)
         if not commit:
@@ -30,23 +33,16 @@ def execute_db_query(query, params=None, commit=False):
 def create_exclusion_lists():
     # Split the multi-statement queries into separate calls
 
-    # Delete existing tables if they exist
-    delete_table_sp400_query = "DROP TABLE IF EXISTS exclusion_list_sp400;"
-    delete_table_query = "DROP TABLE IF EXISTS exclusion_list;"
-    execute_db_query(delete_table_sp400_query, commit=True)
-    execute_db_query(delete_table_query, commit=True)
-
-    # Create new tables
-    create_table_sp400_query = """
-    CREATE TABLE exclusion_list_sp400 (
-        symbol VARCHAR(10) NOT NULL PRIMARY KEY
-    );"""
+    # Build both lists in staging tables; the live tables are replaced together at the end, so
+    # trade.py never sees a missing or half-filled exclusion list
     create_table_query = """
-    CREATE TABLE exclusion_list (
+    CREATE TABLE IF NOT EXISTS {table} (
         symbol VARCHAR(10) NOT NULL PRIMARY KEY
     );"""
-    execute_db_query(create_table_sp400_query, commit=True)
-    execute_db_query(create_table_query, commit=True)
+    for table in ['exclusion_list_sp400', 'exclusion_list']:
+        execute_db_query(create_table_query.format(table=table), commit=True)
+        execute_db_query(f"DROP TABLE IF EXISTS {stagedtable.staging_name(table)};", commit=True)
+        execute_db_query(create_table_query.format(table=stagedtable.staging_name(table)), commit=True)
 
     # Define an array for special symbols
     special_symbols = ['BTCUSD', 'BKNG']  # Add more symbols to this array as needed
@@ -54,16 +50,19 @@ def create_exclusion_lists():
     # Fetch and insert the top 12 stocks plus special symbols into exclusion_list_sp400
     top_12_stocks = fetch_top_stocks(n=25)
     symbols_for_exclusion_sp400 = top_12_stocks + special_symbols
-    insert_into_exclusion_list_sp400_query = "INSERT INTO exclusion_list_sp400 (symbol) VALUES (%s);"
-    for stock in symbols_for_exclusion_sp400:
-        execute_db_query(insert_into_exclusion_list_sp400_query, params=(stock,), commit=True)
+    insert_into_exclusion_list_sp400_query = f"INSERT IGNORE INTO {stagedtable.staging_name('exclusion_list_sp400')} (symbol) VALUES (%s)"
+    dbpool.executemany(DB_CONFIG, insert_into_exclusion_list_sp400_query, [(stock,) for stock in symbols_for_exclusion_sp400])
 
     # Fetch and insert the top 5 stocks from stock_scores_sp400 plus special symbols into exclusion_list
     top_5_stocks_sp400 = fetch_top_stocks_sp400(n=5)
     symbols_for_exclusion = top_5_stocks_sp400 + special_symbols
-    insert_into_exclusion_list_query = "INSERT INTO exclusion_list (symbol) VALUES (%s);"
-    for stock in symbols_for_exclusion:
-        execute_db_query(insert_into_exclusion_list_query, params=(stock,), commit=True)
+    insert_into_exclusion_list_query = f"INSERT IGNORE INTO {stagedtable.staging_name('exclusion_list')} (symbol) VALUES (%s)"
+    dbpool.executemany(DB_CONFIG, insert_into_exclusion_list_query, [(stock,) for stock in symbols_for_exclusion])
+
+    # Swap both staging tables in with one RENAME
+    for statement in stagedtable.swap_statements('exclusion_list_sp400', 'exclusion_list'):
+        execute_db_query(statement, commit=True)
+    dbpool.log_pool_stats()
 
 def fetch_top_stocks(n=12):
     """Fetch top n stocks based on core_score from the stock_scores table."""
@@ -1,9 +1,10 @@
 import alpaca_trade_api as tradeapi
 import pandas as pd
-import pymysql
-from collections import deque
 from datetime import datetime, timedelta, timezone
 import logging
+import dbpool
+import lotledger
+import stagedtable
 
 # Setup logging
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
@@ -13,39 +14,75 @@ API_KEY = 'yourapikey'
 API_SECRET = 'yourapisecret'
 BASE_URL = 'https://api.alpaca.markets'  # or use the live URL for real transactions
 
-api = tradeapi.REST(API_KEY, API_SECRET, BASE_URL, api_version='v2')
-
 # Exclusion list
 exclusion_symbols = []  # Add symbols here to exclude them from the wash sale table
 
+HISTORY_DAYS = 365 * 5  # order history replayed on the first run, before the lot ledger exists
+
+MYSQL_CONFIG = {
+    'host': 'localhost',  # replace with your host, e.g., 'localhost'
+    'user': 'user',       # replace with your username, usually 'root'
+    'password': 'pass',       # replace with your password
+    'database': 'db',       # replace with your database name
+    'charset': 'utf8mb4'
+}
+
 def initialize_db():
     try:
-        conn = pymysql.connect(
-            host='localhost',  # replace with your host, e.g., 'localhost'
-            user='user',       # replace with your username, usually 'root'
-            password='pass',       # replace with your password
-            db='db',       # replace with your database name
-            charset='utf8mb4',
-            cursorclass=pymysql.cursors.DictCursor
-        )
-        with conn.cursor() as cursor:
-            cursor.execute("DROP TABLE IF EXISTS wash_sale")
-            cursor.execute("""
-                CREATE TABLE wash_sale (
+        conn = dbpool.connect(MYSQL_CONFIG)
+        cursor = conn.cursor(dictionary=True, buffered=True)
+        try:
+            # The new list is built in wash_sale_staging and only swapped in once the FIFO pass
+            # succeeds, so a failed run leaves the previous wash_sale in place
+            stagedtable.create_staging(cursor, 'wash_sale', """
+                CREATE TABLE IF NOT EXISTS {table} (
                     symbol VARCHAR(255) UNIQUE
                 )
             """)
+            # Persistent FIFO lot ledger (see lotledger.py): open lots, realized sells and the high-water mark
+            cursor.execute("""
+                CREATE TABLE IF NOT EXISTS wash_sale_lots (
+                    symbol VARCHAR(255),
+                    seq INT,
+                    buy_price DOUBLE,
+                    qty DOUBLE,
+                    PRIMARY KEY (symbol, seq)
+                )
+            """)
+            cursor.execute("""
+                CREATE TABLE IF NOT EXISTS wash_sale_sells (
+                    order_id VARCHAR(64) PRIMARY KEY,
+                    symbol VARCHAR(255),
+                    quantity DOUBLE,
+                    sell_price DOUBLE,
+                    cost_basis DOUBLE,
+                    gain_loss DOUBLE,
+                    sell_date DATETIME(6),
+                    INDEX (sell_date)
+                )
+            """)
+            cursor.execute("""
+                CREATE TABLE IF NOT EXISTS wash_sale_ledger (
+                    id TINYINT PRIMARY KEY,
+                    high_water DATETIME(6),
+                    applied_ids TEXT,
+                    pending_ids TEXT
+                )
+            """)
             conn.commit()
-        logging.info("Database initialized and wash_sale table created.")
+        finally:
+            cursor.close()
+        logging.info("Database initialized and wash_sale staging table created.")
         return conn
     except Exception as e:
         logging.error(f"Failed to initialize database: {e}")
         return None
 
-def fetch_all_orders(api):
+def fetch_all_orders(api, start_time=None):
+    """Orders submitted after `start_time` (default: the last HISTORY_DAYS days), oldest first."""
     all_orders = []
     current_time = datetime.now(timezone.utc)
-    start_time = current_time - timedelta(days=365 * 5)
+    start_time = start_time or current_time - timedelta(days=HISTORY_DAYS)
     last_timestamp = None
 
     try:
@@ -68,70 +105,94 @@ def fetch_all_orders(api):
         logging.error(f"Failed to fetch orders: {e}")
     return all_orders
 
-def calculate_fifo_gains(api, conn):
-    orders = fetch_all_orders(api)
-    buys = {}
-    sells = []
-    thirty_days_ago = datetime.now(timezone.utc) - timedelta(days=30)
-    wash_sale_symbols = set()
+def fetch_orders_by_id(api, order_ids):
+    """
+    The current state of orders the ledger is waiting on. Unlike fetch_all_orders, a failure is
+    raised: advancing the ledger without one of these orders would break its symbol's FIFO order.
+    """
+    return [api.get_order(order_id) for order_id in sorted(order_ids)]
 
-    if not orders:
-        logging.warning("No orders retrieved. Please check API settings and connectivity.")
-        return pd.DataFrame()
+def load_ledger(cursor, now):
+    """The stored lot ledger, with the realized sells still inside the wash-sale window."""
+    cursor.execute("SELECT symbol, seq, buy_price, qty FROM wash_sale_lots")
+    lot_rows = [(row['symbol'], row['seq'], row['buy_price'], row['qty']) for row in cursor.fetchall()]
+    cursor.execute("""
+        SELECT order_id, symbol, quantity, sell_price, cost_basis, gain_loss, sell_date FROM wash_sale_sells WHERE sell_date >= %s
+    """, (lotledger.naive_utc(lotledger.utc(now) - timedelta(days=lotledger.WASH_SALE_DAYS)),))
+    sell_rows = [(row['order_id'], row['symbol'], row['quantity'], row['sell_price'], row['cost_basis'], row['gain_loss'], row['sell_date'])
+                 for row in cursor.fetchall()]
+    cursor.execute("SELECT high_water, applied_ids, pending_ids FROM wash_sale_ledger WHERE id = 1")
+    state = cursor.fetchone()
+    return lotledger.LotLedger.from_rows(lot_rows, sell_rows,
+                                         (state['high_water'], state['applied_ids'], state['pending_ids']) if state else None)
+
+def save_ledger(cursor, ledger):
+    """Writes the lots of the symbols that changed, the new sells, the high-water mark and the pending order ids."""
+    symbols, lot_rows = ledger.changed_lot_rows()
+    if symbols:
+        cursor.executemany("DELETE FROM wash_sale_lots WHERE symbol = %s", [(symbol,) for symbol in symbols])
+    if lot_rows:
+        cursor.executemany("INSERT INTO wash_sale_lots (symbol, seq, buy_price, qty) VALUES (%s, %s, %s, %s)", lot_rows)
+    sell_rows = ledger.unsaved_sell_rows()
+    if sell_rows:
+        cursor.executemany("""
+            INSERT IGNORE INTO wash_sale_sells (order_id, symbol, quantity, sell_price, cost_basis, gain_loss, sell_date)
+            VALUES (%s, %s, %s, %s, %s, %s, %s)
+        """, sell_rows)
+    cursor.execute("""
+        INSERT INTO wash_sale_ledger (id, high_water, applied_ids, pending_ids) VALUES (1, %s, %s, %s)
+        ON DUPLICATE KEY UPDATE high_water = VALUES(high_water), applied_ids = VALUES(applied_ids), pending_ids = VALUES(pending_ids)
+    """, ledger.state_row())
+    ledger.mark_saved()
 
+def calculate_fifo_gains(api, conn):
+    """
+    Brings the lot ledger up to date with the orders submitted since its high-water mark, plus the
+    pending orders it re-fetches by id, and rebuilds wash_sale from the loss sells of the last 30 days. The first run replays HISTORY_DAYS
+    of orders. Returns the sells realized by the newly fetched orders.
+    """
+    now = datetime.now(timezone.utc)
     try:
-        with conn.cursor() as cursor:
-            for order in orders:
-                symbol = order.symbol
-                if symbol in exclusion_symbols:
-                    continue
-                if order.side == 'buy' and order.status == 'filled' and order.filled_qty:
-                    buy_price = float(order.filled_avg_price)
-                    buy_qty = float(order.filled_qty)
-                    if symbol not in buys:
-                        buys[symbol] = deque()
-                    buys[symbol].append((buy_price, buy_qty))
-                elif order.side == 'sell' and order.status == 'filled' and order.filled_qty:
-                    if symbol in buys and buys[symbol]:
-                        sell_price = float(order.filled_avg_price)
-                        sell_qty = float(order.filled_qty)
-                        cost_basis = 0
-                        remaining_qty = sell_qty
-                        while remaining_qty > 0 and buys[symbol]:
-                            buy_price, buy_qty = buys[symbol].popleft()
-                            used_qty = min(buy_qty, remaining_qty)
-                            cost_basis += used_qty * buy_price
-                            remaining_qty -= used_qty
-                            if buy_qty > used_qty:
-                                buys[symbol].appendleft((buy_price, buy_qty - used_qty))
-                        gain_loss = (sell_price - (cost_basis / sell_qty)) * sell_qty
-                        sells.append({
-                            'Symbol': symbol,
-                            'Quantity Sold': sell_qty,
-                            'Sell Price': sell_price,
-                            'Cost Basis per Share': cost_basis / sell_qty,
-                            'Gain/Loss': gain_loss,
-                            'Sell Date': order.created_at
-                        })
-                        if gain_loss < 0 and order.created_at >= thirty_days_ago and symbol not in wash_sale_symbols:
-                            cursor.execute("INSERT IGNORE INTO wash_sale (symbol) VALUES (%s)", (symbol,))
-                            conn.commit()
-                            wash_sale_symbols.add(symbol)
-                            logging.info(f"Record inserted for {symbol}")
+        cursor = conn.cursor(dictionary=True, buffered=True)
+        try:
+            ledger = load_ledger(cursor, now)
+            if ledger.high_water is None:
+                logging.info(f"No lot ledger yet; replaying {HISTORY_DAYS} days of orders.")
+            orders = fetch_all_orders(api, ledger.fetch_after(None)) + fetch_orders_by_id(api, ledger.pending_ids)
+            sells, current = ledger.advance(orders, exclusion_symbols)
+            save_ledger(cursor, ledger)
+            conn.commit()
+            logging.info(f"Applied {len(orders)} orders; high-water mark now {ledger.high_water}, {len(ledger.pending_ids)} orders pending.")
+
+            wash_sale_symbols = sorted(current.wash_sale_symbols(now))
+            if wash_sale_symbols:
+                cursor.executemany(f"INSERT IGNORE INTO {stagedtable.staging_name('wash_sale')} (symbol) VALUES (%s)",
+                                   [(symbol,) for symbol in wash_sale_symbols])
+            logging.info(f"Wash sale symbols: {', '.join(wash_sale_symbols) or 'none'}")
+            stagedtable.swap_in(cursor, 'wash_sale')
+            conn.commit()
+        finally:
+            cursor.close()
         return pd.DataFrame(sells)
     except Exception as e:
         logging.error(f"Failed during FIFO gain calculations or database operations: {e}")
         return pd.DataFrame()
 
-try:
-    conn = initialize_db()
-    if conn:
-        sales_report = calculate_fifo_gains(api, conn)
-        if not sales_report.empty:
-            print(sales_report)
-        else:
-            logging.info("No sales transactions were processed.")
-finally:
-    if conn:
-        conn.close()
-        logging.info("Database connection closed.")
+def main():
+    api = tradeapi.REST(API_KEY, API_SECRET, BASE_URL, api_version='v2')
+    conn = None
+    try:
+        conn = initialize_db()
+        if conn:
+            sales_report = calculate_fifo_gains(api, conn)
+            if not sales_report.empty:
+                print(sales_report)
+            else:
+                logging.info("No sales transactions were processed.")
+    finally:
+        if conn:
+            conn.close()
+            logging.info("Database connection closed.")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,173 @@
+import copy
+from collections import deque
+from datetime import timedelta
+
+import pandas as pd
+
+# Incremental FIFO lot ledger behind loadwashsale.py. The open buy lots per symbol, the realized
+# sells and a high-water mark (the submitted_at of the newest order seen) are persisted, so a run
+# only fetches orders submitted after the mark. Lots are consumed per symbol, so each symbol's
+# orders are applied strictly in submission order: an order that is still open holds back the
+# later orders of its symbol, whose ids are kept as pending and re-fetched by id on the next run,
+# while the mark moves past them. Pending orders are applied to a scratch copy for the current run
+# only. Every run therefore sees exactly what a replay of the whole order history would, and one
+# long-lived order (a GTC limit or a trailing stop) no longer pins the mark.
+
+# Configuration constants
+FINAL_STATUSES = {'filled', 'canceled', 'expired', 'rejected', 'replaced'}  # an order in any other status may still fill
+WASH_SALE_DAYS = 30
+FETCH_OVERLAP = timedelta(seconds=1)  # orders are re-fetched from just before the mark; already applied ones are skipped
+
+
+def utc(timestamp):
+    """A timezone-aware UTC pandas Timestamp (MySQL hands back naive UTC datetimes)."""
+    timestamp = pd.Timestamp(timestamp)
+    timestamp = timestamp.tz_localize('UTC') if timestamp.tzinfo is None else timestamp.tz_convert('UTC')
+    return timestamp.floor('us')  # the precision DATETIME(6) stores, so a stored mark compares equal to its order
+
+
+def naive_utc(timestamp):
+    return None if timestamp is None else timestamp.tz_convert('UTC').tz_localize(None).to_pydatetime()
+
+
+class LotLedger:
+
+    def __init__(self, lots=None, sells=None, high_water=None, applied_ids=None, pending_ids=None):
+        self.lots = lots or {}  # symbol -> deque of [buy_price, qty], oldest first
+        self.sells = sells or []  # realized sells, oldest first
+        self.high_water = high_water  # submitted_at of the newest order seen
+        self.applied_ids = set(applied_ids or ())  # ids of applied orders submitted exactly at high_water
+        self.pending_ids = set(pending_ids or ())  # orders seen but not applied: still open, or behind an open order of their symbol
+        self.dirty_symbols = set()  # symbols whose lots changed since the ledger was loaded
+        self.unsaved_sells = []
+
+    def fetch_after(self, default):
+        """The `after` timestamp for the next order fetch."""
+        return default if self.high_water is None else self.high_water - FETCH_OVERLAP
+
+    def apply(self, orders, exclusion_symbols=()):
+        """Applies orders (in submission order) to the lots and returns the sells they realize."""
+        sells = []
+        for order in orders:
+            symbol = order.symbol
+            if symbol in exclusion_symbols or order.status != 'filled' or not order.filled_qty:
+                continue
+            if order.side in ('buy', 'sell'):
+                self.dirty_symbols.add(symbol)
+            if order.side == 'buy':
+                self.lots.setdefault(symbol, deque()).append([float(order.filled_avg_price), float(order.filled_qty)])
+            elif order.side == 'sell' and self.lots.get(symbol):
+                buys = self.lots[symbol]
+                sell_price = float(order.filled_avg_price)
+                sell_qty = float(order.filled_qty)
+                cost_basis = 0
+                remaining_qty = sell_qty
+                while remaining_qty > 0 and buys:
+                    buy_price, buy_qty = buys.popleft()
+                    used_qty = min(buy_qty, remaining_qty)
+                    cost_basis += used_qty * buy_price
+                    remaining_qty -= used_qty
+                    if buy_qty > used_qty:
+                        buys.appendleft([buy_price, buy_qty - used_qty])
+                if not buys:
+                    del self.lots[symbol]
+                sells.append({
+                    'Order ID': str(order.id),
+                    'Symbol': symbol,
+                    'Quantity Sold': sell_qty,
+                    'Sell Price': sell_price,
+                    'Cost Basis per Share': cost_basis / sell_qty,
+                    'Gain/Loss': (sell_price - (cost_basis / sell_qty)) * sell_qty,
+                    'Sell Date': utc(order.created_at)
+                })
+        return sells
+
+    def _unapplied(self, order):
+        if str(order.id) in self.pending_ids or self.high_water is None:
+            return True
+        submitted = utc(order.submitted_at)
+        return submitted > self.high_water or (submitted == self.high_water and str(order.id) not in self.applied_ids)
+
+    def _add_sells(self, sells):
+        self.sells.extend(sells)
+        self.sells.sort(key=lambda sell: sell['Sell Date'])  # pending orders can realize sells older than the last ones
+
+    def advance(self, orders, exclusion_symbols=()):
+        """
+        Applies newly fetched orders together with the re-fetched pending ones (every id in
+        pending_ids must be among `orders`). An order still open holds back the later orders of its
+        symbol; those become the new pending_ids and are applied to a scratch copy only. The rest
+        are applied to this ledger, and the high-water mark moves to the newest order. Returns the
+        sells realized by `orders` and that copy, which reflects every filled order.
+        """
+        orders = {str(order.id): order for order in orders}  # a re-fetched pending order replaces its overlap copy
+        missing = self.pending_ids - set(orders)
+        if missing:
+            raise ValueError(f"Pending orders were not re-fetched: {', '.join(sorted(missing))}")
+        orders = sorted((order for order in orders.values() if self._unapplied(order)), key=lambda order: utc(order.submitted_at))
+        held_symbols = set()
+        settled, pending = [], []
+        for order in orders:
+            if order.symbol in held_symbols or order.status not in FINAL_STATUSES:
+                held_symbols.add(order.symbol)
+                pending.append(order)
+            else:
+                settled.append(order)
+
+        sells = self.apply(settled, exclusion_symbols)
+        self._add_sells(sells)
+        self.unsaved_sells.extend(sells)
+        self.pending_ids = {str(order.id) for order in pending}
+        if orders:
+            newest = utc(orders[-1].submitted_at)
+            if self.high_water is None or newest > self.high_water:
+                self.high_water = newest
+                self.applied_ids = set()
+            if newest == self.high_water:
+                self.applied_ids |= {str(order.id) for order in settled if utc(order.submitted_at) == newest}
+
+        current = copy.deepcopy(self)
+        pending_sells = current.apply(pending, exclusion_symbols)
+        current._add_sells(pending_sells)
+        return sells + pending_sells, current
+
+    @classmethod
+    def from_rows(cls, lot_rows, sell_rows, state_row):
+        """
+        Rebuilds a ledger from stored rows: lots as (symbol, seq, buy_price, qty), sells as
+        (order_id, symbol, quantity, sell_price, cost_basis, gain_loss, sell_date) and the state as
+        (high_water, applied_ids, pending_ids) or None.
+        """
+        lots = {}
+        for symbol, seq, buy_price, qty in sorted(lot_rows, key=lambda row: (row[0], row[1])):
+            lots.setdefault(symbol, deque()).append([buy_price, qty])
+        sells = [{'Order ID': order_id, 'Symbol': symbol, 'Quantity Sold': quantity, 'Sell Price': sell_price,
+                  'Cost Basis per Share': cost_basis, 'Gain/Loss': gain_loss, 'Sell Date': utc(sell_date)}
+                 for order_id, symbol, quantity, sell_price, cost_basis, gain_loss, sell_date in sell_rows]
+        sells.sort(key=lambda sell: sell['Sell Date'])
+        if state_row is None or state_row[0] is None:
+            return cls(lots, sells)
+        high_water, applied_ids, pending_ids = state_row
+        return cls(lots, sells, utc(high_water), applied_ids.split(',') if applied_ids else (),
+                   pending_ids.split(',') if pending_ids else ())
+
+    def changed_lot_rows(self):
+        """(symbols whose stored lots must be replaced, their new lot rows)."""
+        symbols = sorted(self.dirty_symbols)
+        return symbols, [(symbol, seq, price, qty) for symbol in symbols for seq, (price, qty) in enumerate(self.lots.get(symbol, ()))]
+
+    def unsaved_sell_rows(self):
+        return [(sell['Order ID'], sell['Symbol'], sell['Quantity Sold'], sell['Sell Price'], sell['Cost Basis per Share'],
+                 sell['Gain/Loss'], naive_utc(sell['Sell Date'])) for sell in self.unsaved_sells]
+
+    def state_row(self):
+        return naive_utc(self.high_water), ','.join(sorted(self.applied_ids)), ','.join(sorted(self.pending_ids))
+
+    def mark_saved(self):
+        self.dirty_symbols = set()
+        self.unsaved_sells = []
+
+    def wash_sale_symbols(self, now):
+        """Symbols sold at a loss in the last WASH_SALE_DAYS days."""
+        cutoff = utc(now) - timedelta(days=WASH_SALE_DAYS)
+        return {sell['Symbol'] for sell in self.sells if sell['Gain/Loss'] < 0 and sell['Sell Date'] >= cutoff}
@@ -1,31 +1,172 @@
+import argparse
+import importlib
+import json
+import os
 import subprocess
 import sys
+import time
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait
+from datetime import datetime
+
+# Pipeline stages and the stages each one needs to have finished first. Stages whose
+# dependencies are met run in parallel; a failure skips everything downstream of it.
+STAGES = {
+    "stocklistload.py": [],
+    "balancesheet.py": ["stocklistload.py"],
+    "companyprofile.py": ["stocklistload.py"],
+    "incomestatement.py": ["stocklistload.py"],
+    "stocksfinancialgrowth.py": ["stocklistload.py"],
+    "stockskeymetrics.py": ["stocklistload.py"],
+    "stocksratios.py": ["stocklistload.py"],
+    "technicaldata.py": ["stocklistload.py"],
+    "stockdatatablebuilder.py": ["balancesheet.py", "companyprofile.py", "incomestatement.py",
+                                 "stocksfinancialgrowth.py", "stockskeymetrics.py", "stocksratios.py"],
+    "stockscreener.py": ["stockdatatablebuilder.py", "technicaldata.py"],
+    "loadexclusionlist.py": ["stockscreener.py"],
+    "loadwashsale.py": [],
+}
+
+# Stages that call the FinancialModelingPrep API. fmpfetch's rate limiter is per process, so as
+# subprocesses they would each spend the plan's full FMP_REQUESTS_PER_MINUTE; they are run one at a
+# time then, and each gets the whole quota. In-process they share one limiter and may overlap.
+FMP_STAGES = {"balancesheet.py", "companyprofile.py", "incomestatement.py", "stocksfinancialgrowth.py",
+              "stockskeymetrics.py", "stocksratios.py", "technicaldata.py"}
+
+# Configuration constants
+MAX_PARALLEL = 4  # Stages allowed to run at once
+STATE_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'pipeline_state.json')
+
+# In-process mode calls each stage's entry function instead of starting a new interpreter, and the
+# stages share dbpool's connection pools. A stage in HANDOFFS is also passed an upstream stage's
+# return value as a keyword argument (the stock_data frame stockdatatablebuilder.py has just written)
+# instead of reading it back from the database. Upstream stages still write their tables, so
+# subprocess mode and --resume, where the upstream did not run in this process, read them as before.
+ENTRY_POINTS = {"loadexclusionlist.py": "create_exclusion_lists"}  # stages whose entry function is not main()
+HANDOFFS = {"stockscreener.py": {"stock_data": "stockdatatablebuilder.py"}}  # stage -> {keyword: upstream stage}
+
+# Return values of in-process stages that a HANDOFFS consumer has not picked up yet
+_handoffs = {}
+
 
 def run_script(script_name):
+    """Runs one stage in its own interpreter and returns (succeeded, wall seconds)."""
+    start = time.perf_counter()
     try:
         subprocess.check_call([sys.executable, script_name])
-        print(f"Successfully ran {script_name}")
-    except subprocess.CalledProcessError as e:
+        succeeded = True
+    except (subprocess.CalledProcessError, OSError) as e:
         print(f"Failed to run {script_name}. Error: {e}")
+        succeeded = False
+    return succeeded, time.perf_counter() - start
+
+
+def run_in_process(script_name):
+    """
+    Runs one stage by importing its module and calling its entry function in this interpreter,
+    so pandas, talib, sklearn and friends are imported once for the whole pipeline. HANDOFFS values
+    are passed in from, or kept for, the stages that produce them.
+    """
+    start = time.perf_counter()
+    try:
+        module = importlib.import_module(script_name[:-len('.py')])
+        kwargs = {keyword: _handoffs.pop(upstream) for keyword, upstream in HANDOFFS.get(script_name, {}).items() if upstream in _handoffs}
+        result = getattr(module, ENTRY_POINTS.get(script_name, 'main'))(**kwargs)
+        if any(script_name in upstreams.values() for upstreams in HANDOFFS.values()):
+            _handoffs[script_name] = result
+        succeeded = True
+    except Exception as e:
+        print(f"Failed to run {script_name}. Error: {e}")
+        succeeded = False
+    return succeeded, time.perf_counter() - start
+
+
+def downstream_of(stage):
+    """Every stage that depends on `stage`, directly or transitively."""
+    found = set()
+    pending = [stage]
+    while pending:
+        current = pending.pop()
+        for name, dependencies in STAGES.items():
+            if current in dependencies and name not in found:
+                found.add(name)
+                pending.append(name)
+    return found
+
+
+def load_state():
+    if not os.path.exists(STATE_FILE):
+        return {}
+    with open(STATE_FILE) as f:
+        return json.load(f)
+
+
+def save_state(state):
+    tmp_path = f"{STATE_FILE}.tmp"
+    with open(tmp_path, 'w') as f:
+        json.dump(state, f, indent=2)
+    os.replace(tmp_path, STATE_FILE)
+
+
+def run_pipeline(max_parallel=MAX_PARALLEL, resume=False, run_fn=run_script, fmp_parallel=1):
+    """
+    Runs STAGES as a DAG. With resume=True, stages that succeeded in the previous run are not rerun,
+    so the pipeline picks up at the stage that failed. At most `fmp_parallel` of FMP_STAGES run at
+    once. Per-stage status and wall time are saved to STATE_FILE. Returns True when every stage succeeded.
+    """
+    previous = load_state().get('stages', {}) if resume else {}
+    done = set(name for name, result in previous.items() if result.get('status') == 'succeeded')
+    state = {'started': datetime.now().isoformat(timespec='seconds'), 'stages': {name: previous[name] for name in done}}
+    failed = set()
+    skipped = set()
+    running = {}
+
+    with ThreadPoolExecutor(max_workers=max_parallel) as executor:
+        while True:
+            for name, dependencies in STAGES.items():
+                if name in done or name in failed or name in skipped or name in running.values():
+                    continue
+                if name in FMP_STAGES and len(FMP_STAGES & set(running.values())) >= fmp_parallel:
+                    continue
+                if all(dependency in done for dependency in dependencies) and len(running) < max_parallel:
+                    print(f"Starting {name}")
+                    running[executor.submit(run_fn, name)] = name
+            if not running:
+                break
+            finished, _ = wait(running, return_when=FIRST_COMPLETED)
+            for future in finished:
+                name = running.pop(future)
+                succeeded, seconds = future.result()
+                state['stages'][name] = {'status': 'succeeded' if succeeded else 'failed', 'seconds': round(seconds, 2)}
+                if succeeded:
+                    done.add(name)
+                    print(f"Successfully ran {name} in {seconds:.1f}s")
+                else:
+                    failed.add(name)
+                    for blocked in downstream_of(name) - skipped:
+                        skipped.add(blocked)
+                        state['stages'][blocked] = {'status': 'skipped', 'seconds': 0}
+                        print(f"Skipping {blocked}: upstream {name} failed")
+            save_state(state)
+
+    state['finished'] = datetime.now().isoformat(timespec='seconds')
+    save_state(state)
+    for name in STAGES:
+        result = state['stages'].get(name, {'status': 'not run', 'seconds': 0})
+        print(f"{name:28} {result['status']:10} {result['seconds']:8.1f}s")
+    return not failed
+
 
 def main():
-    scripts = [
-         "stocklistload.py",
-         "balancesheet.py",
-         "companyprofile.py",
-         "incomestatement.py",
-         "stocksfinancialgrowth.py",
-         "stockskeymetrics.py",
-         "stocksratios.py",
-         "stockdatatablebuilder.py"
-         "technicaldata.py",         
-         "stockscreener.py",
-         "loadexclusionlist.py",
-         "loadwashsale.py"
-    ]
-
-    for script in scripts:
-        run_script(script)
+    parser = argparse.ArgumentParser(description="Runs the data pipeline stages in dependency order.")
+    parser.add_argument('--resume', action='store_true', help="skip stages that succeeded in the previous run")
+    parser.add_argument('--max-parallel', type=int, default=MAX_PARALLEL, help="maximum stages running at once")
+    parser.add_argument('--in-process', action='store_true', help="run stages as function calls in one interpreter instead of subprocesses")
+    args = parser.parse_args()
+    run_fn = run_in_process if args.in_process else run_script
+    # Only stages in this interpreter share fmpfetch's rate limiter
+    fmp_parallel = args.max_parallel if args.in_process else 1
+    if not run_pipeline(max_parallel=args.max_parallel, resume=args.resume, run_fn=run_fn, fmp_parallel=fmp_parallel):
+        sys.exit(1)
 
 if __name__ == "__main__":
     main()
@@ -0,0 +1,135 @@
+import json
+import logging
+import threading
+import time
+
+# Order state tracker for trade.py. Every order attempt_order submits is recorded, and its status
+# follows the broker's trade-update events (Alpaca's trade_updates stream), so a caller waiting on
+# some orders wakes up as soon as their fills arrive instead of polling. Events can be recorded to
+# a JSON lines file and replayed later in place of the live stream.
+
+# Configuration constants
+TERMINAL_STATUSES = {'filled', 'canceled', 'expired', 'rejected', 'replaced'}
+RECONCILE_INTERVAL = 30  # seconds between get_order checks of still-pending orders while waiting, in case stream events are missed
+STATUS_EVENTS = {'filled': 'fill', 'partially_filled': 'partial_fill'}  # trade-update event listeners get for an order read with that status
+
+
+def _field(obj, name):
+    if isinstance(obj, dict):
+        return obj.get(name)
+    return getattr(obj, name, None)
+
+
+class OrderTracker:
+    """Thread-safe {order id: order state} fed by submissions and trade-update events."""
+
+    def __init__(self, record_path=None):
+        self.orders = {}
+        self.condition = threading.Condition()
+        self.listeners = []
+        self.record_path = record_path
+        self.started = time.monotonic()
+
+    def add_listener(self, listener):
+        """
+        Calls listener(event, order_state) after every trade update and every recorded order (a
+        submission or a reconciling get_order read), e.g. to apply fills to cached positions. A
+        recorded order's event is derived from its status, so the same fill can be reported twice.
+        """
+        self.listeners.append(listener)
+
+    def record(self, order):
+        """Starts tracking an order returned by submit_order, or updates it from a get_order read."""
+        if order is None:
+            return
+        status = _field(order, 'status') or 'new'
+        self._notify(STATUS_EVENTS.get(status, status), self._apply(_field(order, 'id'), order, status))
+
+    def on_update(self, update):
+        """Applies one trade-update event (an object or dict with `event` and `order`)."""
+        event = _field(update, 'event')
+        order = _field(update, 'order') or {}
+        state = self._apply(_field(order, 'id'), order, _field(order, 'status') or event)
+        if self.record_path:
+            with open(self.record_path, 'a') as f:
+                f.write(json.dumps({'at': round(time.monotonic() - self.started, 3), 'event': event, 'order': state}) + '\n')
+        self._notify(event, state)
+
+    def _notify(self, event, state):
+        for listener in self.listeners:
+            listener(event, state)
+
+    def _apply(self, order_id, order, status):
+        with self.condition:
+            state = self.orders.setdefault(str(order_id), {'id': str(order_id)})
+            for name in ['symbol', 'side', 'qty', 'notional', 'filled_qty', 'filled_avg_price']:
+                value = _field(order, name)
+                if value is not None:
+                    state[name] = value
+            if state.get('status') not in TERMINAL_STATUSES:
+                # A fill event can arrive before submit_order returns; the submission must not undo it
+                state['status'] = status
+            self.condition.notify_all()
+            return dict(state)
+
+    def status(self, order_id):
+        with self.condition:
+            state = self.orders.get(str(order_id))
+            return state['status'] if state else None
+
+    def _pending(self, order_ids):
+        return {str(order_id) for order_id in order_ids if self.orders.get(str(order_id), {}).get('status') not in TERMINAL_STATUSES}
+
+    def pending(self, order_ids):
+        with self.condition:
+            return self._pending(order_ids)
+
+    def wait(self, order_ids, timeout=None, reconcile=None):
+        """
+        Blocks until every order in `order_ids` reaches a terminal status or `timeout` seconds pass.
+        With `reconcile` (e.g. api.get_order), still-pending orders are re-read from the broker every
+        RECONCILE_INTERVAL seconds. Returns the ids still pending.
+        """
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while True:
+            step = RECONCILE_INTERVAL if reconcile is not None else None
+            if deadline is not None:
+                step = max(0.0, deadline - time.monotonic()) if step is None else max(0.0, min(step, deadline - time.monotonic()))
+            with self.condition:
+                self.condition.wait_for(lambda: not self._pending(order_ids), timeout=step)
+                pending = self._pending(order_ids)
+            if not pending or (deadline is not None and time.monotonic() >= deadline):
+                return pending
+            if reconcile is None:
+                continue
+            for order_id in pending:
+                try:
+                    self.record(reconcile(order_id))
+                except Exception as e:
+                    logging.error(f"Failed to reconcile order {order_id}: {e}")
+
+
+def start_stream(tracker, api_key, api_secret, base_url):
+    """Feeds the tracker from Alpaca's trade_updates stream on a background thread. Returns the stream (call stop() when done)."""
+    from alpaca_trade_api.stream import Stream
+
+    stream = Stream(api_key, api_secret, base_url=base_url)
+
+    async def handle_trade_update(update):
+        tracker.on_update(update)
+
+    stream.subscribe_trade_updates(handle_trade_update)
+    threading.Thread(target=stream.run, daemon=True).start()
+    return stream
+
+
+def replay_updates(path, tracker, speed=None):
+    """Feeds recorded trade updates (the tracker's record_path format) into `tracker`; with `speed`, at that multiple of the recorded pace."""
+    previous = 0.0
+    with open(path) as f:
+        for line in f:
+            update = json.loads(line)
+            if speed:
+                time.sleep(max(0.0, update['at'] - previous) / speed)
+                previous = update['at']
+            tracker.on_update(update)
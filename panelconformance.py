@@ -0,0 +1,98 @@
+import argparse
+
+import numpy as np
+import pandas as pd
+
+import pricepanel
+import relativestrength
+import technicaldata
+
+# Conformance check of the price panel path in technicaldata.py against the per-symbol float64 path
+# it replaced: every symbol's bars become a DataFrame of their own, and the stock/SPY and stock/sector
+# ETF ratios are each series divided by the benchmark reindexed onto the stock's dates. Both paths
+# feed compute_indicators, and every column must come out bit-identical.
+
+
+def synthetic_records(calendar, seed, skip=0):
+    """FMP-style bar records (2-decimal prices, integer volumes up to ~1e8) with `skip` random bars missing."""
+    rng = np.random.default_rng(seed)
+    n_bars = len(calendar)
+    close = 20 * np.exp(rng.uniform(0, 3)) * np.exp(np.cumsum(rng.normal(0.0003, 0.02, n_bars)))
+    open_price = close * np.exp(rng.normal(0, 0.006, n_bars))
+    high = np.maximum(open_price, close) * np.exp(np.abs(rng.normal(0, 0.01, n_bars)))
+    low = np.minimum(open_price, close) * np.exp(-np.abs(rng.normal(0, 0.01, n_bars)))
+    volume = rng.integers(200_000, 120_000_000, n_bars)
+    keep = np.sort(rng.choice(n_bars, n_bars - skip, replace=False))
+    return [{'date': calendar[i].strftime('%Y-%m-%d'), 'open': round(open_price[i], 2), 'high': round(high[i], 2),
+             'low': round(low[i], 2), 'close': round(close[i], 2), 'volume': int(volume[i])} for i in keep]
+
+
+def baseline_frame(records):
+    """A symbol's bars as their own date-indexed float64 DataFrame, as before the panel."""
+    frame = pd.DataFrame(records)
+    frame['date'] = pd.to_datetime(frame['date'])
+    return frame.set_index('date').sort_index()[pricepanel.FIELDS].astype(np.float64)
+
+
+def baseline_ratios(daily_prices, benchmark):
+    return {field: daily_prices[field] / benchmark[field].reindex(daily_prices.index) for field in pricepanel.FIELDS}
+
+
+def compare(symbol, expected, actual):
+    failures = []
+    for column in expected.columns:
+        if column in ('symbol', 'index_name', 'date'):
+            continue
+        want = expected[column].to_numpy(dtype=np.float64)
+        got = actual[column].to_numpy(dtype=np.float64)
+        if not np.array_equal(want, got, equal_nan=True):
+            both = ~np.isnan(want) & ~np.isnan(got)
+            worst = np.max(np.abs(want[both] - got[both])) if both.any() else float('nan')
+            failures.append(f"{column} (max diff {worst:.3g})")
+    print(f"{symbol}: {expected.shape[1] - 3 - len(failures)}/{expected.shape[1] - 3} columns identical")
+    for failure in failures:
+        print(f"  MISMATCH {failure}")
+    return not failures
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Checks the price panel path against per-symbol float64 DataFrames.")
+    parser.add_argument('--bars', type=int, default=750, help="trading days of synthetic history")
+    parser.add_argument('--symbols', type=int, default=6, help="number of synthetic stocks")
+    args = parser.parse_args()
+
+    calendar = pd.bdate_range('2022-01-03', periods=args.bars, name='date')
+    sectors = list(technicaldata.sectorlist)
+    benchmark_records = {'SPY': synthetic_records(calendar, 0)}
+    benchmark_records.update({etf: synthetic_records(calendar, 100 + i) for i, etf in enumerate(technicaldata.sectorlist.values())})
+    stocks = [(f"S{i}", sectors[i % len(sectors)] if i % 5 else 'Unknown', synthetic_records(calendar, 1000 + i, skip=i * 3))
+              for i in range(args.symbols)]
+
+    benchmarks = pricepanel.PricePanel(list(benchmark_records), pricepanel.calendar_from_bars(benchmark_records['SPY']))
+    for symbol, records in benchmark_records.items():
+        benchmarks.set_bars(symbol, records)
+    universe = pricepanel.PricePanel([symbol for symbol, _, _ in stocks], benchmarks.dates)
+    for symbol, _, records in stocks:
+        universe.set_bars(symbol, records)
+    etfs = [technicaldata.sectorlist.get(sector) for _, sector, _ in stocks]
+    ratios = relativestrength.symbol_ratios(universe, benchmarks, 'SPY', etfs, universe.symbols)
+
+    baseline_benchmarks = {symbol: baseline_frame(records) for symbol, records in benchmark_records.items()}
+    no_etf = baseline_benchmarks['SPY'] * np.nan
+    ok = True
+    for (symbol, sector, records), etf in zip(stocks, etfs):
+        daily_prices = baseline_frame(records)
+        expected = technicaldata.compute_indicators(symbol, 'X', daily_prices,
+                                                    baseline_ratios(daily_prices, baseline_benchmarks['SPY']),
+                                                    baseline_ratios(daily_prices, baseline_benchmarks.get(etf, no_etf)))
+        panel_prices = universe.frame(symbol)
+        actual = technicaldata.compute_indicators(symbol, 'X', panel_prices,
+                                                  relativestrength.ratio_series(ratios[symbol]['price'], panel_prices.index),
+                                                  relativestrength.ratio_series(ratios[symbol]['sector'], panel_prices.index))
+        ok &= compare(symbol, expected, actual)
+    print("The price panel matches the per-symbol float64 path." if ok else "The price panel does not match the per-symbol float64 path.")
+    raise SystemExit(0 if ok else 1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,111 @@
+import logging
+import threading
+from types import SimpleNamespace
+
+# Per-run snapshot of everything trade.py decides on: positions, account, betas, screener scores,
+# the symbols with a stock_scores row, the wash-sale set and the exclusion list. It is loaded with
+# one positions call, one account call and one query per table over a single connection, then kept
+# current from the order tracker's fill events, so every lookup during a rebalance is a dict read.
+# Symbols are held in API format (BRK.B).
+
+DEFAULT_BETA = 1  # beta assumed for symbols missing from stock_data
+
+
+def api_symbol(symbol):
+    return symbol.replace('-', '.')
+
+
+def holding(position):
+    """A mutable copy of an Alpaca position with the fields the rebalance reads, as floats."""
+    return SimpleNamespace(symbol=position.symbol, qty=float(position.qty), current_price=float(position.current_price),
+                           market_value=float(position.market_value), avg_entry_price=float(position.avg_entry_price))
+
+
+class PortfolioState:
+
+    def __init__(self, positions, account, betas, scores, scored_symbols, wash_sale, exclusion):
+        self.positions = positions  # symbol -> holding
+        self.account = account  # SimpleNamespace(portfolio_value, cash)
+        self.betas = betas
+        self.scores = scores  # symbol -> (core_score, quality_score, growth_score)
+        self.scored_symbols = scored_symbols  # symbols with a stock_scores row
+        self.wash_sale = wash_sale
+        self.exclusion = exclusion
+        self.filled = {}  # order id -> (filled qty, filled notional) already applied
+        self.lock = threading.Lock()
+
+    @classmethod
+    def load(cls, api, connect):
+        """Loads the snapshot from the broker and from the database through `connect()`."""
+        positions = {position.symbol: holding(position) for position in api.list_positions()}
+        account = api.get_account()
+        account = SimpleNamespace(portfolio_value=float(account.portfolio_value), cash=float(account.cash))
+
+        conn = connect()
+        cursor = conn.cursor(buffered=True)
+        try:
+            def rows(query):
+                cursor.execute(query)
+                return cursor.fetchall()
+
+            scores = {api_symbol(symbol): (core, quality, growth)
+                      for symbol, core, quality, growth in rows("SELECT symbol, core_score, quality_score, growth_score FROM stock_screener_scores")}
+            scored_symbols = {api_symbol(symbol) for (symbol,) in rows("SELECT symbol FROM stock_scores")}
+            betas = {api_symbol(symbol): float(beta) for symbol, beta in rows("SELECT symbol, beta FROM stock_data") if beta is not None}
+            wash_sale = {api_symbol(symbol) for (symbol,) in rows("SELECT symbol FROM wash_sale")}
+            exclusion = [api_symbol(symbol) for (symbol,) in rows("SELECT symbol FROM exclusion_list")]
+        finally:
+            cursor.close()
+            conn.close()
+
+        logging.info(f"Portfolio state loaded: {len(positions)} positions, {len(scores)} scores, {len(betas)} betas, "
+                     f"{len(wash_sale)} wash-sale and {len(exclusion)} excluded symbols.")
+        return cls(positions, account, betas, scores, scored_symbols, wash_sale, exclusion)
+
+    def beta(self, symbol):
+        return self.betas.get(api_symbol(symbol), DEFAULT_BETA)
+
+    def has_scores(self, symbol):
+        return api_symbol(symbol) in self.scored_symbols
+
+    def snapshot(self):
+        """
+        Copies of (positions, account) taken under the lock. The stream thread applies fills to
+        the live objects, so anything that iterates positions, such as the order planners, reads a
+        snapshot instead.
+        """
+        with self.lock:
+            positions = {symbol: SimpleNamespace(**vars(position)) for symbol, position in self.positions.items()}
+            return positions, SimpleNamespace(**vars(self.account))
+
+    def on_trade_update(self, event, order):
+        """ordertracker listener: applies the part of an order's fill not seen yet to positions and cash."""
+        if event not in ('fill', 'partial_fill') or not order.get('filled_qty'):
+            return
+        filled_qty = float(order['filled_qty'])
+        filled_notional = filled_qty * float(order.get('filled_avg_price') or 0)
+        with self.lock:
+            seen_qty, seen_notional = self.filled.get(order['id'], (0.0, 0.0))
+            qty, notional = filled_qty - seen_qty, filled_notional - seen_notional
+            if qty <= 0:
+                return
+            self.filled[order['id']] = (filled_qty, filled_notional)
+            price = notional / qty
+            symbol = order['symbol']
+            position = self.positions.get(symbol)
+            if order['side'] == 'buy':
+                self.account.cash -= notional
+                if position is None:
+                    position = self.positions[symbol] = SimpleNamespace(symbol=symbol, qty=0.0, current_price=price, market_value=0.0, avg_entry_price=price)
+                position.avg_entry_price = (position.avg_entry_price * position.qty + notional) / (position.qty + qty)
+                position.qty += qty
+            else:
+                self.account.cash += notional
+                if position is None:
+                    return
+                position.qty -= qty
+                if position.qty <= 1e-9:
+                    del self.positions[symbol]
+                    return
+            position.current_price = price
+            position.market_value = position.qty * price
@@ -0,0 +1,98 @@
+import numpy as np
+import pandas as pd
+
+# Dense in-memory daily bars for a whole universe: one (symbols x dates x fields) array on a shared
+# trading calendar instead of a pandas DataFrame per symbol. Missing bars are NaN; `mask` marks the
+# bars that are present. Every row shares the calendar, so aligning a stock with a benchmark is a
+# plain broadcast over the same positions rather than a reindex.
+
+# Configuration constants
+FIELDS = ['open', 'high', 'low', 'close', 'volume']
+# Bars are held in double precision: the indicators and the stock/benchmark ratios are computed from
+# these values, and rounding them to float32 first shifts range-based indicators (BOP, AD, ADOSC)
+# well beyond FLOAT storage precision. Volume, a BIGINT above 2**24, is also exact in float64.
+DTYPE = np.float64
+
+
+def calendar_from_bars(records):
+    """Sorted trading dates of a bar list (e.g. SPY's), used as the panel calendar."""
+    return pd.DatetimeIndex(sorted(set(pd.to_datetime([record['date'] for record in records]).normalize())), name='date')
+
+
+class PricePanel:
+    """Daily OHLCV bars for `symbols` on `calendar`, held in one float64 array."""
+
+    def __init__(self, symbols, calendar):
+        self.symbols = list(symbols)
+        self.symbol_index = {symbol: i for i, symbol in enumerate(self.symbols)}
+        self.dates = pd.DatetimeIndex(calendar, name='date')
+        self.values = np.full((len(self.symbols), len(self.dates), len(FIELDS)), np.nan, dtype=DTYPE)
+
+    def _present(self, positions=slice(None)):
+        return ~np.isnan(self.values[positions]).all(axis=-1)
+
+    @property
+    def mask(self):
+        """(symbols x dates) boolean array, True where a bar is present."""
+        return self._present()
+
+    @property
+    def nbytes(self):
+        return self.values.nbytes
+
+    def set_bars(self, symbol, records):
+        """
+        Fills a symbol's row from FMP bar records (dicts with 'date' and the OHLCV fields); rows for
+        different symbols can be filled from different threads. Returns the number of bars dropped
+        because their date is not on the calendar.
+        """
+        dates = pd.to_datetime([record['date'] for record in records]).normalize()
+        positions = self.dates.get_indexer(dates)
+        inside = positions >= 0
+        bars = pd.DataFrame.from_records(records, columns=FIELDS).apply(pd.to_numeric, errors='coerce').to_numpy(dtype=DTYPE)
+        self.values[self.symbol_index[symbol], positions[inside]] = bars[inside]
+        return int((~inside).sum())
+
+    def frame(self, symbol):
+        """The symbol's present bars as a date-indexed DataFrame (the layout talib and compute_indicators use)."""
+        position = self.symbol_index[symbol]
+        present = self._present(position)
+        return pd.DataFrame(self.values[position][present], index=self.dates[present], columns=FIELDS)
+
+    def series(self, symbol):
+        """The symbol's bars on the full calendar as Series keyed by field."""
+        row = self.values[self.symbol_index[symbol]]
+        return {field: pd.Series(row[:, i], index=self.dates, name=field) for i, field in enumerate(FIELDS)}
+
+    def row(self, symbol):
+        """The symbol's (dates x fields) bars on the full calendar, NaN where missing."""
+        return self.values[self.symbol_index[symbol]]
+
+    def stack(self, symbols):
+        """
+        Rows for `symbols` (repeats allowed) as one (len(symbols) x dates x fields) array, e.g. each
+        stock's sector ETF. Symbols not in the panel get all-NaN rows.
+        """
+        positions = np.array([self.symbol_index.get(symbol, -1) for symbol in symbols], dtype=int)
+        stacked = np.full((len(positions), len(self.dates), len(FIELDS)), np.nan, dtype=DTYPE)
+        found = positions >= 0
+        stacked[found] = self.values[positions[found]]
+        return stacked
+
+    def relative_to(self, benchmark, symbols=None):
+        """
+        The bars of `symbols` (default: every symbol) divided by a benchmark on the same calendar in a
+        single broadcast. The benchmark is either one (dates x fields) row shared by all symbols (e.g.
+        SPY) or a per-symbol (symbols x dates x fields) stack (e.g. from stack()). Returns a
+        (symbols x dates x fields) array.
+        """
+        positions = slice(None) if symbols is None else [self.symbol_index[symbol] for symbol in symbols]
+        benchmark = np.asarray(benchmark, dtype=DTYPE)
+        if benchmark.ndim == 2:
+            benchmark = benchmark[np.newaxis, :, :]
+        with np.errstate(divide='ignore', invalid='ignore'):
+            return self.values[positions] / benchmark
+
+    def present_rows(self, row, symbol):
+        """A symbol's (dates x fields) row of an array such as relative_to()'s, at its present bars only."""
+        return row[self._present(self.symbol_index[symbol])]
@@ -0,0 +1,157 @@
+import logging
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from fmpfetch import TokenBucket
+
+# Rebalance executor used by trade.swap_stocks. Prices for every target symbol come from one
+# multi-symbol snapshot call, the complete sell and buy order lists are computed up front, and
+# each list is then submitted concurrently under a shared broker rate limit. Works with any object
+# exposing the Alpaca REST methods, so benchrebalance.py can run it against a local fake broker.
+
+# Configuration constants
+ALPACA_REQUESTS_PER_MINUTE = 150  # sustained order rate
+ORDER_BURST = 40  # orders that may go out back to back; burst + rate stays under Alpaca's 200 requests in any minute
+ORDER_WORKERS = 8  # concurrent order submissions
+
+# Shared by every submission in this process
+rate_limiter = TokenBucket(ALPACA_REQUESTS_PER_MINUTE, capacity=ORDER_BURST)
+
+
+def order_params(symbol, side, notional=None, quantity=None, limit_price=None, trail_percent=None):
+    """Alpaca submit_order parameters for an order in API symbol format."""
+    params = {
+        "symbol": symbol,
+        "side": side,
+        "type": "market",
+        "time_in_force": "day"
+    }
+
+    if limit_price is not None:
+        params["type"] = "limit"
+        params["limit_price"] = round(limit_price, 2)
+        params["qty"] = int(quantity)  # Ensure quantity is an integer
+    elif trail_percent is not None:
+        params["type"] = "trailing_stop"
+        params["trail_percent"] = round(trail_percent, 2)
+        params["qty"] = int(quantity)
+    elif quantity is not None:
+        params["qty"] = int(quantity)
+    elif notional is not None:
+        params["notional"] = round(notional, 2)  # Adjusting precision for notional orders
+    return params
+
+
+def latest_prices(data_api, symbols):
+    """{symbol: last trade price} for all symbols from one snapshot request; symbols without a trade are left out."""
+    snapshots = data_api.get_snapshots(list(symbols)) or {}
+    prices = {}
+    for symbol in symbols:
+        snapshot = snapshots.get(symbol)
+        trade = getattr(snapshot, 'latest_trade', None) if snapshot is not None else None
+        if trade is None:
+            logging.warning(f"No snapshot price for {symbol}.")
+            continue
+        prices[symbol] = float(trade.price)
+    return prices
+
+
+def sell_orders(symbol, position, beta_for, trailing_stop_for):
+    """Orders that close a position: limit/trailing stop for whole shares, notional for the fractional rest."""
+    quantity = float(position.qty)
+    current_price = float(position.current_price)
+    avg_entry_price = float(position.avg_entry_price)
+
+    if quantity < 1:
+        # Sell fractional shares as notional
+        notional_value = round(quantity * current_price * 0.99, 2)  # Apply a small buffer to avoid precision issues
+        return [{'symbol': symbol, 'side': 'sell', 'notional': notional_value}]
+
+    orders = []
+    full_shares = int(quantity)
+    fractional_shares = quantity - full_shares
+    gain_percentage = ((current_price - avg_entry_price) / avg_entry_price) * 100
+    if gain_percentage < 2:  # Update to 2% threshold
+        # If the gain is too small, sell immediately
+        logging.info(f"Gain for {symbol} is less than 2%. Selling immediately.")
+        limit_price = round(current_price * 0.97, 2)
+        if full_shares > 0:
+            orders.append({'symbol': symbol, 'side': 'sell', 'quantity': full_shares, 'limit_price': limit_price})
+    else:
+        trailing_stop_percentage = trailing_stop_for(gain_percentage, beta_for(symbol))
+        logging.info(f"Placing trailing stop order for {symbol} with a stop of {trailing_stop_percentage}%.")
+        if full_shares > 0:
+            orders.append({'symbol': symbol, 'side': 'sell', 'quantity': full_shares, 'trail_percent': trailing_stop_percentage})
+    if fractional_shares > 0:
+        notional_value = round(fractional_shares * current_price * 0.99, 2)  # Apply a small buffer to avoid precision issues
+        orders.append({'symbol': symbol, 'side': 'sell', 'notional': notional_value})
+    return orders
+
+
+def buy_orders(symbol, investment_value, current_price):
+    """Orders that invest `investment_value`: a limit order for whole shares plus a notional order for the rest."""
+    orders = []
+    full_shares = int(investment_value // current_price)
+    fractional_value = investment_value - (full_shares * current_price)
+
+    if full_shares > 0:
+        limit_price = round(current_price * 1.03, 2)  # 3% buffer for buy limit orders
+        orders.append({'symbol': symbol, 'side': 'buy', 'quantity': full_shares, 'limit_price': limit_price})
+    if fractional_value > 0:
+        orders.append({'symbol': symbol, 'side': 'buy', 'notional': round(fractional_value, 2)})
+    return orders
+
+
+def plan_sells(positions, keep, beta_for, trailing_stop_for):
+    """Sell orders for every position whose symbol is not in `keep`."""
+    orders = []
+    for position_symbol, position in positions.items():
+        if position_symbol not in keep:
+            logging.info(f"Selling entire position of {position_symbol}, quantity: {position.qty}, to reallocate funds.")
+            orders.extend(sell_orders(position_symbol, position, beta_for, trailing_stop_for))
+    return orders
+
+
+def plan_buys(top_stocks, positions, target_investment_per_stock, prices):
+    """
+    Buy orders that bring each (symbol, core_score, quality_score, growth_score) in `top_stocks`
+    up to the per-stock target, priced from `prices`. Symbols without a price are skipped.
+    """
+    orders = []
+    for symbol, core_score, quality_score, growth_score in top_stocks:
+        if symbol not in positions and quality_score > 0 and growth_score > 0:
+            investment = target_investment_per_stock
+            logging.info(f"Buying {symbol} to add to the portfolio, targeting investment of {target_investment_per_stock}.")
+        elif symbol in positions:
+            current_investment = float(positions[symbol].market_value)
+            if current_investment >= target_investment_per_stock:
+                continue
+            investment = target_investment_per_stock - current_investment
+            logging.info(f"Adjusting position for {symbol}. Current investment: {current_investment}. Buying additional amount to reach target investment of {target_investment_per_stock}.")
+        else:
+            continue
+        if symbol not in prices:
+            logging.error(f"Skipping buy of {symbol}: no current price.")
+            continue
+        orders.extend(buy_orders(symbol, investment, prices[symbol]))
+    return orders
+
+
+def submit_all(orders, submit, max_workers=ORDER_WORKERS, limiter=None):
+    """
+    Calls submit(**order) for every order on a thread pool, taking a rate-limiter token per order.
+    The orders must be independent of each other. Returns the results in order.
+    """
+    if not orders:
+        return []
+    limiter = limiter or rate_limiter
+
+    def run(order):
+        limiter.acquire()
+        return submit(**order)
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        results = list(executor.map(run, orders))
+    logging.info(f"Submitted {len(orders)} orders in {time.perf_counter() - start:.2f}s.")
+    return results
@@ -0,0 +1,35 @@
+import pandas as pd
+import pricepanel
+
+# Relative strength of a whole universe against SPY and each stock's sector ETF. The universe and
+# benchmark panels share SPY's calendar, so the stock/benchmark ratio series of a batch of symbols
+# (up to the whole universe) come out of one broadcast per benchmark over the universe panel instead
+# of a reindex and divide per symbol and field.
+
+
+def ratio_panels(universe, benchmarks, spy_symbol, etf_symbols, symbols=None):
+    """
+    Divides the universe panel rows of `symbols` (default: every symbol) by the SPY row and by each
+    symbol's sector ETF (`etf_symbols` lines up with `symbols`; None or an ETF missing from
+    `benchmarks` gives NaN ratios).
+    Returns {'price': ..., 'sector': ...}, each a float64 (symbols x dates x fields) array.
+    """
+    return {
+        'price': universe.relative_to(benchmarks.row(spy_symbol), symbols),
+        'sector': universe.relative_to(benchmarks.stack(etf_symbols), symbols),
+    }
+
+
+def symbol_ratios(universe, benchmarks, spy_symbol, etf_symbols, symbols):
+    """
+    Each of `symbols`' ratio rows at its present bars, from one ratio_panels() broadcast over the batch:
+    {symbol: {'price': rows, 'sector': rows}}.
+    """
+    ratios = ratio_panels(universe, benchmarks, spy_symbol, etf_symbols, symbols)
+    return {symbol: {benchmark: universe.present_rows(values[i], symbol) for benchmark, values in ratios.items()}
+            for i, symbol in enumerate(symbols)}
+
+
+def ratio_series(rows, index):
+    """(bars x fields) ratio rows as {field: Series} on the stock's dates."""
+    return {field: pd.Series(rows[:, i], index=index) for i, field in enumerate(pricepanel.FIELDS)}
@@ -0,0 +1,161 @@
+import os
+import json
+import gzip
+import time
+import hashlib
+import logging
+import threading
+from datetime import datetime, timedelta
+from urllib.parse import urlsplit, parse_qsl
+
+# On-disk cache of raw FMP responses so reruns of any pipeline step do not re-download (or spend quota on) the same data.
+
+# Configuration constants
+CACHE_DIR = os.environ.get('FMP_CACHE_DIR', os.path.join(os.path.dirname(os.path.abspath(__file__)), '.fmp_cache'))
+CACHE_MAX_BYTES = 2 * 1024 ** 3  # Least recently used entries are evicted beyond this size
+CACHE_ONLY = os.environ.get('FMP_CACHE_ONLY', '') == '1'  # Offline mode: serve whatever is cached, never call the API
+CACHE_ENABLED = os.environ.get('FMP_CACHE_DISABLED', '') != '1'
+
+DAY = 24 * 60 * 60
+UNTIL_NEXT_FILING = 'until_next_filing'
+ANNUAL_FILING_INTERVAL = timedelta(days=365)  # an annual statement is superseded roughly a year after its fillingDate
+ENDPOINT_TTLS = {
+    'profile': 7 * DAY,
+    'ratios-ttm': DAY,
+    'key-metrics-ttm': DAY,
+    'balance-sheet-statement': UNTIL_NEXT_FILING,
+    'income-statement': UNTIL_NEXT_FILING,
+    'financial-growth': UNTIL_NEXT_FILING,
+    'historical-chart': DAY / 2,
+}
+DEFAULT_TTL = DAY
+
+_lock = threading.Lock()
+_index = None  # key -> [size_bytes, last_access]; built lazily from the files on disk
+_total_bytes = 0
+
+
+def cache_key(url):
+    """
+    Splits an FMP URL into (endpoint, symbol, params, key). The key covers the host, the full path and
+    the query parameters, so the same path on another host or API version is a different entry; the
+    API key is not part of it.
+    """
+    parts = urlsplit(url)
+    path = parts.path.split('/api/v3/', 1)[-1].strip('/').split('/')
+    endpoint = path[0]
+    symbol = path[-1] if len(path) > 1 else ''
+    params = sorted((k, v) for k, v in parse_qsl(parts.query) if k.lower() != 'apikey')
+    canonical = json.dumps([parts.netloc.lower(), parts.path.rstrip('/'), params])
+    return endpoint, symbol, params, hashlib.sha256(canonical.encode()).hexdigest()
+
+
+def _path_for(key):
+    return os.path.join(CACHE_DIR, key[:2], f"{key}.json.gz")
+
+
+def _load_index():
+    global _index, _total_bytes
+    if _index is not None:
+        return
+    _index = {}
+    _total_bytes = 0
+    if not os.path.isdir(CACHE_DIR):
+        return
+    for root, _, files in os.walk(CACHE_DIR):
+        for name in files:
+            if name.endswith('.json.gz'):
+                stat = os.stat(os.path.join(root, name))
+                _index[name[:-len('.json.gz')]] = [stat.st_size, stat.st_mtime]
+                _total_bytes += stat.st_size
+
+
+def _evict():
+    global _total_bytes
+    if _total_bytes <= CACHE_MAX_BYTES:
+        return
+    for key, (size, _) in sorted(_index.items(), key=lambda item: item[1][1]):
+        try:
+            os.remove(_path_for(key))
+        except OSError:
+            pass
+        del _index[key]
+        _total_bytes -= size
+        if _total_bytes <= CACHE_MAX_BYTES:
+            break
+
+
+def _is_fresh(endpoint, entry, now):
+    ttl = ENDPOINT_TTLS.get(endpoint, DEFAULT_TTL)
+    age = now - entry['fetched_at']
+    if ttl != UNTIL_NEXT_FILING:
+        return age < ttl
+    filing_dates = [row.get('fillingDate') for row in entry['data'] if isinstance(row, dict) and row.get('fillingDate')]
+    if not filing_dates:
+        return age < DEFAULT_TTL
+    next_filing = datetime.strptime(max(filing_dates)[:10], '%Y-%m-%d') + ANNUAL_FILING_INTERVAL
+    # Once the next filing is due, check for it at most once a day
+    return datetime.fromtimestamp(now) < next_filing or age < DEFAULT_TTL
+
+
+def read(url, allow_stale=False):
+    """Returns the cached payload for url, or None when missing or expired."""
+    endpoint, _, _, key = cache_key(url)
+    with _lock:
+        _load_index()
+        if key not in _index:
+            return None
+    try:
+        with gzip.open(_path_for(key), 'rt', encoding='utf-8') as f:
+            entry = json.load(f)
+    except (OSError, ValueError):
+        return None
+    now = time.time()
+    if not allow_stale and not _is_fresh(endpoint, entry, now):
+        return None
+    with _lock:
+        if key in _index:
+            _index[key][1] = now
+    return entry['data']
+
+
+def write(url, data):
+    endpoint, symbol, params, key = cache_key(url)
+    path = _path_for(key)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    entry = {'endpoint': endpoint, 'symbol': symbol, 'params': params, 'fetched_at': time.time(), 'data': data}
+    tmp_path = f"{path}.{threading.get_ident()}.tmp"
+    with gzip.open(tmp_path, 'wt', encoding='utf-8') as f:
+        json.dump(entry, f)
+    os.replace(tmp_path, path)
+    size = os.path.getsize(path)
+
+    global _total_bytes
+    with _lock:
+        _load_index()
+        previous = _index.get(key)
+        if previous:
+            _total_bytes -= previous[0]
+        _index[key] = [size, entry['fetched_at']]
+        _total_bytes += size
+        _evict()
+
+
+def get_or_fetch(url, fetch, description=None):
+    """
+    Serves url from the cache when fresh, otherwise calls fetch() and caches a non-empty result.
+    In CACHE_ONLY mode the network is never used and stale entries are returned.
+    """
+    if not CACHE_ENABLED:
+        return fetch()
+    data = read(url, allow_stale=CACHE_ONLY)
+    if data is not None:
+        logging.info(f"Cache hit for {description or url}.")
+        return data
+    if CACHE_ONLY:
+        logging.warning(f"Cache-only mode: no cached response for {description or url}.")
+        return None
+    data = fetch()
+    if data:
+        write(url, data)
+    return data
@@ -0,0 +1,71 @@
+import numpy as np
+
+# Cross-sectional factor scoring for stockscreener.py. A sector universe is held as one
+# (stocks x metrics) float matrix with NaN marking missing values, so inversion, z-scoring
+# and the factor means are whole-matrix operations instead of per-stock dict loops.
+
+
+def unique_metrics(factors):
+    """Metric names used by any factor, in first-seen order."""
+    return list(dict.fromkeys(metric for metrics in factors.values() for metric in metrics))
+
+
+def build_matrix(stocks, metrics):
+    """
+    Builds the (stocks x metrics) float matrix from a list of stock dicts or a DataFrame.
+    None and missing values become NaN.
+    """
+    if hasattr(stocks, 'reindex'):
+        return stocks.reindex(columns=metrics).to_numpy(dtype=float, na_value=np.nan)
+    return np.array([[stock.get(metric) for metric in metrics] for stock in stocks], dtype=float).reshape(len(stocks), len(metrics))
+
+
+def invert_columns(matrix, metrics, metrics_to_invert):
+    """Replaces x with 1/x in the listed columns, leaving zeros and missing values untouched."""
+    columns = [i for i, metric in enumerate(metrics) if metric in metrics_to_invert]
+    block = matrix[:, columns]
+    invertible = ~np.isnan(block) & (block != 0)
+    with np.errstate(divide='ignore'):
+        matrix[:, columns] = np.where(invertible, 1 / block, block)
+    return matrix
+
+
+def zscore_columns(matrix):
+    """
+    Population z-score (ddof=0) of each column over its non-missing values. Missing values score 0,
+    matching the screener's `stock.get(f"{m}_zscore", 0)`; a constant column yields NaN as scipy's zscore does.
+    """
+    present = ~np.isnan(matrix)
+    counts = present.sum(axis=0)
+    filled = np.where(present, matrix, 0.0)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        means = filled.sum(axis=0) / counts
+        deviations = np.where(present, matrix - means, 0.0)
+        stds = np.sqrt((deviations ** 2).sum(axis=0) / counts)
+        zscores = deviations / stds
+    return np.where(present, zscores, 0.0)
+
+
+def factor_scores(zscores, metrics, factors):
+    """
+    Mean z-score per factor. Factors are mean-reductions over a column selection, so a metric
+    listed twice in a factor is weighted twice, as in the original per-stock lists.
+    """
+    position = {metric: i for i, metric in enumerate(metrics)}
+    scores = {}
+    for name, factor_metrics in factors.items():
+        columns = [position[metric] for metric in factor_metrics]
+        scores[name] = zscores[:, columns].mean(axis=1)
+    return scores
+
+
+def score_universe(stocks, factors, metrics_to_invert):
+    """
+    Scores a sector universe in one pass: builds the matrix, inverts `metrics_to_invert`,
+    z-scores each column and reduces to one array per factor (aligned with `stocks`).
+    """
+    metrics = unique_metrics(factors)
+    matrix = build_matrix(stocks, metrics)
+    invert_columns(matrix, metrics, metrics_to_invert)
+    zscores = zscore_columns(matrix)
+    return factor_scores(zscores, metrics, factors)
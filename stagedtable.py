@@ -0,0 +1,106 @@
+import logging
+
+# Builds a table off to the side and swaps it in atomically. A load writes into `{table}_staging`
+# (optionally seeded with the live rows, so only what changed has to be written) and publishes it
+# with a single RENAME TABLE, so readers such as trade.py see either the previous table or the new
+# one, never a dropped, empty or half-loaded table. Works with any DB-API MySQL cursor.
+
+# Configuration constants
+STAGING_SUFFIX = '_staging'
+OLD_SUFFIX = '_old'
+
+
+def staging_name(table):
+    return f"{table}{STAGING_SUFFIX}"
+
+
+def table_columns(cursor, table):
+    cursor.execute(f"DESCRIBE {table}")
+    return [row['Field'] if isinstance(row, dict) else row[0] for row in cursor.fetchall()]
+
+
+def create_staging(cursor, table, create_sql, copy_existing=False):
+    """
+    Creates `table` from `create_sql` (a CREATE TABLE IF NOT EXISTS statement with a {table}
+    placeholder) if it does not exist yet, and a fresh staging table from the same statement.
+    With `copy_existing` the live rows are copied over (the columns both tables share), so an
+    incremental load only upserts what changed. Returns the staging table's name.
+    """
+    staging = staging_name(table)
+    cursor.execute(create_sql.format(table=table))
+    cursor.execute(f"DROP TABLE IF EXISTS {staging}")
+    cursor.execute(create_sql.format(table=staging))
+    if copy_existing:
+        live_columns = set(table_columns(cursor, table))
+        shared = ', '.join(f"`{column}`" for column in table_columns(cursor, staging) if column in live_columns)
+        cursor.execute(f"INSERT INTO {staging} ({shared}) SELECT {shared} FROM {table}")
+    return staging
+
+
+def swap_statements(*tables):
+    """Statements that replace each live table with its staging table in one atomic RENAME."""
+    renames = ', '.join(f"{table} TO {table}{OLD_SUFFIX}, {staging_name(table)} TO {table}" for table in tables)
+    return ([f"CREATE TABLE IF NOT EXISTS {table} LIKE {staging_name(table)}" for table in tables]
+            + [f"DROP TABLE IF EXISTS {table}{OLD_SUFFIX}" for table in tables]
+            + [f"RENAME TABLE {renames}"]
+            + [f"DROP TABLE {table}{OLD_SUFFIX}" for table in tables])
+
+
+def swap_in(cursor, *tables):
+    for statement in swap_statements(*tables):
+        cursor.execute(statement)
+    logging.info(f"Swapped in the new {', '.join(tables)}.")
+
+
+def upsert_query(table, fields, key_fields=()):
+    """INSERT ... ON DUPLICATE KEY UPDATE of every non-key field (INSERT IGNORE when all fields are keys)."""
+    columns = ', '.join(f"`{field}`" for field in fields)
+    placeholders = ', '.join(['%s'] * len(fields))
+    updates = ', '.join(f"`{field}` = VALUES(`{field}`)" for field in fields if field not in key_fields)
+    if not updates:
+        return f"INSERT IGNORE INTO {table} ({columns}) VALUES ({placeholders})"
+    return f"INSERT INTO {table} ({columns}) VALUES ({placeholders}) ON DUPLICATE KEY UPDATE {updates}"
+
+
+def upsert_rows(cursor, table, rows, key_fields, columns=None):
+    """
+    Upserts row dicts with one executemany per distinct field set. With `columns`, fields the
+    table does not have are dropped. Returns the number of rows written.
+    """
+    batches = {}
+    for row in rows:
+        if columns is not None:
+            row = {field: value for field, value in row.items() if field in columns}
+        batches.setdefault(tuple(row), []).append(tuple(row.values()))
+    for fields, values in batches.items():
+        cursor.executemany(upsert_query(table, fields, key_fields), values)
+    return sum(len(values) for values in batches.values())
+
+
+def _version(values):
+    return tuple(None if value in (None, '') else str(value) for value in values)
+
+
+def stored_versions(cursor, table, fields):
+    """{symbol: version} of the rows in `table`, where a version is the row's `fields` (e.g. fillingDate, acceptedDate) as strings."""
+    cursor.execute(f"SELECT symbol, {', '.join(fields)} FROM {table}")
+    return {row[0]: _version(row[1:]) for row in cursor.fetchall()}
+
+
+def is_unchanged(stored_version, row, fields):
+    """True when a fetched row carries the same version as the stored one, so it need not be written."""
+    return stored_version is not None and stored_version == _version(row.get(field) for field in fields)
+
+
+def delete_superseded(cursor, table, rows):
+    """
+    Keeps one statement per symbol: drops a symbol's rows dated differently from its newly written
+    row. This runs one DELETE per row, so pass a prepared cursor where the driver has one.
+    """
+    if rows:
+        cursor.executemany(f"DELETE FROM {table} WHERE symbol = %s AND date <> %s", [(row['symbol'], row['date']) for row in rows])
+
+
+def prune_symbols(cursor, table):
+    """Drops rows for symbols that are no longer in stock_symbols."""
+    cursor.execute(f"DELETE FROM {table} WHERE symbol NOT IN (SELECT symbol FROM stock_symbols)")
@@ -1,5 +1,6 @@
-import mysql.connector
 import pandas as pd
+import dbpool
+import stagedtable
 
 # Replace with your MySQL database credentials
 MYSQL_CONFIG = {
@@ -9,47 +10,28 @@ MYSQL_CONFIG = {
     'database': 'db'
 }
 
-def create_stock_symbols_table():
-    connection = mysql.connector.connect(**MYSQL_CONFIG)
-    cursor = connection.cursor()
-
-    # Drop the existing 'stock_symbols' table if it exists
-    cursor.execute("DROP TABLE IF EXISTS stock_symbols")
-    connection.commit()
-
-    # Create stock_symbols table if it doesn't exist
-    create_table_query = """
-        CREATE TABLE IF NOT EXISTS stock_symbols (
+def create_stock_symbols_table(cursor):
+    """Creates stock_symbols if needed and returns an empty staging copy to load the index lists into."""
+    return stagedtable.create_staging(cursor, 'stock_symbols', """
+        CREATE TABLE IF NOT EXISTS {table} (
             id INT AUTO_INCREMENT PRIMARY KEY,
             symbol VARCHAR(10) UNIQUE NOT NULL,
             sector VARCHAR(100) NOT NULL,
             index_name VARCHAR(10) NOT NULL
         );
-    """
-    cursor.execute(create_table_query)
-    connection.commit()
-
-    cursor.close()
-    connection.close()
-
-def load_stock_symbols(stock_symbols, index_name):
-    connection = mysql.connector.connect(**MYSQL_CONFIG)
-    cursor = connection.cursor()
+    """)
 
-    # Insert or update stock symbols in the table
-    insert_query = """
-        INSERT INTO stock_symbols (symbol, sector, index_name) VALUES (%s, %s, %s)
+def load_stock_symbols(cursor, stock_symbols, index_name, table='stock_symbols'):
+    # Insert or update stock symbols in the table; the update reads the incoming index through
+    # VALUES(), so the whole list goes out as one multi-row INSERT
+    insert_query = f"""
+        INSERT INTO {table} (symbol, sector, index_name) VALUES (%s, %s, %s)
         ON DUPLICATE KEY UPDATE index_name = CASE 
-            WHEN index_name = 'NASDAQ100' AND %s LIKE 'S&P%%' THEN VALUES(index_name) 
+            WHEN index_name = 'NASDAQ100' AND VALUES(index_name) LIKE 'S&P%' THEN VALUES(index_name) 
             ELSE index_name 
         END;
     """
-    for symbol, sector in stock_symbols:
-        cursor.execute(insert_query, (symbol, sector, index_name, index_name))
-
-    connection.commit()
-    cursor.close()
-    connection.close()
+    cursor.executemany(insert_query, [(symbol, sector, index_name) for symbol, sector in stock_symbols])
 
 def fetch_stock_symbols(url, symbol_col, sector_col=None):
     tables = pd.read_html(url)
@@ -62,22 +44,35 @@ def fetch_stock_symbols(url, symbol_col, sector_col=None):
             return stock_symbols
     return []
 
-create_stock_symbols_table()
+def main():
+    connection = dbpool.connect(MYSQL_CONFIG)
+    cursor = connection.cursor()
+    # The lists are loaded into a staging table and swapped in at the end, so the loaders and
+    # trade.py never see an empty or partially loaded stock_symbols
+    staging = create_stock_symbols_table(cursor)
+
+    # S&P 500
+    sp500_url = 'https://en.wikipedia.org/wiki/List_of_S%26P_500_companies'
+    sp500_stock_symbols = fetch_stock_symbols(sp500_url, 'Symbol', 'GICS Sector')
+    load_stock_symbols(cursor, sp500_stock_symbols, "S&P500", staging)
+    print("S&P 500 stock symbols have been loaded successfully.")
+
+    # S&P 600
+    #sp600_url = 'https://en.wikipedia.org/wiki/List_of_S%26P_600_companies'
+    #sp600_stock_symbols = fetch_stock_symbols(sp600_url, 'Symbol', 'GICS Sector')
+    #load_stock_symbols(cursor, sp600_stock_symbols, "S&P600", staging)
+    #print("S&P 600 stock symbols have been loaded successfully.")
 
-# S&P 500
-sp500_url = 'https://en.wikipedia.org/wiki/List_of_S%26P_500_companies'
-sp500_stock_symbols = fetch_stock_symbols(sp500_url, 'Symbol', 'GICS Sector')
-load_stock_symbols(sp500_stock_symbols, "S&P500")
-print("S&P 500 stock symbols have been loaded successfully.")
+    # S&P 400
+    #sp400_url = 'https://en.wikipedia.org/wiki/List_of_S%26P_400_companies'
+    #sp400_stock_symbols = fetch_stock_symbols(sp400_url, 'Symbol', 'GICS Sector')
+    #load_stock_symbols(cursor, sp400_stock_symbols, "S&P400", staging)
+    #print("S&P 400 stock symbols have been loaded successfully.")
 
-# S&P 600
-#sp600_url = 'https://en.wikipedia.org/wiki/List_of_S%26P_600_companies'
-#sp600_stock_symbols = fetch_stock_symbols(sp600_url, 'Symbol', 'GICS Sector')
-#load_stock_symbols(sp600_stock_symbols, "S&P600")
-#print("S&P 600 stock symbols have been loaded successfully.")
+    connection.commit()
+    stagedtable.swap_in(cursor, 'stock_symbols')
+    cursor.close()
+    connection.close()
 
-# S&P 400
-#sp400_url = 'https://en.wikipedia.org/wiki/List_of_S%26P_400_companies'
-#sp400_stock_symbols = fetch_stock_symbols(sp400_url, 'Symbol', 'GICS Sector')
-#load_stock_symbols(sp400_stock_symbols, "S&P400")
-#print("S&P 400 stock symbols have been loaded successfully.")
+if __name__ == "__main__":
+    main()
@@ -1,6 +1,4 @@
-import pymysql
 import numpy as np
-from scipy.stats import zscore
 from sklearn.linear_model import LinearRegression
 from sklearn.impute import SimpleImputer
 from sklearn.ensemble import RandomForestRegressor
@@ -13,24 +11,31 @@ from statistics import stdev
 from scipy.signal import argrelextrema
 
 import logging
+import os
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+import dbpool
+import scoringengine
+import stagedtable
 
 # Configure logging
 logging.basicConfig(level=logging.INFO)
 
-def insert_stock_scores(conn, stock_dicts):
+def insert_stock_scores(conn, stock_dicts, table='stock_screener_scores'):
     total_stocks = len(stock_dicts)
     stocks_without_scores = []
 
-    for stock in stock_dicts:
-        try:
-            with conn.cursor() as cursor:
+    query = f"""
+        INSERT INTO {table} (symbol, sector, quality_score, value_score, growth_score, momentum_score, technical_score, baseline_score, core_score, volatility_score)
+        VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s)
+    """
+    # The insert runs once per stock, so it is prepared once on the server rather than parsed per row
+    cursor = conn.cursor(prepared=True)
+    try:
+        for stock in stock_dicts:
+            try:
                 logging.info(f"Preparing to insert data for stock: {stock['symbol']}")
 
-                query = """
-                    INSERT INTO stock_screener_scores (symbol, sector, quality_score, value_score, growth_score, momentum_score, technical_score, baseline_score, core_score, volatility_score)
-                    VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s)
-                """
-
                 # Check for missing scores and replace with 'N/A'
                 values = (
                     stock['symbol'],
@@ -48,8 +53,10 @@ def insert_stock_scores(conn, stock_dicts):
                 cursor.execute(query, values)
                 logging.info(f"Successfully inserted data for stock: {stock['symbol']}")
 
-        except Exception as e:
-            logging.error(f"Failed to insert data for stock: {stock['symbol']}. Exception: {e}")
+            except Exception as e:
+                logging.error(f"Failed to insert data for stock: {stock['symbol']}. Exception: {e}")
+    finally:
+        cursor.close()
 
     conn.commit()
 
@@ -73,75 +80,67 @@ db_host = 'localhost'
 db_user = 'user'
 db_password = 'pass'
 db_name = 'db'
+MYSQL_CONFIG = {'host': db_host, 'user': db_user, 'password': db_password, 'database': db_name}
 
-# Connect to the MySQL database
-conn = pymysql.connect(host=db_host, user=db_user, password=db_password, db=db_name)
-cursor = conn.cursor()
-
-cursor.execute("DROP TABLE IF EXISTS stock_screener_scores")
-conn.commit()
-
-cursor.execute("""
-    CREATE TABLE IF NOT EXISTS stock_screener_scores (
-        symbol VARCHAR(255) PRIMARY KEY,
-        sector VARCHAR(255),
-        quality_score DOUBLE,
-        value_score DOUBLE,
-        growth_score DOUBLE,
-        momentum_score DOUBLE,
-        technical_score DOUBLE,
-        volatility_score DOUBLE,
-        baseline_score DOUBLE,
-        core_score DOUBLE
-    )
-""")
-conn.commit()
-
-# Get all unique sectors
-cursor.execute("SELECT DISTINCT sector FROM stock_data")
-sectors = cursor.fetchall()
+# Sectors are scored independently (own z-scores and RandomForest), so they run in parallel
+SCREENER_WORKERS = os.cpu_count()
+# Spawned rather than forked, since main.py --in-process runs this stage from a worker thread
+SCREENER_CONTEXT = multiprocessing.get_context('spawn')
 
 excluded_symbols = ["GOOG"]  
 
-for sector in sectors:
-    sector = sector[0]
-
-    # If the sector is None, skip it
-    if sector is None:
-        continue
-
-    print(f"Sector: {sector}")
-
-    # Fetch all stocks in the current sector
-   # Get the latest date from the ta table
-    cursor.execute("SELECT MAX(date) FROM technical_data")
-    latest_date = cursor.fetchone()[0]
-   
-    # Fetch all stocks in the current sector for the latest date
-    cursor.execute("""
-        SELECT stock_data.*, technical_data.roc, technical_data.rsi, technical_data.macd, technical_data.macd_signal, technical_data.macd_hist, technical_data.bop, 
-        technical_data.bbands_upper, technical_data.bbands_lower, technical_data.bbands_middle, technical_data.close, technical_data.apo, technical_data.ma, technical_data.cmo, technical_data.mom, 
-        technical_data.sar, technical_data.willr, technical_data.min, technical_data.max, technical_data.cci, technical_data.aroon_up, technical_data.aroon_down, technical_data.aroonosc, technical_data.ultosc, 
-        technical_data.natr, technical_data.atr, technical_data.tsf, technical_data.ad, technical_data.adosc, technical_data.apo, technical_data.tenkan_sen, technical_data.kijun_sen, 
-        technical_data.senkou_span_a, technical_data.senkou_span_b, technical_data.chikou_span, technical_data.stdev, technical_data.prev_close, technical_data.sma_10, 
-        technical_data.sma_20, technical_data.sma_50, technical_data.sma_200, technical_data.sma_100, technical_data.sma_150, technical_data.volume, technical_data.sma_volume_10, 
-        technical_data.bbands_percent_b, technical_data.mfi, technical_data.relative_price_sma_50, technical_data.relative_price_sma_200, 
-        technical_data.relative_price_rsi, technical_data.relative_price_bbands_upper, technical_data.relative_price_bbands_lower, 
-        technical_data.relative_price_macd_hist, technical_data.relative_close_spy, technical_data.macd_prev, technical_data.macd_hist_prev, 
-        technical_data.relative_sector_sma_50, technical_data.relative_sector_sma_200, technical_data.relative_sector_rsi, technical_data.relative_sector_bbands_upper,
-        technical_data.relative_sector_bbands_lower, technical_data.relative_sector_close, technical_data.relative_sector_macd_hist
+# technical_data columns the screener reads; technicaldata.py's 'screener' column profile computes and stores only these
+TECHNICAL_COLUMNS = ['roc', 'rsi', 'macd', 'macd_signal', 'macd_hist', 'bop', 'bbands_upper', 'bbands_lower', 'bbands_middle', 'close', 'apo', 'ma', 'cmo', 'mom', 'sar', 'willr', 'min', 'max', 'cci', 'aroon_up', 'aroon_down', 'aroonosc', 'ultosc', 'natr', 'atr', 'tsf', 'ad', 'adosc', 'tenkan_sen', 'kijun_sen', 'senkou_span_a', 'senkou_span_b', 'chikou_span', 'stdev', 'prev_close', 'sma_10', 'sma_20', 'sma_50', 'sma_200', 'sma_100', 'sma_150', 'volume', 'sma_volume_10', 'bbands_percent_b', 'mfi', 'relative_price_sma_50', 'relative_price_sma_200', 'relative_price_rsi', 'relative_price_bbands_upper', 'relative_price_bbands_lower', 'relative_price_macd_hist', 'relative_close_spy', 'macd_prev', 'macd_hist_prev', 'relative_sector_sma_50', 'relative_sector_sma_200', 'relative_sector_rsi', 'relative_sector_bbands_upper', 'relative_sector_bbands_lower', 'relative_sector_close', 'relative_sector_macd_hist']
+
+def load_latest_universe(cursor, stock_data=None):
+    """
+    Loads every stock's fundamentals joined with its own latest bar from technical_latest in a single
+    query and partitions the rows by sector in memory. Given `stock_data` (the frame
+    stockdatatablebuilder.py has just written, handed over by main.py --in-process), only
+    technical_latest is read and the join runs in memory.
+    """
+    if stock_data is not None:
+        return _join_latest_universe(cursor, stock_data)
+    # technical_latest holds one row per symbol, so a symbol whose last bar is a day stale is still screened
+    cursor.execute(f"""
+        SELECT stock_data.*, {', '.join(f'technical_data.{column}' for column in TECHNICAL_COLUMNS)}
         FROM stock_data
-        INNER JOIN technical_data ON stock_data.symbol = technical_data.symbol
-        WHERE stock_data.sector = %s AND technical_data.date = %s
-    """, (sector, latest_date))
+        INNER JOIN technical_latest AS technical_data ON stock_data.symbol = technical_data.symbol
+        WHERE stock_data.sector IS NOT NULL
+    """)
     stocks = cursor.fetchall()
 
     # Fetch field names
     cursor.execute("DESCRIBE stock_data")
-    field_names = [field[0] for field in cursor.fetchall()] + ['roc', 'rsi', 'macd', 'macd_signal', 'macd_hist', 'bop', 'bbands_upper', 'bbands_lower', 'bbands_middle', 'close', 'apo', 'ma', 'cmo', 'mom', 'sar', 'willr', 'min', 'max', 'cci', 'aroon_up', 'aroon_down', 'aroonosc', 'ultosc', 'natr', 'atr', 'tsf', 'ad', 'adosc', 'apo', 'tenkan_sen', 'kijun_sen', 'senkou_span_a', 'senkou_span_b', 'chikou_span', 'stdev', 'prev_close', 'sma_10', 'sma_20', 'sma_50', 'sma_200', 'sma_100', 'sma_150', 'volume', 'sma_volume_10', 'bbands_percent_b', 'mfi', 'relative_price_sma_50', 'relative_price_sma_200', 'relative_price_rsi', 'relative_price_bbands_upper', 'relative_price_bbands_lower', 'relative_price_macd_hist', 'relative_close_spy', 'macd_prev', 'macd_hist_prev', 'relative_sector_sma_50', 'relative_sector_sma_200', 'relative_sector_rsi', 'relative_sector_bbands_upper', 'relative_sector_bbands_lower', 'relative_sector_close', 'relative_sector_macd_hist']
+    field_names = [field[0] for field in cursor.fetchall()] + TECHNICAL_COLUMNS
+
+    # Prepare a dictionary for each stock with its field values, grouped by sector
+    stocks_by_sector = {}
+    for stock in stocks:
+        stock = dict(zip(field_names, stock))
+        stocks_by_sector.setdefault(stock['sector'], []).append(stock)
+    return stocks_by_sector
+
+def _join_latest_universe(cursor, stock_data):
+    """load_latest_universe()'s join of an in-memory stock_data frame with technical_latest."""
+    cursor.execute(f"SELECT symbol, {', '.join(TECHNICAL_COLUMNS)} FROM technical_latest")
+    latest = {row[0]: row[1:] for row in cursor.fetchall()}
+
+    # NaN becomes None and numpy scalars Python values, as the query would return them
+    field_names = list(stock_data.columns) + TECHNICAL_COLUMNS
+    rows = stock_data.astype(object).where(stock_data.notna(), None).values.tolist()
+    stocks_by_sector = {}
+    for row in rows:
+        stock = dict(zip(stock_data.columns, row))
+        if stock['sector'] is None or stock['symbol'] not in latest:
+            continue
+        stock = dict(zip(field_names, row + list(latest[stock['symbol']])))
+        stocks_by_sector.setdefault(stock['sector'], []).append(stock)
+    return stocks_by_sector
 
-  # Prepare a dictionary for each stock with its field values
-    stock_dicts = [dict(zip(field_names, stock)) for stock in stocks]
+def score_sector(sector, stock_dicts):
+    """Scores one sector's stocks; runs in a worker process and returns the scored stock dicts."""
+    print(f"Sector: {sector}")
 
     for stock in stock_dicts:
         if stock['symbol'] in excluded_symbols:
@@ -256,33 +255,29 @@ for sector in sectors:
                     'revenueGrowth', 'epsgrowth', 'freeCashFlowGrowth', 'grossProfitGrowth', 'ebitgrowth', 'dividendsperShareGrowth', 'netIncomeGrowth']
     metrics_to_invert = ['peRatioTTM', 'priceToBookRatioTTM', 'priceToSalesRatioTTM', 'enterpriseValueOverEBITDATTM', 'EV_to_Revenue', 'priceToFreeCashFlowsRatioTTM', 'priceEarningsToGrowthRatioTTM', 'pocfratioTTM']
 
-    # Invert the metrics in metrics_to_invert
-    for stock in stock_dicts:
-        for metric in metrics_to_invert:
-            if metric in stock and stock[metric] is not None and stock[metric] != 0:
-                stock[metric] = 1 / stock[metric]
-
-    for metric in quality_metrics + value_metrics + growth_metrics + momentum_metrics + baseline_metrics + core_metrics:
-        metric_values = [stock[metric] for stock in stock_dicts if stock[metric] is not None]
-        z_scores = zscore(metric_values)
-        for stock, z_score in zip([s for s in stock_dicts if s[metric] is not None], z_scores):
-            stock[f"{metric}_zscore"] = z_score
+    # Invert metrics_to_invert, z-score every metric across the sector and average per factor in one matrix pass
+    factors = {
+        'quality_score': quality_metrics,
+        'value_score': value_metrics,
+        'growth_score': growth_metrics,
+        'momentum_score': momentum_metrics,
+        'baseline_score': baseline_metrics,  # don't remove for some reason it will srew up core score
+        'core_score': core_metrics,
+    }
+    factor_scores = scoringengine.score_universe(stock_dicts, factors, metrics_to_invert)
 
     # Create factor scores
     print(f"Number of stocks before filtering: {len(stock_dicts)}")
-    stock_dicts = [stock for stock in stock_dicts if all(metric in stock for metric in quality_metrics + value_metrics + growth_metrics + momentum_metrics + technical_metrics + baseline_metrics + core_metrics)]
+    keep = [all(metric in stock for metric in quality_metrics + value_metrics + growth_metrics + momentum_metrics + technical_metrics + baseline_metrics + core_metrics) for stock in stock_dicts]
+    stock_dicts = [stock for stock, kept in zip(stock_dicts, keep) if kept]
+    factor_scores = {name: scores[keep] for name, scores in factor_scores.items()}
     print(f"Number of stocks after filtering: {len(stock_dicts)}")
 
-    for stock in stock_dicts:
-
-        stock["quality_score"] = np.mean([stock.get(f"{m}_zscore", 0) for m in quality_metrics])
-        stock["value_score"] = np.mean([stock.get(f"{m}_zscore", 0) for m in value_metrics])
-        stock["growth_score"] = np.mean([stock.get(f"{m}_zscore", 0) for m in growth_metrics])
-        stock["momentum_score"] = np.mean([stock.get(f"{m}_zscore", 0) for m in momentum_metrics])
+    for i, stock in enumerate(stock_dicts):
+        for name, scores in factor_scores.items():
+            stock[name] = scores[i]
         stock['technical_score'] = (stock['bollinger_score']) # Average of scores
         stock['volatility_score'] = (stock['bollinger_vol_score'])  # Average of scores
-        stock['baseline_score'] = np.mean([stock.get(f"{m}_zscore", 0) for m in baseline_metrics]) #don't remove for some reason it will srew up core score
-        stock["core_score"] = np.mean([stock.get(f"{m}_zscore", 0) for m in core_metrics])
     
     # Calculate composite scores
     
@@ -309,9 +304,6 @@ for sector in sectors:
     weights = model.feature_importances_
     print(f"Weights: {weights}")
 
-    conn = pymysql.connect(host='localhost', user='stocks', password='bed0elAn', database='stocks')
-    insert_stock_scores(conn, stock_dicts)
-    
     # Now use these weights when calculating the composite score:
     for stock in stock_dicts:
         stock["composite_score"] = weights[0]*stock["quality_score"] + weights[1]*stock["value_score"] + weights[2]*stock["growth_score"] + weights[3]*stock["momentum_score"] + weights[4]*stock["technical_score"] + weights[5]*stock["baseline_score"] + weights[6]*stock["core_score"]
@@ -390,8 +382,44 @@ for sector in sectors:
 #    for stock in bottom_stocks:
 #        print(f"{stock['symbol']}: {stock['put_call_ratio']}")
 
+    return sector, stock_dicts
+
+def main(stock_data=None):
+    # Connect to the MySQL database
+    conn = dbpool.connect(MYSQL_CONFIG)
+    cursor = conn.cursor(buffered=True)
+
+    # Scores are written to a staging table and swapped in once every sector is done, so trade.py
+    # never reads an empty or partially scored stock_screener_scores
+    staging = stagedtable.create_staging(cursor, 'stock_screener_scores', """
+        CREATE TABLE IF NOT EXISTS {table} (
+            symbol VARCHAR(255) PRIMARY KEY,
+            sector VARCHAR(255),
+            quality_score DOUBLE,
+            value_score DOUBLE,
+            growth_score DOUBLE,
+            momentum_score DOUBLE,
+            technical_score DOUBLE,
+            volatility_score DOUBLE,
+            baseline_score DOUBLE,
+            core_score DOUBLE
+        )
+    """)
+    conn.commit()
+
+    stocks_by_sector = load_latest_universe(cursor, stock_data)
+
+    # The scores go through the same connection that created the staging table and swaps it in
+    with ProcessPoolExecutor(max_workers=SCREENER_WORKERS, mp_context=SCREENER_CONTEXT) as executor:
+        for sector, stock_dicts in executor.map(score_sector, stocks_by_sector.keys(), stocks_by_sector.values()):
+            insert_stock_scores(conn, stock_dicts, staging)
+
+    stagedtable.swap_in(cursor, 'stock_screener_scores')
+    conn.commit()
 
-# Close the connection to the MySQL database
-cursor.close()
-conn.close()
+    # Close the connection to the MySQL database
+    cursor.close()
+    conn.close()
 
+if __name__ == "__main__":
+    main()
@@ -1,8 +1,8 @@
-import requests
-import time
 import mysql.connector
-import random
 import logging
+import fmpfetch
+import dbpool
+import stagedtable
 
 # Setup logging
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
@@ -10,9 +10,10 @@ logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(
 # Configuration constants
 FMP_API_KEY = 'yourapikeyhere'
 FMP_BASE_URL = 'https://financialmodelingprep.com/api/v3/financial-growth'
-REQUEST_DELAY = 0.2  # seconds between requests to prevent hitting API rate limits
+MAX_WORKERS = 8  # Concurrent requests; the overall rate is capped by fmpfetch.FMP_REQUESTS_PER_MINUTE
 DAILY_REQUEST_LIMIT = 9999999  # API limit for FinancialModelingPrep or a safe threshold
 RETRY_LIMIT = 5  # Maximum number of retries for API requests
+CHANGE_FIELDS = ['date']  # a symbol whose latest statement has the same values here is not rewritten
 MYSQL_CONFIG = {
     'host': 'localhost',
     'user': 'user',
@@ -20,23 +21,10 @@ MYSQL_CONFIG = {
     'database': 'db'
 }
 
-def execute_query(query, data=None):
-    connection = mysql.connector.connect(**MYSQL_CONFIG)
-    cursor = connection.cursor()
-    try:
-        if data is None:
-            cursor.execute(query)
-        else:
-            cursor.execute(query, data)
-            connection.commit()
-    finally:
-        cursor.close()
-        connection.close()
-
-def create_financial_growth_table():
-    execute_query("DROP TABLE IF EXISTS financial_growth")
-    execute_query("""
-        CREATE TABLE financial_growth (
+def create_financial_growth_table(cursor):
+    """Creates financial_growth if needed and returns a staging copy of it (live rows included) to load into."""
+    return stagedtable.create_staging(cursor, 'financial_growth', """
+        CREATE TABLE IF NOT EXISTS {table} (
             symbol VARCHAR(10),
             date DATE,
             period VARCHAR(10),
@@ -77,62 +65,49 @@ def create_financial_growth_table():
             calendarYear INT,  # Add this column if it's part of your data
             PRIMARY KEY(symbol, date)
         )
-    """)
+    """, copy_existing=True)
 
 def fetch_fmp_data(symbol):
-    retry_count = 0
-    backoff_factor = 0.5
-    while retry_count < RETRY_LIMIT:
-        try:
-            url = f"{FMP_BASE_URL}/{symbol}?period=annual&apikey={FMP_API_KEY}"
-            response = requests.get(url)
-            if response.status_code == 200:
-                data = response.json()
-                if data:
-                    logging.info(f"Data retrieved successfully for {symbol}.")
-                    return data[0]  # Assuming the API returns data as a list of dictionaries
-                else:
-                    logging.warning(f"No data found for {symbol} on attempt {retry_count + 1}.")
-            else:
-                logging.error(f"HTTP error {response.status_code} for {symbol} on attempt {retry_count + 1}.")
-        except Exception as e:
-            logging.error(f"Exception {e} occurred for {symbol} on attempt {retry_count + 1}.")
-        
-        retry_count += 1
-        sleep_time = backoff_factor * (2 ** retry_count) + random.uniform(0, 1)
-        logging.info(f"Retrying for {symbol} in {sleep_time:.2f} seconds.")
-        time.sleep(sleep_time)
-
-    logging.error(f"All retries exhausted for {symbol}. Giving up.")
+    url = f"{FMP_BASE_URL}/{symbol}?period=annual&apikey={FMP_API_KEY}"
+    data = fmpfetch.fetch_json(url, symbol, retry_limit=RETRY_LIMIT)
+    if data:
+        return data[0]  # Assuming the API returns data as a list of dictionaries
     return None
 
 def main():
-    create_financial_growth_table()
-    connection = mysql.connector.connect(**MYSQL_CONFIG)
+    connection = dbpool.connect(MYSQL_CONFIG)
     cursor = connection.cursor()
+    staging = create_financial_growth_table(cursor)
+    stored = stagedtable.stored_versions(cursor, staging, CHANGE_FIELDS)
+    columns = set(stagedtable.table_columns(cursor, staging))
     cursor.execute("SELECT symbol FROM stock_symbols")
     symbols = cursor.fetchall()
-    cursor.close()
-    connection.close()
 
-    requests_today = 0
-    for symbol_tuple in symbols:
-        symbol = symbol_tuple[0]
-        if requests_today >= DAILY_REQUEST_LIMIT:
-            logging.info("API request limit reached for today. Stopping further requests.")
-            break
-        data = fetch_fmp_data(symbol)
+    symbols = fmpfetch.limit_symbols([symbol_tuple[0] for symbol_tuple in symbols], DAILY_REQUEST_LIMIT)
+    rows = []
+    for symbol, data in fmpfetch.fetch_all(symbols, fetch_fmp_data, max_workers=MAX_WORKERS):
         if data:
-            fields = [f"`{key}`" for key in data.keys()]  # Use backticks to ensure SQL keywords do not cause issues
-            placeholders = ', '.join(['%s'] * len(fields))
-            insert_query = f"INSERT INTO financial_growth ({', '.join(fields)}) VALUES ({placeholders})"
-            try:
-                execute_query(insert_query, tuple(data.values()))
-                logging.info(f"Inserted data for {symbol}.")
-            except mysql.connector.Error as err:
-                logging.error(f"Error inserting data for {symbol}: {err}")
-        time.sleep(REQUEST_DELAY)
-        requests_today += 1
+            if stagedtable.is_unchanged(stored.get(symbol), data, CHANGE_FIELDS):
+                logging.info(f"{symbol} unchanged since {data.get('date')}, skipping.")
+                continue
+            rows.append(data)
+
+    # Upsert the changed statements into the staging copy, then swap it in
+    try:
+        stagedtable.upsert_rows(cursor, staging, rows, ['symbol', 'date'], columns)
+        # One DELETE per changed symbol, so it is prepared once on the server rather than parsed per row
+        delete_cursor = connection.cursor(prepared=True)
+        stagedtable.delete_superseded(delete_cursor, staging, rows)
+        delete_cursor.close()
+        stagedtable.prune_symbols(cursor, staging)
+        connection.commit()
+        stagedtable.swap_in(cursor, 'financial_growth')
+        logging.info(f"Upserted {len(rows)} changed symbols into financial_growth.")
+    except mysql.connector.Error as err:
+        logging.error(f"Error loading financial_growth; the previous table is left in place: {err}")
+    finally:
+        cursor.close()
+        connection.close()
 
 if __name__ == "__main__":
     main()
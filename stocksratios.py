@@ -1,8 +1,8 @@
-import requests
-import time
 import mysql.connector
-import random
 import logging
+import fmpfetch
+import dbpool
+import stagedtable
 
 # Setup logging
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
@@ -10,7 +10,9 @@ logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(
 # Configuration constants
 FMP_API_KEY = 'yourapikeyhere'
 FMP_BASE_URL = 'https://financialmodelingprep.com/api/v3/ratios-ttm'
-REQUEST_DELAY = 0.2  # seconds between requests to prevent hitting API rate limits
+FMP_BULK_URL = 'https://financialmodelingprep.com/api/v4/ratios-ttm-bulk'
+USE_BULK = True  # One streamed bulk download instead of a request per symbol; missing symbols fall back
+MAX_WORKERS = 8  # Concurrent requests; the overall rate is capped by fmpfetch.FMP_REQUESTS_PER_MINUTE
 DAILY_REQUEST_LIMIT = 9999999999  # API limit for FinancialModelingPrep or a safe threshold
 RETRY_LIMIT = 5  # Maximum number of retries for API requests
 MYSQL_CONFIG = {
@@ -20,25 +22,11 @@ MYSQL_CONFIG = {
     'database': 'db'
 }
 
-# Function to execute SQL queries
-def execute_query(query, data=None):
-    connection = mysql.connector.connect(**MYSQL_CONFIG)
-    cursor = connection.cursor()
-    try:
-        if data is None:
-            cursor.execute(query)
-        else:
-            cursor.execute(query, data)
-            connection.commit()
-    finally:
-        cursor.close()
-        connection.close()
-
 # Function to create or recreate the stock_ratios table
-def create_stock_ratios_table():
-    execute_query("DROP TABLE IF EXISTS stock_ratios")
-    execute_query("""
-        CREATE TABLE stock_ratios (
+def create_stock_ratios_table(cursor):
+    """Creates stock_ratios if needed and returns a staging copy of it (live rows included) to load into."""
+    return stagedtable.create_staging(cursor, 'stock_ratios', """
+        CREATE TABLE IF NOT EXISTS {table} (
             symbol VARCHAR(10),
             dividendYielTTM FLOAT,
             dividendYielPercentageTTM FLOAT,
@@ -99,62 +87,45 @@ def create_stock_ratios_table():
             dividendPerShareTTM FLOAT,
             PRIMARY KEY(symbol)
         )
-    """)
+    """, copy_existing=True)
 
 # Function to fetch data with retry logic
 def fetch_fmp_data(symbol):
-    retry_count = 0
-    backoff_factor = 0.5
-    while retry_count < RETRY_LIMIT:
-        try:
-            url = f"{FMP_BASE_URL}/{symbol}?apikey={FMP_API_KEY}"
-            response = requests.get(url)
-            if response.status_code == 200:
-                data = response.json()
-                if data:
-                    logging.info(f"Data retrieved successfully for {symbol}.")
-                    return data[0]
-                else:
-                    logging.warning(f"No data found for {symbol} on attempt {retry_count + 1}.")
-            else:
-                logging.error(f"HTTP error {response.status_code} for {symbol} on attempt {retry_count + 1}.")
-        except Exception as e:
-            logging.error(f"Exception {e} occurred for {symbol} on attempt {retry_count + 1}.")
-        
-        retry_count += 1
-        sleep_time = backoff_factor * (2 ** retry_count) + random.uniform(0, 1)
-        logging.info(f"Retrying for {symbol} in {sleep_time:.2f} seconds.")
-        time.sleep(sleep_time)
-
-    logging.error(f"All retries exhausted for {symbol}. Giving up.")
+    url = f"{FMP_BASE_URL}/{symbol}?apikey={FMP_API_KEY}"
+    data = fmpfetch.fetch_json(url, symbol, retry_limit=RETRY_LIMIT)
+    if data:
+        return data[0]
     return None
 
 # Main function to process all stock symbols
 def main():
-    create_stock_ratios_table()
-    connection = mysql.connector.connect(**MYSQL_CONFIG)
+    connection = dbpool.connect(MYSQL_CONFIG)
     cursor = connection.cursor()
+    staging = create_stock_ratios_table(cursor)
     cursor.execute("SELECT symbol FROM stock_symbols")
     symbols = cursor.fetchall()
-    cursor.close()
-    connection.close()
+    # Bulk CSV headers are not guaranteed to match the per-symbol JSON, so only known columns are written
+    columns = set(stagedtable.table_columns(cursor, staging))
+
+    symbols = fmpfetch.limit_symbols([symbol_tuple[0] for symbol_tuple in symbols], DAILY_REQUEST_LIMIT)
+    if USE_BULK:
+        results = fmpfetch.fetch_bulk(symbols, f"{FMP_BULK_URL}?apikey={FMP_API_KEY}", fetch_fmp_data, max_workers=MAX_WORKERS)
+    else:
+        results = fmpfetch.fetch_all(symbols, fetch_fmp_data, max_workers=MAX_WORKERS)
+    rows = [{**data, 'symbol': symbol} for symbol, data in results if data]
 
-    requests_today = 0
-    for symbol_tuple in symbols:
-        symbol = symbol_tuple[0]
-        if requests_today >= DAILY_REQUEST_LIMIT:
-            logging.info("API request limit reached for today. Stopping further requests.")
-            break
-        data = fetch_fmp_data(symbol)
-        if data:
-            fields = data.keys()
-            num_fields = len(fields) + 1
-            placeholders = ', '.join(['%s'] * num_fields)
-            insert_query = f"INSERT INTO stock_ratios (symbol, {', '.join(fields)}) VALUES ({placeholders})"
-            execute_query(insert_query, (symbol,) + tuple(data.values()))
-            logging.info(f"Inserted data for {symbol}.")
-        time.sleep(REQUEST_DELAY)
-        requests_today += 1
+    # Upsert into the staging copy (symbols not fetched this run keep their rows), then swap it in
+    try:
+        stagedtable.upsert_rows(cursor, staging, rows, ['symbol'], columns)
+        stagedtable.prune_symbols(cursor, staging)
+        connection.commit()
+        stagedtable.swap_in(cursor, 'stock_ratios')
+        logging.info(f"Upserted {len(rows)} symbols into stock_ratios.")
+    except mysql.connector.Error as err:
+        logging.error(f"Error loading stock_ratios; the previous table is left in place: {err}")
+    finally:
+        cursor.close()
+        connection.close()
 
 if __name__ == "__main__":
     main()
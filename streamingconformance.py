@@ -0,0 +1,94 @@
+import argparse
+import json
+
+import numpy as np
+import pandas as pd
+
+import indicatorengine
+import streamingindicators
+
+# Conformance check of the streaming indicator kernels against talib: every streamable column is
+# computed bar by bar and compared with indicatorengine.compute() over the same history. The state
+# is also saved to JSON and restored half way through, which must not change any value.
+
+RTOL = 1e-9
+ATOL = 1e-9
+
+
+def synthetic_bars(n_bars, seed):
+    """A random-walk OHLCV history with realistic intrabar ranges, flat bars and volume spikes."""
+    rng = np.random.default_rng(seed)
+    dates = pd.bdate_range('2021-01-04', periods=n_bars, name='date')
+    close = 100 * np.exp(np.cumsum(rng.normal(0, 0.015, n_bars)))
+    close[n_bars // 3:n_bars // 3 + 5] = close[n_bars // 3]  # a flat stretch exercises the zero-change branches
+    open_price = close * np.exp(rng.normal(0, 0.005, n_bars))
+    high = np.maximum(open_price, close) * np.exp(np.abs(rng.normal(0, 0.01, n_bars)))
+    low = np.minimum(open_price, close) * np.exp(-np.abs(rng.normal(0, 0.01, n_bars)))
+    volume = rng.integers(100_000, 2_000_000, n_bars).astype(float)
+    return pd.DataFrame({'open': open_price, 'high': high, 'low': low, 'close': close, 'volume': volume}, index=dates)
+
+
+def historical_bars(symbol, days):
+    """Daily bars from FMP (served from the response cache when fresh)."""
+    from datetime import datetime, timedelta
+    import technicaldata
+    end_date = datetime.now()
+    bars = technicaldata.fetch_bars(symbol, end_date - timedelta(days=days), end_date)
+    frame = pd.DataFrame(bars)
+    frame['date'] = pd.to_datetime(frame['date']).dt.normalize()
+    return frame.set_index('date').sort_index()[['open', 'high', 'low', 'close', 'volume']].astype(float)
+
+
+def streamed(daily_prices, registry, split=None):
+    """Streams the bars; with `split`, the state goes through JSON after that many bars."""
+    engine = streamingindicators.StreamingIndicators(registry)
+    rows = []
+    for i, (date, bar) in enumerate(zip(daily_prices.index, daily_prices.to_dict('records'))):
+        if i == split:
+            engine = streamingindicators.StreamingIndicators.from_state(json.loads(json.dumps(engine.to_state())), registry)
+        rows.append(engine.update(date.strftime('%Y-%m-%d'), bar))
+    return pd.DataFrame(rows, index=daily_prices.index), engine.columns
+
+
+def compare(name, daily_prices, registry):
+    series = {field: daily_prices[field] for field in indicatorengine.PRICE_FIELDS}
+    stream, columns = streamed(daily_prices, registry, split=len(daily_prices) // 2)
+    reference = indicatorengine.compute(registry, series, columns)
+    failures = []
+    for column in columns:
+        expected = np.asarray(reference[column], dtype=float)
+        actual = stream[column].to_numpy(dtype=float)
+        if not np.allclose(actual, expected, rtol=RTOL, atol=ATOL, equal_nan=True):
+            both = ~np.isnan(expected) & ~np.isnan(actual)
+            worst = np.max(np.abs(actual[both] - expected[both])) if both.any() else float('nan')
+            failures.append(f"{column} (NaN mismatch: {int((np.isnan(actual) != np.isnan(expected)).sum())}, max diff {worst:.3g})")
+    print(f"{name}: {len(columns) - len(failures)}/{len(columns)} columns match talib")
+    for failure in failures:
+        print(f"  MISMATCH {failure}")
+    return not failures
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Checks the streaming indicator kernels against talib.")
+    parser.add_argument('--bars', type=int, default=750, help="length of each synthetic history")
+    parser.add_argument('--seeds', type=int, default=5, help="number of synthetic histories")
+    parser.add_argument('--symbols', nargs='*', default=[], help="also check these symbols' FMP history")
+    parser.add_argument('--days', type=int, default=3 * 365, help="calendar days of FMP history per symbol")
+    args = parser.parse_args()
+
+    histories = [(f"synthetic seed {seed}", synthetic_bars(args.bars, seed)) for seed in range(args.seeds)]
+    histories += [(symbol, historical_bars(symbol, args.days)) for symbol in args.symbols]
+
+    ok = True
+    for name, daily_prices in histories:
+        ok &= compare(name, daily_prices, indicatorengine.BASE_INDICATORS)
+        # The relative registry runs on stock/benchmark ratios; a second history stands in for the benchmark.
+        # Like SPY it trades at ten times the price and volume, so the ratio bars carry tiny money flows.
+        benchmark = synthetic_bars(len(daily_prices), 1000).set_axis(daily_prices.index) * 10
+        ok &= compare(f"{name} relative", daily_prices / benchmark, indicatorengine.RELATIVE_INDICATORS)
+    print("All streaming kernels conform." if ok else "Some streaming kernels do not conform.")
+    raise SystemExit(0 if ok else 1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,750 @@
+import os
+import copy
+import json
+import math
+from collections import deque
+
+import indicatorengine
+
+# Streaming versions of the talib indicators technicaldata.py uses. Each kernel keeps just the
+# state its indicator needs (running sums, Wilder averages, a ring buffer of the window) and
+# updates in O(1) per bar, following talib's own recurrences so the values match talib run over
+# the same bars. A symbol's kernels are persisted between runs, so a daily update feeds only the
+# new bars instead of replaying the history. technicaldata.py's nightly run takes the new bars'
+# values from the kernels for every column that has one, but still replays its warm-up window
+# through talib for the columns that do not (relative_*, AD, KAMA, chikou_span and a few others).
+
+# Configuration constants
+STATE_DIR = os.environ.get('INDICATOR_STATE_DIR', os.path.join(os.path.dirname(os.path.abspath(__file__)), 'indicator_state'))
+EPSILON = 1e-14  # talib's TA_IS_ZERO threshold
+
+NAN = float('nan')
+
+
+def _is_zero(value):
+    return -EPSILON < value < EPSILON
+
+
+def _true_range(high, low, prev_close):
+    return max(high - low, abs(prev_close - high), abs(prev_close - low))
+
+
+class Kernel:
+    """
+    Base class: every attribute of a kernel is part of its state, so a kernel round-trips through
+    to_state()/from_state(). update() takes the current bar's inputs and returns the indicator
+    value (a tuple for multi-output indicators), NaN until talib would have produced one.
+    """
+
+    def to_state(self):
+        return {'kernel': type(self).__name__, 'state': {name: _encode(value) for name, value in vars(self).items()}}
+
+    @staticmethod
+    def from_state(state):
+        kernel = KERNELS[state['kernel']].__new__(KERNELS[state['kernel']])
+        kernel.__dict__.update({name: _decode(value) for name, value in state['state'].items()})
+        return kernel
+
+
+def _encode(value):
+    if isinstance(value, Kernel):
+        return value.to_state()
+    if isinstance(value, deque):
+        return {'deque': list(value), 'maxlen': value.maxlen}
+    return value
+
+
+def _decode(value):
+    if isinstance(value, dict) and 'kernel' in value:
+        return Kernel.from_state(value)
+    if isinstance(value, dict) and 'deque' in value:
+        return deque(value['deque'], maxlen=value['maxlen'])
+    return value
+
+
+class SMA(Kernel):
+    def __init__(self, timeperiod=30, matype=0):
+        self.period = timeperiod
+        self.window = deque(maxlen=timeperiod)
+        self.total = 0.0
+
+    def update(self, value):
+        self.window.append(value)
+        self.total += value
+        if len(self.window) < self.period:
+            return NAN
+        average = self.total / self.period
+        # talib drops the oldest value from the running total right after each output
+        self.total -= self.window[0]
+        return average
+
+
+class EMA(Kernel):
+    """Exponential average seeded with the SMA of the first `timeperiod` values, as talib does."""
+
+    def __init__(self, timeperiod=30):
+        self.period = timeperiod
+        self.k = 2.0 / (timeperiod + 1)
+        self.count = 0
+        self.value = 0.0
+
+    def update(self, value):
+        self.count += 1
+        if self.count < self.period:
+            self.value += value
+            return NAN
+        if self.count == self.period:
+            self.value = (self.value + value) / self.period
+        else:
+            self.value = (value - self.value) * self.k + self.value
+        return self.value
+
+
+class DEMA(Kernel):
+    """2 * EMA - EMA(EMA): the second average is seeded from the first one's output, as in talib."""
+
+    def __init__(self, timeperiod=30):
+        self.first = EMA(timeperiod)
+        self.second = EMA(timeperiod)
+
+    def update(self, value):
+        first = self.first.update(value)
+        if math.isnan(first):
+            return NAN
+        second = self.second.update(first)
+        if math.isnan(second):
+            return NAN
+        return 2.0 * first - second
+
+
+class KAMA(Kernel):
+    """
+    Kaufman's adaptive average with talib's fixed fast (2) and slow (30) constants. The path length
+    is kept as a running sum the way talib keeps it, so it rounds identically.
+    """
+
+    def __init__(self, timeperiod=30):
+        self.period = timeperiod
+        self.count = 0
+        self.window = deque(maxlen=timeperiod + 2)
+        self.path = 0.0
+        self.value = NAN
+
+    def update(self, value):
+        window = self.window
+        window.append(value)
+        self.count += 1
+        if self.count == 1:
+            return NAN
+        if self.count <= self.period + 1:
+            self.path += abs(window[-2] - value)
+            if self.count <= self.period:
+                return NAN
+            previous, change = window[-2], value - window[0]
+        else:
+            self.path -= abs(window[0] - window[1])
+            self.path += abs(value - window[-2])
+            previous, change = self.value, value - window[1]
+        ratio = 1.0 if self.path <= change or _is_zero(self.path) else abs(change / self.path)
+        constant = ratio * (2.0 / 3.0 - 2.0 / 31.0) + 2.0 / 31.0
+        constant *= constant
+        self.value = (value - previous) * constant + previous
+        return self.value
+
+
+class RSI(Kernel):
+    def __init__(self, timeperiod=14):
+        self.period = timeperiod
+        self.count = 0
+        self.prev = NAN
+        self.gain = 0.0
+        self.loss = 0.0
+
+    def update(self, value):
+        self.count += 1
+        change = value - self.prev
+        self.prev = value
+        if self.count == 1:
+            return NAN
+        if self.count <= self.period + 1:
+            if change < 0:
+                self.loss -= change
+            else:
+                self.gain += change
+            if self.count <= self.period:
+                return NAN
+        else:
+            self.loss *= self.period - 1
+            self.gain *= self.period - 1
+            if change < 0:
+                self.loss -= change
+            else:
+                self.gain += change
+        self.loss /= self.period
+        self.gain /= self.period
+        return self._value(self.gain + self.loss)
+
+    def _value(self, total):
+        return 100 * (self.gain / total) if not _is_zero(total) else 0.0
+
+
+class CMO(RSI):
+    """talib's CMO smooths gains and losses exactly like its RSI and reports their difference instead."""
+
+    def _value(self, total):
+        return 100 * ((self.gain - self.loss) / total) if not _is_zero(total) else 0.0
+
+
+class MACD(Kernel):
+    """
+    talib seeds the fast EMA late, with the SMA of the `fastperiod` values ending where the slow EMA's
+    seed ends, so both averages start on the same bar; the signal line is an EMA of that MACD line.
+    """
+
+    def __init__(self, fastperiod=12, slowperiod=26, signalperiod=9):
+        self.fast_period = fastperiod
+        self.slow_period = slowperiod
+        self.seed = []
+        self.fast = EMA(fastperiod)
+        self.slow = EMA(slowperiod)
+        self.signal = EMA(signalperiod)
+
+    def update(self, value):
+        if self.seed is not None:
+            self.seed.append(value)
+            if len(self.seed) < self.slow_period:
+                return NAN, NAN, NAN
+            for seed_value in self.seed[self.slow_period - self.fast_period:]:
+                fast = self.fast.update(seed_value)
+            for seed_value in self.seed:
+                slow = self.slow.update(seed_value)
+            self.seed = None
+        else:
+            fast = self.fast.update(value)
+            slow = self.slow.update(value)
+        macd = fast - slow
+        signal = self.signal.update(macd)
+        if math.isnan(signal):
+            return NAN, NAN, NAN
+        return macd, signal, macd - signal
+
+
+class BBANDS(Kernel):
+    """SMA middle band; the deviation comes from a running sum of squares over the same window, as in talib."""
+
+    def __init__(self, timeperiod=5, nbdevup=2, nbdevdn=2, matype=0):
+        self.period = timeperiod
+        self.nbdevup = nbdevup
+        self.nbdevdn = nbdevdn
+        self.middle = SMA(timeperiod)
+        self.squares = 0.0
+
+    def update(self, value):
+        middle = self.middle.update(value)
+        self.squares += value * value
+        if math.isnan(middle):
+            return NAN, NAN, NAN
+        mean_square = self.squares / self.period
+        oldest = self.middle.window[0]
+        self.squares -= oldest * oldest
+        mean_square -= middle * middle
+        deviation = math.sqrt(mean_square) if mean_square >= EPSILON else 0.0
+        return middle + deviation * self.nbdevup, middle, middle - deviation * self.nbdevdn
+
+
+class STDDEV(Kernel):
+    """
+    Population deviation of the last `timeperiod` values. talib returns exactly 0 for a flat window,
+    which running sums cannot reproduce, so the deviation is taken over the window itself (O(timeperiod) per bar).
+    """
+
+    def __init__(self, timeperiod=5, nbdev=1):
+        self.period = timeperiod
+        self.nbdev = nbdev
+        self.window = deque(maxlen=timeperiod)
+
+    def update(self, value):
+        self.window.append(value)
+        if len(self.window) < self.period:
+            return NAN
+        mean = sum(self.window) / self.period
+        variance = sum((x - mean) * (x - mean) for x in self.window) / self.period
+        return math.sqrt(variance) * self.nbdev if variance >= EPSILON else 0.0
+
+
+class ATR(Kernel):
+    """Wilder average of the true range, seeded with the SMA of the first `timeperiod` true ranges."""
+
+    def __init__(self, timeperiod=14):
+        self.period = timeperiod
+        self.count = 0
+        self.prev_close = NAN
+        self.value = 0.0
+
+    def update(self, high, low, close):
+        self.count += 1
+        prev_close, self.prev_close = self.prev_close, close
+        if self.count == 1:
+            return NAN
+        true_range = _true_range(high, low, prev_close)
+        if self.count <= self.period:
+            self.value += true_range
+            return NAN
+        if self.count == self.period + 1:
+            self.value = (self.value + true_range) / self.period
+        else:
+            self.value = (self.value * (self.period - 1) + true_range) / self.period
+        return self.value
+
+
+class NATR(ATR):
+    def update(self, high, low, close):
+        atr = super().update(high, low, close)
+        if math.isnan(atr):
+            return NAN
+        return (atr / close) * 100.0 if not _is_zero(close) else 0.0
+
+
+class _DirectionalMovement(Kernel):
+    """Wilder-smoothed +DM, -DM and true range, and the directional index they give (DX and ADX share this)."""
+
+    def __init__(self, timeperiod=14):
+        self.period = timeperiod
+        self.count = 0
+        self.prev_high = NAN
+        self.prev_low = NAN
+        self.prev_close = NAN
+        self.plus_dm = 0.0
+        self.minus_dm = 0.0
+        self.true_range = 0.0
+        self.value = NAN
+
+    def _dx(self, high, low, close):
+        """Advances the sums by one bar; returns (ready, dx), where dx is None when talib skips the bar."""
+        period = self.period
+        self.count += 1
+        prev_high, prev_low, prev_close = self.prev_high, self.prev_low, self.prev_close
+        self.prev_high, self.prev_low, self.prev_close = high, low, close
+        if self.count == 1:
+            return False, None
+        up_move = high - prev_high
+        down_move = prev_low - low
+        minus_dm = down_move if down_move > 0 and up_move < down_move else 0.0
+        plus_dm = up_move if up_move > 0 and up_move > down_move else 0.0
+        true_range = _true_range(high, low, prev_close)
+
+        # The first period - 1 moves are summed, later ones are Wilder-smoothed
+        if self.count < period + 1:
+            self.plus_dm += plus_dm
+            self.minus_dm += minus_dm
+            self.true_range += true_range
+            return False, None
+        self.minus_dm = self.minus_dm - self.minus_dm / period + minus_dm
+        self.plus_dm = self.plus_dm - self.plus_dm / period + plus_dm
+        self.true_range = self.true_range - self.true_range / period + true_range
+
+        dx = None
+        if not _is_zero(self.true_range):
+            minus_di = 100 * (self.minus_dm / self.true_range)
+            plus_di = 100 * (self.plus_dm / self.true_range)
+            total = minus_di + plus_di
+            if not _is_zero(total):
+                dx = 100 * (abs(minus_di - plus_di) / total)
+        return True, dx
+
+
+class DX(_DirectionalMovement):
+    """talib reports 0 when the first bar has no direction and repeats the previous value after that."""
+
+    def update(self, high, low, close):
+        ready, dx = self._dx(high, low, close)
+        if not ready:
+            return NAN
+        if dx is not None:
+            self.value = dx
+        elif math.isnan(self.value):
+            self.value = 0.0
+        return self.value
+
+
+class ADX(_DirectionalMovement):
+    def __init__(self, timeperiod=14):
+        super().__init__(timeperiod)
+        self.dx_total = 0.0
+
+    def update(self, high, low, close):
+        period = self.period
+        ready, dx = self._dx(high, low, close)
+        if not ready:
+            return NAN
+        if self.count < 2 * period:
+            if dx is not None:
+                self.dx_total += dx
+            return NAN
+        if self.count == 2 * period:
+            if dx is not None:
+                self.dx_total += dx
+            self.value = self.dx_total / period
+        elif dx is not None:
+            self.value = (self.value * (period - 1) + dx) / period
+        return self.value
+
+
+class ADXR(Kernel):
+    """The mean of ADX and ADX `timeperiod - 1` bars earlier."""
+
+    def __init__(self, timeperiod=14):
+        self.adx = ADX(timeperiod)
+        self.history = deque(maxlen=timeperiod)
+
+    def update(self, high, low, close):
+        adx = self.adx.update(high, low, close)
+        if math.isnan(adx):
+            return NAN
+        self.history.append(adx)
+        if len(self.history) < self.history.maxlen:
+            return NAN
+        return (adx + self.history[0]) / 2.0
+
+
+class OBV(Kernel):
+    def __init__(self):
+        self.prev_close = None
+        self.value = 0.0
+
+    def update(self, close, volume):
+        if self.prev_close is None:
+            self.value = volume
+        elif close > self.prev_close:
+            self.value += volume
+        elif close < self.prev_close:
+            self.value -= volume
+        self.prev_close = close
+        return self.value
+
+
+class MFI(Kernel):
+    def __init__(self, timeperiod=14):
+        self.period = timeperiod
+        self.prev_price = None
+        self.flows = deque(maxlen=timeperiod)  # (positive, negative) money flow per bar
+        self.positive = 0.0
+        self.negative = 0.0
+
+    def update(self, high, low, close, volume):
+        price = (high + low + close) / 3.0
+        if self.prev_price is None:
+            self.prev_price = price
+            return NAN
+        change = price - self.prev_price
+        self.prev_price = price
+        flow = price * volume
+        if len(self.flows) == self.period:
+            oldest_positive, oldest_negative = self.flows[0]
+            self.positive -= oldest_positive
+            self.negative -= oldest_negative
+        if change < 0:
+            self.flows.append((0.0, flow))
+            self.negative += flow
+        elif change > 0:
+            self.flows.append((flow, 0.0))
+            self.positive += flow
+        else:
+            self.flows.append((0.0, 0.0))
+        if len(self.flows) < self.period:
+            return NAN
+        # talib only reports 0 when there is no flow at all; ratio bars (relative_*) have flows well below 1
+        total = self.positive + self.negative
+        return 100.0 * (self.positive / total) if total > 0.0 else 0.0
+
+
+class MAX(Kernel):
+    """Rolling maximum over a monotonic queue of (bar number, value), amortized O(1) per bar."""
+
+    def __init__(self, timeperiod=30):
+        self.period = timeperiod
+        self.count = 0
+        self.queue = deque()
+
+    def _better(self, candidate, current):
+        return candidate >= current
+
+    def update(self, value):
+        while self.queue and self._better(value, self.queue[-1][1]):
+            self.queue.pop()
+        self.queue.append((self.count, value))
+        if self.queue[0][0] <= self.count - self.period:
+            self.queue.popleft()
+        self.count += 1
+        return self.queue[0][1] if self.count >= self.period else NAN
+
+
+class MIN(MAX):
+    def _better(self, candidate, current):
+        return candidate <= current
+
+
+class MINMAX(Kernel):
+    def __init__(self, timeperiod=30):
+        self.minimum = MIN(timeperiod)
+        self.maximum = MAX(timeperiod)
+
+    def update(self, value):
+        return self.minimum.update(value), self.maximum.update(value)
+
+
+class WILLR(Kernel):
+    def __init__(self, timeperiod=14):
+        self.highest = MAX(timeperiod)
+        self.lowest = MIN(timeperiod)
+
+    def update(self, high, low, close):
+        highest = self.highest.update(high)
+        lowest = self.lowest.update(low)
+        if math.isnan(highest):
+            return NAN
+        diff = (highest - lowest) / -100.0
+        if diff == 0.0:
+            return 0.0
+        # talib clamps to [-100, 0]; ratio series can close outside their own high/low range
+        return min(max((highest - close) / diff, -100.0), 0.0)
+
+
+class MOM(Kernel):
+    def __init__(self, timeperiod=10):
+        self.window = deque(maxlen=timeperiod + 1)
+
+    def update(self, value):
+        self.window.append(value)
+        if len(self.window) < self.window.maxlen:
+            return NAN
+        return self._change(value, self.window[0])
+
+    def _change(self, value, previous):
+        return value - previous
+
+
+class ROC(MOM):
+    def _change(self, value, previous):
+        return ((value / previous) - 1.0) * 100.0 if previous != 0.0 else 0.0
+
+
+class SHIFT(MOM):
+    """Value `periods` bars back; only backward shifts can be streamed (chikou_span looks ahead)."""
+
+    def __init__(self, periods=1):
+        super().__init__(periods)
+
+    def _change(self, value, previous):
+        return previous
+
+
+class SAR(Kernel):
+    """Parabolic SAR with talib's start-up: the first move's -DM decides the initial direction."""
+
+    def __init__(self, acceleration=0.02, maximum=0.2):
+        self.acceleration = min(acceleration, maximum)
+        self.maximum = maximum
+        self.af = self.acceleration
+        self.count = 0
+        self.is_long = True
+        self.sar = NAN
+        self.ep = NAN
+        self.new_high = NAN
+        self.new_low = NAN
+
+    def update(self, high, low):
+        self.count += 1
+        if self.count == 1:
+            self.new_high, self.new_low = high, low
+            return NAN
+        if self.count == 2:
+            up_move = high - self.new_high
+            down_move = self.new_low - low
+            self.is_long = not (down_move > 0 and up_move < down_move)
+            self.ep, self.sar = (high, self.new_low) if self.is_long else (low, self.new_high)
+            # talib uses the second bar as both the previous and the current bar on its first step
+            self.new_high, self.new_low = high, low
+
+        prev_high, prev_low = self.new_high, self.new_low
+        self.new_high, self.new_low = high, low
+        if self.is_long:
+            if low <= self.sar:
+                self.is_long = False
+                output = max(self.ep, prev_high, high)
+                self.af = self.acceleration
+                self.ep = low
+                self.sar = max(output + self.af * (self.ep - output), prev_high, high)
+                return output
+            output = self.sar
+            if high > self.ep:
+                self.ep = high
+                self.af = min(self.af + self.acceleration, self.maximum)
+            self.sar = min(self.sar + self.af * (self.ep - self.sar), prev_low, low)
+            return output
+        if high >= self.sar:
+            self.is_long = True
+            output = min(self.ep, prev_low, low)
+            self.af = self.acceleration
+            self.ep = high
+            self.sar = min(output + self.af * (self.ep - output), prev_low, low)
+            return output
+        output = self.sar
+        if low < self.ep:
+            self.ep = low
+            self.af = min(self.af + self.acceleration, self.maximum)
+        self.sar = max(self.sar + self.af * (self.ep - self.sar), prev_high, high)
+        return output
+
+
+class ROLLING_MAX(MAX):
+    def __init__(self, window=14):
+        super().__init__(window)
+
+
+class ROLLING_MIN(MIN):
+    def __init__(self, window=14):
+        super().__init__(window)
+
+
+KERNELS = {cls.__name__: cls for cls in [SMA, EMA, DEMA, KAMA, RSI, CMO, MACD, BBANDS, STDDEV, ATR, NATR, DX, ADX, ADXR, OBV, MFI, MAX, MIN, MINMAX, WILLR, MOM, ROC, SHIFT, SAR, ROLLING_MAX, ROLLING_MIN]}
+KERNEL_ALIASES = {'MA': 'SMA'}  # technicaldata only uses MA with matype=0
+
+# Element-wise registry functions need no state
+STATELESS_FUNCTIONS = {
+    'MEAN': lambda first, second: (first + second) / 2,
+    'PCT_DIFF': lambda price, average: (price - average) / average * 100,
+    'PERCENT_B': lambda close, upper, lower: (close - lower) / (upper - lower),
+}
+
+
+def _streamable(registry, ref):
+    if isinstance(ref, str):
+        return ref in indicatorengine.PRICE_FIELDS or (ref in registry and _streamable(registry, registry[ref]))
+    function, inputs, params, _ = ref
+    if function == 'SHIFT' and dict(params)['periods'] < 0:
+        return False
+    if function not in KERNELS and function not in KERNEL_ALIASES and function not in STATELESS_FUNCTIONS:
+        return False
+    return all(_streamable(registry, source) for source in inputs)
+
+
+def streamable_columns(registry=indicatorengine.BASE_INDICATORS, columns=None):
+    """Columns of an indicatorengine registry (limited to `columns`) whose whole node tree has a streaming kernel."""
+    return [name for name, ref in registry.items() if (columns is None or name in columns) and _streamable(registry, ref)]
+
+
+class StreamingIndicators:
+    """
+    Streaming evaluation of indicatorengine registry columns for one symbol. Nodes are keyed like
+    the engine's memo, so columns sharing a node (the MACD outputs, the Ichimoku lines) share one
+    kernel. Like talib, a kernel starts at the first bar where all its inputs are defined.
+    """
+
+    def __init__(self, registry=indicatorengine.BASE_INDICATORS, columns=None):
+        self.registry = registry
+        self.columns = streamable_columns(registry, columns)
+        self.kernels = {}
+        self.last_date = None
+        self.values = {}  # the columns of the last bar fed
+
+    def _node(self, ref, bar, values, kernels):
+        if isinstance(ref, str):
+            if ref in bar:
+                return bar[ref]
+            return self._node(self.registry[ref], bar, values, kernels)
+        function, inputs, params, output = ref
+        key = json.dumps([function, inputs, params])
+        if key not in values:
+            args = [self._node(source, bar, values, kernels) for source in inputs]
+            if function in STATELESS_FUNCTIONS:
+                values[key] = STATELESS_FUNCTIONS[function](*args)
+            else:
+                kernel = kernels.get(key)
+                if kernel is None and any(math.isnan(arg) for arg in args):
+                    values[key] = NAN if output is None else (NAN,) * 3
+                else:
+                    if kernel is None:
+                        kernel = kernels[key] = KERNELS[KERNEL_ALIASES.get(function, function)](**dict(params))
+                    values[key] = kernel.update(*args)
+        return values[key] if output is None else values[key][output]
+
+    def update(self, date, bar):
+        """Feeds one bar (dict of price fields) and returns {column: value} for that bar."""
+        values = {}
+        self.values = {name: self._node(self.registry[name], bar, values, self.kernels) for name in self.columns}
+        self.last_date = date
+        return self.values
+
+    def peek(self, bar, columns=None):
+        """
+        The columns (default: all) the next bar would give, without advancing the state; used for a
+        daily bar that is still forming. Only the kernels those columns need are copied.
+        """
+        values = {}
+        kernels = _ScratchKernels(self.kernels)
+        return {name: self._node(self.registry[name], bar, values, kernels) for name in (columns or self.columns)}
+
+    def to_state(self):
+        return {'columns': self.columns, 'last_date': self.last_date, 'values': self.values,
+                'kernels': {key: kernel.to_state() for key, kernel in self.kernels.items()}}
+
+    @classmethod
+    def from_state(cls, state, registry=indicatorengine.BASE_INDICATORS):
+        engine = cls(registry, state['columns'])
+        engine.last_date = state['last_date']
+        engine.values = state.get('values', {})
+        engine.kernels = {key: Kernel.from_state(kernel) for key, kernel in state['kernels'].items()}
+        return engine
+
+
+class _ScratchKernels(dict):
+    """Kernels copied from `source` on first use, so peek() leaves the real ones untouched."""
+
+    def __init__(self, source):
+        super().__init__()
+        self.source = source
+
+    def get(self, key, default=None):
+        if key not in self and key in self.source:
+            self[key] = copy.deepcopy(self.source[key])
+        return super().get(key, default)
+
+
+def _state_path(symbol, name=None):
+    return os.path.join(STATE_DIR, f"{symbol}.{name}.json" if name else f"{symbol}.json")
+
+
+def load_state(symbol, registry=indicatorengine.BASE_INDICATORS, name=None):
+    """
+    The symbol's persisted StreamingIndicators, or None when it has none. `name` tells apart the states
+    of other registries kept for the same symbol (e.g. its relative_price_ columns).
+    """
+    try:
+        with open(_state_path(symbol, name), encoding='utf-8') as f:
+            return StreamingIndicators.from_state(json.load(f), registry)
+    except (OSError, ValueError, KeyError):
+        return None
+
+
+def save_state(symbol, engine, name=None):
+    os.makedirs(STATE_DIR, exist_ok=True)
+    path = _state_path(symbol, name)
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        json.dump(engine.to_state(), f)
+    os.replace(tmp_path, path)
+
+
+def update_frame(engine, daily_prices):
+    """
+    Feeds every bar of a date-indexed OHLCV DataFrame newer than engine.last_date and returns the
+    streamed columns for those bars as a list of (date, {column: value}).
+    """
+    rows = []
+    for date, bar in zip(daily_prices.index, daily_prices.to_dict('records')):
+        key = date.strftime('%Y-%m-%d')
+        if engine.last_date is not None and key <= engine.last_date:
+            continue
+        rows.append((key, engine.update(key, bar)))
+    return rows
@@ -1,22 +1,21 @@
-import requests
-import pandas as pd
-import time
-import pymysql
-import talib
+import httpclient
+import responsecache
+import columnarstore
+import fmpfetch
 import numpy as np
+import pandas as pd
+import multiprocessing
+import os
+import queue
+import threading
+import dbpool
+import indicatorengine
+import pricepanel
+import relativestrength
+import stagedtable
+import streamingindicators
 from datetime import datetime, timedelta
-
-
-def get_with_retry(url, retries=3, delay=1):
-    for _ in range(retries):
-        try:
-            response = requests.get(url)
-            response.raise_for_status()  # This will raise an HTTPError if the response was unsuccessful
-            return response
-        except (requests.exceptions.RequestException, requests.exceptions.HTTPError) as e:
-            print(f"Request failed with {e}, retrying...")
-            time.sleep(delay)
-    raise Exception(f"Failed to fetch data from {url} after {retries} retries")
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor, as_completed
 
 
 # Database credentials
@@ -24,223 +23,68 @@ db_host = 'localhost'
 db_user = 'user'
 db_password = 'password'
 db_name = 'db'
-
-# Connect to the MySQL database
-conn = pymysql.connect(host=db_host, user=db_user, password=db_password, db=db_name)
-cursor = conn.cursor()
+MYSQL_CONFIG = {'host': db_host, 'user': db_user, 'password': db_password, 'database': db_name}
 
 # Data feed setup
 api_key = 'yourapikey'
 
-# Get all unique stock symbols along with their sector and industry
-cursor.execute("SELECT DISTINCT symbol, sector, index_name FROM stock_symbols")
-symbols_with_sector_and_industry = cursor.fetchall()
-
-# Filter symbols that have 'N/A' for both sector and industry
-symbols = [(symbol) for symbol in symbols_with_sector_and_industry]
-
-# Drop the existing 'ta' table if it exists
-cursor.execute("DROP TABLE IF EXISTS technical_data")
-conn.commit()
-
-# Create table 'ta' with new structure
-cursor.execute("""
-    CREATE TABLE IF NOT EXISTS technical_data (
-        symbol VARCHAR(10),
-        index_name VARCHAR(255),
-        date DATE,
-        open_price FLOAT,
-        high FLOAT,
-        low FLOAT,
-        close FLOAT,
-        volume BIGINT,
-        sma_volume_10 FLOAT,
-        roc FLOAT,
-        rsi FLOAT,
-        macd FLOAT,
-        macd_signal FLOAT,
-        macd_hist FLOAT,
-        ad FLOAT,
-        adosc FLOAT,
-        adx FLOAT,
-        adxr FLOAT,
-        apo FLOAT,
-        aroon_up FLOAT,
-        aroon_down FLOAT,
-        aroonosc FLOAT,
-        atr FLOAT,
-        avgprice FLOAT,
-        bbands_upper FLOAT,
-        bbands_middle FLOAT,
-        bbands_lower FLOAT,
-        bop FLOAT,
-        cci FLOAT,
-        min FLOAT,
-        max FLOAT,
-        cmo FLOAT,
-        correl FLOAT,
-        dema FLOAT,              
-        dx FLOAT,
-        ema FLOAT,
-        ema_10 FLOAT,
-        ema_20 FLOAT,
-        ema_50 FLOAT,
-        ema_100 FLOAT,
-        ema_150 FLOAT,
-        ema_200 FLOAT,                 
-        kama FLOAT,
-        ma FLOAT,
-        mom FLOAT,
-        willr FLOAT,
-        sar FLOAT,
-        ultosc FLOAT,   
-        tsf FLOAT,
-        natr FLOAT,
-        obv FLOAT,
-        tenkan_sen FLOAT,
-        kijun_sen FLOAT,
-        senkou_span_a FLOAT,
-        senkou_span_b FLOAT,
-        chikou_span FLOAT,
-        stdev FLOAT,
-        sma_10 FLOAT,
-        sma_20 FLOAT,
-        sma_50 FLOAT,
-        sma_100 FLOAT,
-        sma_150 FLOAT,
-        sma_200 FLOAT,
-        roc_sma_50 FLOAT,
-        roc_sma_200 FLOAT,
-        mfi FLOAT,
-        vwap FLOAT,
-        bbands_percent_b FLOAT,
-        prev_close FLOAT,
-        macd_prev FLOAT,
-        macd_hist_prev FLOAT,
-        macd_signal_prev FLOAT,
-        pct_diff_50d_sma FLOAT,
-        pct_diff_200d_sma FLOAT,
-        relative_close_spy FLOAT,
-        relative_price_rsi FLOAT,
-        relative_price_macd FLOAT,
-        relative_price_macd_signal FLOAT,
-        relative_price_macd_hist FLOAT,
-        relative_price_roc FLOAT,
-        relative_price_ad FLOAT,
-        relative_price_adosc FLOAT,
-        relative_price_adx FLOAT,
-        relative_price_adxr FLOAT,
-        relative_price_apo FLOAT,
-        relative_price_aroon_up FLOAT,
-        relative_price_aroon_down FLOAT,
-        relative_price_aroonosc FLOAT,
-        relative_price_atr FLOAT,
-        relative_price_avgprice FLOAT,
-        relative_price_bbands_upper FLOAT,
-        relative_price_bbands_middle FLOAT,
-        relative_price_bbands_lower FLOAT,
-        relative_price_bop FLOAT,
-        relative_price_cci FLOAT,
-        relative_price_min FLOAT,
-        relative_price_max FLOAT,
-        relative_price_cmo FLOAT,
-        relative_price_correl FLOAT,
-        relative_price_dema FLOAT,
-        relative_price_dx FLOAT,
-        relative_price_sma_10 FLOAT,
-        relative_price_sma_20 FLOAT,
-        relative_price_sma_50 FLOAT,
-        relative_price_sma_100 FLOAT,
-        relative_price_sma_150 FLOAT,
-        relative_price_sma_200 FLOAT,
-        relative_price_ema FLOAT,
-        relative_price_ema_10 FLOAT,
-        relative_price_ema_20 FLOAT,                        
-        relative_price_ema_50 FLOAT,  
-        relative_price_ema_100 FLOAT,  
-        relative_price_ema_150 FLOAT,  
-        relative_price_ema_200 FLOAT,
-        relative_price_kama FLOAT,
-        relative_price_ma FLOAT,
-        relative_price_mom FLOAT,
-        relative_price_willr FLOAT,
-        relative_price_sar FLOAT,
-        relative_price_ultosc FLOAT,
-        relative_price_tsf FLOAT,
-        relative_price_natr FLOAT,
-        relative_price_obv FLOAT, 
-        relative_price_mfi FLOAT,
-        relative_price_tenkan_sen FLOAT,
-        relative_price_kijun_sen FLOAT,
-        relative_price_senkou_span_a FLOAT,
-        relative_price_senkou_span_b FLOAT,
-        relative_price_chikou_span FLOAT,
-        relative_price_stdev FLOAT,
-        relative_sector_close FLOAT,
-        relative_sector_open FLOAT,
-        relative_sector_high FLOAT,
-        relative_sector_low FLOAT,
-        relative_sector_volume FLOAT,
-        relative_sector_rsi FLOAT,
-        relative_sector_macd FLOAT,
-        relative_sector_macd_signal FLOAT,
-        relative_sector_macd_hist FLOAT,
-        relative_sector_roc FLOAT,
-        relative_sector_ad FLOAT,
-        relative_sector_adosc FLOAT,
-        relative_sector_adx FLOAT,
-        relative_sector_adxr FLOAT,
-        relative_sector_apo FLOAT,
-        relative_sector_aroon_up FLOAT,
-        relative_sector_aroon_down FLOAT,
-        relative_sector_aroonosc FLOAT,
-        relative_sector_atr FLOAT,
-        relative_sector_avgprice FLOAT,
-        relative_sector_bbands_upper FLOAT,
-        relative_sector_bbands_middle FLOAT,
-        relative_sector_bbands_lower FLOAT,
-        relative_sector_bop FLOAT,
-        relative_sector_cci FLOAT,
-        relative_sector_min FLOAT,
-        relative_sector_max FLOAT,
-        relative_sector_cmo FLOAT,
-        relative_sector_correl FLOAT,
-        relative_sector_dema FLOAT,
-        relative_sector_dx FLOAT,
-        relative_sector_sma_10 FLOAT,
-        relative_sector_sma_20 FLOAT,
-        relative_sector_sma_50 FLOAT,
-        relative_sector_sma_100 FLOAT,
-        relative_sector_sma_150 FLOAT,
-        relative_sector_sma_200 FLOAT,
-        relative_sector_ema FLOAT,
-        relative_sector_ema_10 FLOAT,
-        relative_sector_ema_20 FLOAT,
-        relative_sector_ema_50 FLOAT,
-        relative_sector_ema_100 FLOAT,
-        relative_sector_ema_150 FLOAT,
-        relative_sector_ema_200 FLOAT,
-        relative_sector_kama FLOAT,
-        relative_sector_ma FLOAT,
-        relative_sector_mom FLOAT,
-        relative_sector_willr FLOAT,
-        relative_sector_sar FLOAT,
-        relative_sector_ultosc FLOAT,
-        relative_sector_tsf FLOAT,
-        relative_sector_natr FLOAT,
-        relative_sector_obv FLOAT,
-        relative_sector_mfi FLOAT,
-        relative_sector_tenkan_sen FLOAT,
-        relative_sector_kijun_sen FLOAT,
-        relative_sector_senkou_span_a FLOAT,
-        relative_sector_senkou_span_b FLOAT,
-        relative_sector_chikou_span FLOAT,
-        relative_sector_stdev FLOAT,
-        last_updated TIMESTAMP,
-        PRIMARY KEY(symbol, date)
-    )
-""")
-conn.commit()
+# Rows per multi-row INSERT statement when writing technical_data (a prepared statement takes at most
+# 65535 parameters, so this times the ~190 columns must stay below that)
+TECHNICAL_DATA_BATCH_SIZE = 250
+
+# technical_latest keeps each symbol's own latest bar; symbols staler than this are dropped from it
+LATEST_MAX_AGE_DAYS = 7
+
+# Also keep a per-symbol Parquet copy of technical_data (see columnarstore.py); requires pyarrow
+COLUMNAR_STORE = False
+
+# Incremental refresh: keep technical_data and only fetch bars after each symbol's latest stored date.
+# Set to False to drop the table and rebuild HISTORY_DAYS of history for every symbol.
+INCREMENTAL = True
+HISTORY_DAYS = 3*365  # history fetched for a full rebuild or a symbol not yet in the table
+# History refetched before the new bars when the symbol's streaming states continue from its latest stored
+# date: the recursive columns come from the states, so only the longest window (SMA-200) must be covered
+WARMUP_BARS = 200
+REPLAY_BARS = 400  # with STREAMING_STATE off, room for the smoothed indicators (MACD, DEMA, ADX) to settle as well
+LOOKAHEAD_BARS = 26  # chikou_span looks 26 bars ahead, so the latest 26 stored rows get their look-ahead columns rewritten
+LOOKAHEAD_COLUMNS = ['chikou_span', 'relative_price_chikou_span', 'relative_sector_chikou_span']
+# Running totals that depend on where the series starts; rebased onto the stored value on refresh
+CUMULATIVE_COLUMNS = ['ad', 'obv', 'relative_price_ad', 'relative_price_obv', 'relative_sector_ad', 'relative_sector_obv']
+# Cumulative ratios (sum of price x volume over sum of volume since the first bar); both sums are rebuilt
+# from the stored value and the symbol's stored volume total on refresh
+VOLUME_WEIGHTED_COLUMNS = ['vwap']
+# An EMA (or KAMA) never forgets its seed, so no warm-up makes the long ones match the full history; on
+# refresh those not taken from a streaming state continue from their stored value instead.
+# Column -> (the frame column it averages, function, period)
+SEEDED_AVERAGES = {prefix + column: (source, function, period)
+                   for prefix, registry, source in [('', indicatorengine.BASE_INDICATORS, 'close'),
+                                                    ('relative_price_', indicatorengine.RELATIVE_INDICATORS, 'relative_close_spy'),
+                                                    ('relative_sector_', indicatorengine.RELATIVE_INDICATORS, 'relative_sector_close')]
+                   for column, (function, period) in indicatorengine.moving_average_periods(registry).items()}
+
+# Which columns to compute and store: 'screener' keeps the raw bars plus the columns stockscreener.py reads
+# (stockscreener.TECHNICAL_COLUMNS); 'full' computes every indicator for research
+COLUMN_PROFILE = 'screener'
+PRICE_COLUMNS = ['open_price', 'high', 'low', 'close', 'volume']
+# Keep each symbol's streaming indicator states (streamingindicators.py) current for intraday updates;
+# the nightly refresh also takes the new bars' streamable columns from them, which is what lets it
+# refetch only WARMUP_BARS. A symbol whose states are missing or out of step gets HISTORY_DAYS once to
+# rebuild them.
+STREAMING_STATE = True
+# (column prefix, registry, state name): one state per registry, fed with the bars or the ratio series
+STREAMING_REGISTRIES = [('', indicatorengine.BASE_INDICATORS, None),
+                        ('relative_price_', indicatorengine.RELATIVE_INDICATORS, 'relative_price'),
+                        ('relative_sector_', indicatorengine.RELATIVE_INDICATORS, 'relative_sector')]
+
+# Pipeline: fetch threads feed a process pool that computes indicators, and a writer thread drains finished frames
+FETCH_WORKERS = 4  # Concurrent price downloads; the request rate is capped by fmpfetch.FMP_REQUESTS_PER_MINUTE
+COMPUTE_WORKERS = os.cpu_count()  # Indicator processes
+# Workers are spawned, not forked: main.py --in-process starts this stage from a thread, and forking a
+# process that already runs threads can copy a lock another thread holds
+COMPUTE_CONTEXT = multiprocessing.get_context('spawn')
+MAX_PENDING_FRAMES = 64  # Symbols computed or computing but not yet written; new compute tasks wait when the writer falls behind
+RATIO_BATCH_SIZE = 32  # Fetched symbols handed to the compute pool together; each batch's benchmark ratios are one broadcast
+
 
 sectorlist = {
     'Financials': 'XLF',
@@ -256,556 +100,705 @@ sectorlist = {
     'Consumer Staples': 'XLP',
 }
 
-end_date = datetime.now()
-start_date = end_date - timedelta(days=3*365)  # Fetch data for the last three years
-url_spy = f"https://financialmodelingprep.com/api/v3/historical-chart/1day/SPY?from={start_date.strftime('%Y-%m-%d')}&to={end_date.strftime('%Y-%m-%d')}&apikey={api_key}"
-
-# Perform the API request
-response_spy = requests.get(url_spy)
-if response_spy.status_code == 200:
-    data_spy = response_spy.json()
-    # Create a DataFrame
-    daily_prices_spy = pd.DataFrame(data_spy)
-    daily_prices_spy['date'] = pd.to_datetime(daily_prices_spy['date'])
-    daily_prices_spy.set_index('date', inplace=True)
-else:
-    print("Failed to fetch data")
-    response_spy.raise_for_status()
-
-# Convert prices to numeric values and sort by index (date)
-daily_prices_spy = daily_prices_spy.sort_index()
-for col in ['open', 'high', 'low', 'close', 'volume']:
-    daily_prices_spy[col] = pd.to_numeric(daily_prices_spy[col])
-
-# Extract the required price data
-spy_close = daily_prices_spy['close']
-spy_open = daily_prices_spy['open']
-spy_high = daily_prices_spy['high']
-spy_low = daily_prices_spy['low']
-spy_volume = daily_prices_spy['volume']
-
-time.sleep(1)  # Sleep to avoid rate limiting
-
-# Fetch ETF data
-etf_data = {}
-api_key = 'd288e55d6eef1c72f9a4373d4572c58c'
-end_date = datetime.now()
-start_date = end_date - timedelta(days=3*365)  # Fetch data for the last three years
-
-for sector1, etf in sectorlist.items():
-    print(f"Fetching data for {etf} (ETF for {sector1})...")
-    url_etf = f"https://financialmodelingprep.com/api/v3/historical-chart/1day/{etf}?from={start_date.strftime('%Y-%m-%d')}&to={end_date.strftime('%Y-%m-%d')}&apikey={api_key}"
-
-    # Perform the API request
-    response_etf = requests.get(url_etf)
-    if response_etf.status_code == 200:
-        data_etf = response_etf.json()
-        # Create a DataFrame
-        daily_prices_etf = pd.DataFrame(data_etf)
-        daily_prices_etf['date'] = pd.to_datetime(daily_prices_etf['date'])
-        daily_prices_etf.set_index('date', inplace=True)
-    else:
-        print("Failed to fetch data")
-        response_etf.raise_for_status()
-
-    # Convert prices to numeric values and sort by index (date)
-    daily_prices_etf = daily_prices_etf.sort_index()
-    for col in ['open', 'high', 'low', 'close', 'volume']:
-        daily_prices_etf[col] = pd.to_numeric(daily_prices_etf[col])
-
-    # Extract the required price data and store in the dictionary
-    etf_data[sector1] = {
-        'close': daily_prices_etf['close'],
-        'open': daily_prices_etf['open'],
-        'high': daily_prices_etf['high'],
-        'low': daily_prices_etf['low'],
-        'volume': daily_prices_etf['volume']
-    }
-
-
-    time.sleep(1)  # Sleep to avoid rate limiting
 
-
-# Fetch daily price data for each stock
-end_date = datetime.now()
-start_date = end_date - timedelta(days=3*365)  # Fetch data for the last three years
-
-for symbol, sector, index_name in symbols_with_sector_and_industry:
-    print(f"Fetching data for {symbol}...")
+def get_with_retry(url, description=None, retry_on_empty=True):
+    """
+    Fetches JSON through the on-disk response cache, falling back to httpclient's pooled session and retry policy.
+    Requests share fmpfetch's rate limiter with the fundamentals loaders.
+    """
+    data = responsecache.get_or_fetch(
+        url, lambda: httpclient.get_json(url, description, retry_on_empty=retry_on_empty, limiter=fmpfetch.rate_limiter), description)
+    if data is None:
+        raise Exception(f"Failed to fetch data from {description or url} after {httpclient.RETRY_LIMIT} retries")
+    return data
+
+
+def insert_technical_data(cursor, conn, indicators, batch_size=None, upsert=False):
+    """
+    Writes an indicator frame to technical_data as multi-row INSERT ... VALUES statements of up to
+    batch_size rows. All statements for the frame share one transaction; NaN becomes NULL during the
+    single object-array conversion. `cursor` is a prepared cursor, which prepares a statement on the
+    server once and re-executes it while the same statement (columns and row count) comes again.
+    With upsert=True existing (symbol, date) rows are overwritten.
+    """
+    batch_size = batch_size or TECHNICAL_DATA_BATCH_SIZE
+    columns = list(indicators.columns) + ['last_updated']
+    values = indicators.to_numpy(dtype=object)
+    values[pd.isna(values)] = None
+    last_updated = datetime.now()
+    rows = [row + [last_updated] for row in values.tolist()]
+
+    placeholders = f"({', '.join(['%s'] * len(columns))})"
+    update = ''
+    if upsert:
+        update = " ON DUPLICATE KEY UPDATE " + ', '.join(
+            f"`{column}` = VALUES(`{column}`)" for column in columns if column not in ('symbol', 'date'))
+    try:
+        for start in range(0, len(rows), batch_size):
+            batch = rows[start:start + batch_size]
+            cursor.execute(f"INSERT INTO technical_data ({', '.join(f'`{column}`' for column in columns)}) "
+                           f"VALUES {', '.join([placeholders] * len(batch))}{update}",
+                           [value for row in batch for value in row])
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+
+
+def history_start(last_date, end_date, resumable=False):
+    """
+    First date to request for a symbol: full history when new or when its streaming states must be
+    rebuilt, else WARMUP_BARS (REPLAY_BARS without streaming states) before its latest stored date.
+    """
+    if last_date is None or (STREAMING_STATE and not resumable):
+        return end_date - timedelta(days=HISTORY_DAYS)
+    # ~1.5 calendar days per trading day leaves room for weekends and holidays
+    bars = WARMUP_BARS if resumable else REPLAY_BARS
+    return datetime.combine(last_date, datetime.min.time()) - timedelta(days=int(bars * 1.5))
+
+
+def continue_average(function, seed, values, first, period):
+    """
+    talib's EMA or KAMA recurrence over `values` from position `first` on, continuing from `seed`, the
+    average at the bar before. KAMA's efficiency ratio also reads the `period` values before each bar.
+    """
+    values = values.to_numpy(dtype=np.float64)
+    k = 2.0 / (period + 1)
+    average = float(seed)
+    result = np.empty(len(values) - first)
+    for i in range(first, len(values)):
+        if function == 'KAMA':
+            change = values[i] - values[i - period]
+            path = np.abs(np.diff(values[i - period:i + 1])).sum()
+            ratio = 1.0 if path <= change or abs(path) < 1e-14 else abs(change / path)
+            k = (ratio * (2.0 / 3 - 2.0 / 31) + 2.0 / 31) ** 2  # talib's fixed fast (2) and slow (30) constants
+        average = (values[i] - average) * k + average
+        result[i - first] = average
+    return result
+
+
+def refresh_window(cursor, symbol, indicators, last_date, streamed_columns=()):
+    """
+    Splits a recomputed indicator frame into what an incremental refresh writes: the bars after
+    last_date with every column, and the latest LOOKAHEAD_BARS stored rows with only their
+    LOOKAHEAD_COLUMNS (the rest of those rows is final and keeps its stored values). The new bars
+    continue from the row stored for last_date: cumulative columns are shifted onto its values, VWAP
+    carries on from its value and the stored volume total, and SEEDED_AVERAGES that were not taken from
+    the streaming states (`streamed_columns`) are re-run from its averages. Returns (new rows, look-ahead rows).
+    """
+    anchor_columns = [column for column in CUMULATIVE_COLUMNS + VOLUME_WEIGHTED_COLUMNS + list(SEEDED_AVERAGES) if column in indicators.columns]
+    cursor.execute(
+        f"SELECT {', '.join(['date'] + anchor_columns)} FROM technical_data WHERE symbol = %s AND date <= %s ORDER BY date DESC LIMIT %s",
+        (symbol, last_date, LOOKAHEAD_BARS))
+    stored = cursor.fetchall()
+
+    anchor = pd.Timestamp(last_date)
+    new_rows = indicators[indicators.index > anchor].copy()
+    if stored and anchor in indicators.index:
+        anchor_values = dict(zip(anchor_columns, stored[0][1:]))
+        for column in CUMULATIVE_COLUMNS:
+            if anchor_values.get(column) is not None and pd.notna(indicators.at[anchor, column]):
+                new_rows[column] += anchor_values[column] - indicators.at[anchor, column]
+        if any(anchor_values.get(column) is not None for column in VOLUME_WEIGHTED_COLUMNS):
+            cursor.execute("SELECT SUM(volume) FROM technical_data WHERE symbol = %s AND date <= %s", (symbol, last_date))
+            stored_volume = float(cursor.fetchone()[0] or 0)
+            volume = stored_volume + new_rows['volume'].cumsum()
+            price_volume = (new_rows['volume'] * (new_rows['high'] + new_rows['low'] + new_rows['close']) / 3).cumsum()
+            for column in VOLUME_WEIGHTED_COLUMNS:
+                if anchor_values.get(column) is not None:
+                    new_rows[column] = (anchor_values[column] * stored_volume + price_volume) / volume
+        first = len(indicators) - len(new_rows)
+        for column, (source, function, period) in SEEDED_AVERAGES.items():
+            # An average whose source column the profile does not compute keeps its warm-up value
+            if column not in streamed_columns and anchor_values.get(column) is not None and source in indicators.columns and first >= period:
+                new_rows[column] = continue_average(function, anchor_values[column], indicators[source], first, period)
+    else:
+        print(f"Stored history for {symbol} does not overlap the refreshed bars; cumulative columns and averages restart.")
+
+    cutoff = pd.Timestamp(stored[-1][0]) if stored else anchor
+    lookahead_columns = [column for column in LOOKAHEAD_COLUMNS if column in indicators.columns]
+    revised = indicators.loc[(indicators.index >= cutoff) & (indicators.index <= anchor), ['symbol', 'date'] + lookahead_columns]
+    return new_rows, revised if lookahead_columns else revised.iloc[:0]
+
+
+def stored_history(cursor, symbol, columns):
+    """Every technical_data row stored for a symbol, limited to `columns`, oldest first."""
+    cursor.execute(f"SELECT {', '.join(f'`{column}`' for column in columns)} FROM technical_data WHERE symbol = %s ORDER BY date", (symbol,))
+    return pd.DataFrame(list(cursor.fetchall()), columns=columns)
+
+
+def refresh_latest_snapshot(cursor, conn):
+    """
+    Rebuilds technical_latest (one row per symbol: its own most recent bar) in a staging table and
+    swaps it in with stagedtable's atomic RENAME, so readers never see a partial snapshot.
+    Symbols whose last bar is more than LATEST_MAX_AGE_DAYS older than the newest bar are left out.
+    """
+    staging = stagedtable.create_staging(cursor, 'technical_latest', "CREATE TABLE IF NOT EXISTS {table} LIKE technical_data")
+    cursor.execute(f"""
+        INSERT INTO {staging}
+        SELECT technical_data.*
+        FROM technical_data
+        INNER JOIN (
+            SELECT symbol, MAX(date) AS latest_date FROM technical_data GROUP BY symbol
+        ) latest ON technical_data.symbol = latest.symbol AND technical_data.date = latest.latest_date
+        WHERE latest.latest_date >= (SELECT MAX(date) FROM technical_data) - INTERVAL %s DAY
+    """, (LATEST_MAX_AGE_DAYS,))
+    stagedtable.swap_in(cursor, 'technical_latest')
+    conn.commit()
+
+
+def create_technical_data_table(cursor, conn):
+    """Creates technical_data if missing; a full rebuild (INCREMENTAL = False) drops it first."""
+    if not INCREMENTAL:
+        cursor.execute("DROP TABLE IF EXISTS technical_data")
+        conn.commit()
+
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS technical_data (
+            symbol VARCHAR(10),
+            index_name VARCHAR(255),
+            date DATE,
+            open_price FLOAT,
+            high FLOAT,
+            low FLOAT,
+            close FLOAT,
+            volume BIGINT,
+            sma_volume_10 FLOAT,
+            roc FLOAT,
+            rsi FLOAT,
+            macd FLOAT,
+            macd_signal FLOAT,
+            macd_hist FLOAT,
+            ad FLOAT,
+            adosc FLOAT,
+            adx FLOAT,
+            adxr FLOAT,
+            apo FLOAT,
+            aroon_up FLOAT,
+            aroon_down FLOAT,
+            aroonosc FLOAT,
+            atr FLOAT,
+            avgprice FLOAT,
+            bbands_upper FLOAT,
+            bbands_middle FLOAT,
+            bbands_lower FLOAT,
+            bop FLOAT,
+            cci FLOAT,
+            min FLOAT,
+            max FLOAT,
+            cmo FLOAT,
+            correl FLOAT,
+            dema FLOAT,              
+            dx FLOAT,
+            ema FLOAT,
+            ema_10 FLOAT,
+            ema_20 FLOAT,
+            ema_50 FLOAT,
+            ema_100 FLOAT,
+            ema_150 FLOAT,
+            ema_200 FLOAT,                 
+            kama FLOAT,
+            ma FLOAT,
+            mom FLOAT,
+            willr FLOAT,
+            sar FLOAT,
+            ultosc FLOAT,   
+            tsf FLOAT,
+            natr FLOAT,
+            obv FLOAT,
+            tenkan_sen FLOAT,
+            kijun_sen FLOAT,
+            senkou_span_a FLOAT,
+            senkou_span_b FLOAT,
+            chikou_span FLOAT,
+            stdev FLOAT,
+            sma_10 FLOAT,
+            sma_20 FLOAT,
+            sma_50 FLOAT,
+            sma_100 FLOAT,
+            sma_150 FLOAT,
+            sma_200 FLOAT,
+            roc_sma_50 FLOAT,
+            roc_sma_200 FLOAT,
+            mfi FLOAT,
+            vwap FLOAT,
+            bbands_percent_b FLOAT,
+            prev_close FLOAT,
+            macd_prev FLOAT,
+            macd_hist_prev FLOAT,
+            macd_signal_prev FLOAT,
+            pct_diff_50d_sma FLOAT,
+            pct_diff_200d_sma FLOAT,
+            relative_close_spy FLOAT,
+            relative_price_rsi FLOAT,
+            relative_price_macd FLOAT,
+            relative_price_macd_signal FLOAT,
+            relative_price_macd_hist FLOAT,
+            relative_price_roc FLOAT,
+            relative_price_ad FLOAT,
+            relative_price_adosc FLOAT,
+            relative_price_adx FLOAT,
+            relative_price_adxr FLOAT,
+            relative_price_apo FLOAT,
+            relative_price_aroon_up FLOAT,
+            relative_price_aroon_down FLOAT,
+            relative_price_aroonosc FLOAT,
+            relative_price_atr FLOAT,
+            relative_price_avgprice FLOAT,
+            relative_price_bbands_upper FLOAT,
+            relative_price_bbands_middle FLOAT,
+            relative_price_bbands_lower FLOAT,
+            relative_price_bop FLOAT,
+            relative_price_cci FLOAT,
+            relative_price_min FLOAT,
+            relative_price_max FLOAT,
+            relative_price_cmo FLOAT,
+            relative_price_correl FLOAT,
+            relative_price_dema FLOAT,
+            relative_price_dx FLOAT,
+            relative_price_sma_10 FLOAT,
+            relative_price_sma_20 FLOAT,
+            relative_price_sma_50 FLOAT,
+            relative_price_sma_100 FLOAT,
+            relative_price_sma_150 FLOAT,
+            relative_price_sma_200 FLOAT,
+            relative_price_ema FLOAT,
+            relative_price_ema_10 FLOAT,
+            relative_price_ema_20 FLOAT,                        
+            relative_price_ema_50 FLOAT,  
+            relative_price_ema_100 FLOAT,  
+            relative_price_ema_150 FLOAT,  
+            relative_price_ema_200 FLOAT,
+            relative_price_kama FLOAT,
+            relative_price_ma FLOAT,
+            relative_price_mom FLOAT,
+            relative_price_willr FLOAT,
+            relative_price_sar FLOAT,
+            relative_price_ultosc FLOAT,
+            relative_price_tsf FLOAT,
+            relative_price_natr FLOAT,
+            relative_price_obv FLOAT, 
+            relative_price_mfi FLOAT,
+            relative_price_tenkan_sen FLOAT,
+            relative_price_kijun_sen FLOAT,
+            relative_price_senkou_span_a FLOAT,
+            relative_price_senkou_span_b FLOAT,
+            relative_price_chikou_span FLOAT,
+            relative_price_stdev FLOAT,
+            relative_sector_close FLOAT,
+            relative_sector_open FLOAT,
+            relative_sector_high FLOAT,
+            relative_sector_low FLOAT,
+            relative_sector_volume FLOAT,
+            relative_sector_rsi FLOAT,
+            relative_sector_macd FLOAT,
+            relative_sector_macd_signal FLOAT,
+            relative_sector_macd_hist FLOAT,
+            relative_sector_roc FLOAT,
+            relative_sector_ad FLOAT,
+            relative_sector_adosc FLOAT,
+            relative_sector_adx FLOAT,
+            relative_sector_adxr FLOAT,
+            relative_sector_apo FLOAT,
+            relative_sector_aroon_up FLOAT,
+            relative_sector_aroon_down FLOAT,
+            relative_sector_aroonosc FLOAT,
+            relative_sector_atr FLOAT,
+            relative_sector_avgprice FLOAT,
+            relative_sector_bbands_upper FLOAT,
+            relative_sector_bbands_middle FLOAT,
+            relative_sector_bbands_lower FLOAT,
+            relative_sector_bop FLOAT,
+            relative_sector_cci FLOAT,
+            relative_sector_min FLOAT,
+            relative_sector_max FLOAT,
+            relative_sector_cmo FLOAT,
+            relative_sector_correl FLOAT,
+            relative_sector_dema FLOAT,
+            relative_sector_dx FLOAT,
+            relative_sector_sma_10 FLOAT,
+            relative_sector_sma_20 FLOAT,
+            relative_sector_sma_50 FLOAT,
+            relative_sector_sma_100 FLOAT,
+            relative_sector_sma_150 FLOAT,
+            relative_sector_sma_200 FLOAT,
+            relative_sector_ema FLOAT,
+            relative_sector_ema_10 FLOAT,
+            relative_sector_ema_20 FLOAT,
+            relative_sector_ema_50 FLOAT,
+            relative_sector_ema_100 FLOAT,
+            relative_sector_ema_150 FLOAT,
+            relative_sector_ema_200 FLOAT,
+            relative_sector_kama FLOAT,
+            relative_sector_ma FLOAT,
+            relative_sector_mom FLOAT,
+            relative_sector_willr FLOAT,
+            relative_sector_sar FLOAT,
+            relative_sector_ultosc FLOAT,
+            relative_sector_tsf FLOAT,
+            relative_sector_natr FLOAT,
+            relative_sector_obv FLOAT,
+            relative_sector_mfi FLOAT,
+            relative_sector_tenkan_sen FLOAT,
+            relative_sector_kijun_sen FLOAT,
+            relative_sector_senkou_span_a FLOAT,
+            relative_sector_senkou_span_b FLOAT,
+            relative_sector_chikou_span FLOAT,
+            relative_sector_stdev FLOAT,
+            last_updated TIMESTAMP,
+            PRIMARY KEY(symbol, date)
+        )
+    """)
+    conn.commit()
+
+
+def fetch_bars(symbol, start_date, end_date, retry_on_empty=True):
+    """A symbol's daily OHLCV bars as returned by FMP (a list of dicts), or None/[] when the feed returns nothing."""
     url = f"https://financialmodelingprep.com/api/v3/historical-chart/1day/{symbol}?from={start_date.strftime('%Y-%m-%d')}&to={end_date.strftime('%Y-%m-%d')}&apikey={api_key}"
-
+    return get_with_retry(url, symbol, retry_on_empty=retry_on_empty)
+
+
+def load_benchmarks(start_date, end_date):
+    """
+    Fetches SPY and every sector ETF once per run into a benchmark panel on SPY's trading calendar,
+    which is also the calendar of the run's universe panel. Returns the benchmark panel.
+    """
+    spy_bars = fetch_bars('SPY', start_date, end_date)
+    calendar = pricepanel.calendar_from_bars(spy_bars)
+    benchmarks = pricepanel.PricePanel(['SPY'] + list(sectorlist.values()), calendar)
+    benchmarks.set_bars('SPY', spy_bars)
+
+    for sector, etf in sectorlist.items():
+        print(f"Fetching data for {etf} (ETF for {sector})...")
+        benchmarks.set_bars(etf, fetch_bars(etf, start_date, end_date))
+    return benchmarks
+
+
+def profile_columns(profile=None):
+    """The technical_data columns a column profile computes, or None for every column."""
+    profile = profile or COLUMN_PROFILE
+    if profile == 'full':
+        return None
+    if profile == 'screener':
+        import stockscreener  # imported here so compute processes and 'full' runs do not load sklearn
+        return set(PRICE_COLUMNS) | set(stockscreener.TECHNICAL_COLUMNS)
+    raise ValueError(f"Unknown column profile: {profile}")
+
+
+def _unprefixed(columns, prefix):
+    if columns is None:
+        return None
+    return set(column[len(prefix):] for column in columns if column.startswith(prefix))
+
+
+def compute_indicators(symbol, index_name, daily_prices, price_relative, sector_relative, columns=None):
+    """
+    Computes the technical_data columns for one symbol from its daily bars and its price/SPY and
+    price/sector ETF ratio series (field -> Series on the same dates, see relativestrength.py);
+    `columns` limits the result (and the work) to those columns.
+    Returns None when there is not enough valid data.
+    """
+
+    # Calculate technical indicators
+    close = daily_prices['close'].dropna()
+    open_price = daily_prices['open'].dropna()
+    high = daily_prices['high'].dropna()
+    low = daily_prices['low'].dropna()
+    volume = daily_prices['volume'].dropna()
+
+    if close.empty or high.empty or low.empty or volume.empty:
+        print(f"Not enough valid data for {symbol} to calculate indicators.")
+        return None
+
+    series = {'close': close, 'open': open_price, 'high': high, 'low': low, 'volume': volume}
+
+    # Combine all series into a DataFrame
+    columns_wanted = lambda name: columns is None or name in columns
+    indicators = pd.DataFrame({
+        'symbol': symbol,
+        'index_name': index_name,
+        'date': close.index,
+        **indicatorengine.compute(indicatorengine.BASE_INDICATORS, series, columns),
+        **({'relative_close_spy': price_relative['close']} if columns_wanted('relative_close_spy') else {}),
+        **indicatorengine.compute(indicatorengine.RELATIVE_INDICATORS, price_relative, _unprefixed(columns, 'relative_price_'), prefix='relative_price_'),
+        **{f"relative_sector_{field}": sector_relative[field] for field in indicatorengine.PRICE_FIELDS if columns_wanted(f"relative_sector_{field}")},
+        **indicatorengine.compute(indicatorengine.RELATIVE_INDICATORS, sector_relative, _unprefixed(columns, 'relative_sector_'), prefix='relative_sector_'),
+    })
+
+    return indicators
+
+
+# The column profile and STREAMING_STATE inside each compute process, set once by the pool initializer
+# (spawned workers import this module afresh, so settings changed at run time must be passed in)
+_columns = None
+_streaming_state = STREAMING_STATE
+
+
+def _init_compute_worker(columns, streaming_state):
+    global _columns, _streaming_state
+    _columns = columns
+    _streaming_state = streaming_state
+
+
+def _streaming_registries(columns=None):
+    """STREAMING_REGISTRIES that have streamable columns in the profile, with those columns unprefixed."""
+    for prefix, registry, name in STREAMING_REGISTRIES:
+        registry_columns = _unprefixed(columns, prefix)
+        if streamingindicators.streamable_columns(registry, registry_columns):
+            yield prefix, registry, name, registry_columns
+
+
+def _state_continues(state, last_date, registry, columns):
+    return (state is not None and last_date is not None and state.last_date == str(last_date)
+            and state.columns == streamingindicators.streamable_columns(registry, columns))
+
+
+def streaming_resumable(symbol, last_date, columns=None):
+    """True when every streaming state of the symbol continues from last_date, so WARMUP_BARS of history suffice."""
+    return STREAMING_STATE and last_date is not None and all(
+        _state_continues(streamingindicators.load_state(symbol, registry, name), last_date, registry, registry_columns)
+        for _, registry, name, registry_columns in _streaming_registries(columns))
+
+
+def update_streaming_state(symbol, last_date, bars, registry=indicatorengine.BASE_INDICATORS, name=None, columns=None):
+    """
+    Advances one of the symbol's persisted streaming states (the registry fed with `bars`, a date-indexed
+    frame of the price fields) by the bars after last_date, or rebuilds it from `bars` (a full rebuild,
+    a new symbol, or a state out of step with technical_data). Returns (state, streamed). `state` is
+    the advanced StreamingIndicators, or None when there were no new bars; it is not saved here, since
+    it must only be persisted once the rows are written. When the state continued from last_date,
+    `streamed` holds the streamed columns for last_date and the new bars as a date-indexed DataFrame
+    (they follow the kernels' whole history rather than the fetched window); otherwise it is None.
+    """
+    state = streamingindicators.load_state(symbol, registry, name)
+    continued = _state_continues(state, last_date, registry, columns)
+    if continued:
+        streamed = [(state.last_date, state.values)]
+    else:
+        state = streamingindicators.StreamingIndicators(registry, columns)
+        streamed = []
+    rows = streamingindicators.update_frame(state, bars)
+    if not rows:
+        return None, None
+    if not continued:
+        return state, None
+    streamed = pd.DataFrame([values for _, values in streamed + rows], index=pd.to_datetime([date for date, _ in streamed + rows]))
+    return state, streamed.astype(np.float64)
+
+
+def _compute_task(symbol, index_name, last_date, daily_prices, ratios):
+    """
+    Runs in a compute process on the symbol's bars and its ratio rows (one entry of
+    relativestrength.symbol_ratios()). Returns (indicators, {state name: streaming state to save once
+    they are written}, the columns taken from the states).
+    """
+    relative = {'relative_price_': relativestrength.ratio_series(ratios['price'], daily_prices.index),
+                'relative_sector_': relativestrength.ratio_series(ratios['sector'], daily_prices.index)}
+    indicators = compute_indicators(symbol, index_name, daily_prices, relative['relative_price_'], relative['relative_sector_'], _columns)
+    states, streamed_columns = {}, []
+    if _streaming_state and indicators is not None:
+        for prefix, registry, name, registry_columns in _streaming_registries(_columns):
+            bars = pd.DataFrame(relative[prefix]) if prefix else daily_prices
+            state, streamed = update_streaming_state(symbol, last_date, bars, registry, name, registry_columns)
+            if state is not None:
+                states[name] = state
+            if streamed is not None:
+                # The streamable columns of last_date and the new bars are taken from the kernels; the rest
+                # (AD, CCI, chikou_span, ...) have finite windows and come from the fetched bars above
+                streamed = streamed.add_prefix(prefix)
+                streamed = streamed.loc[streamed.index.intersection(indicators.index), [column for column in streamed.columns if column in indicators.columns]]
+                indicators.loc[streamed.index, streamed.columns] = streamed
+                streamed_columns += list(streamed.columns)
+    return indicators, states, streamed_columns
+
+
+def _fetch_task(symbol, start_date, end_date, universe):
+    """Fetches a symbol's bars into its row of the universe panel and returns them as a DataFrame, or None to skip it."""
+    bars = fetch_bars(symbol, start_date, end_date, retry_on_empty=False)
+    if not bars:
+        print(f"No data returned for {symbol}, skipping.")
+        return None
+
+    dropped = universe.set_bars(symbol, bars)
+    if dropped:
+        print(f"{symbol}: {dropped} bars fall outside the SPY calendar and were dropped.")
+    daily_prices = universe.frame(symbol)
+
+    # Ensure no NaNs are present in the data
+    if daily_prices.isna().any().any():
+        print(f"Missing data for {symbol}, skipping calculations.")
+        return None
+    return daily_prices
+
+
+def _write_worker(conn, write_queue, pending):
+    """
+    Drains (symbol, last_date, indicators, streaming states, streamed columns) items from write_queue on
+    its own connection until it receives None. The streaming states are saved only after the symbol's rows are
+    committed, so a failed write leaves it in step with technical_data. Each finished symbol releases
+    a slot in `pending`.
+    """
+    cursor = conn.cursor(buffered=True)
+    # One prepared cursor per kind of write: on a nightly refresh most symbols write the same number
+    # of new rows and of look-ahead rows, so each cursor keeps re-executing one prepared statement
+    insert_cursor = conn.cursor(prepared=True)
+    revise_cursor = conn.cursor(prepared=True)
     try:
-        response = requests.get(url)
-        if response.status_code == 200:
-            data = response.json()
-            if data:  # Check if data list is not empty
-                daily_prices = pd.DataFrame(data)
-                daily_prices['date'] = pd.to_datetime(daily_prices['date'])
-                daily_prices.set_index('date', inplace=True)
-
-                # Convert prices to numeric values and sort by index (date)
-                for col in ['open', 'high', 'low', 'close', 'volume']:
-                    daily_prices[col] = pd.to_numeric(daily_prices[col], errors='coerce')
-
-                print(f"Data summary for {symbol}:", daily_prices.describe())
-
-                # Ensure no NaNs are present in the data
-                if daily_prices.isna().any().any():
-                    print(f"Missing data for {symbol}, skipping calculations.")
-                    continue
-
-                # Calculate technical indicators
-                close = daily_prices['close'].dropna()
-                open_price = daily_prices['open'].dropna()
-                high = daily_prices['high'].dropna()
-                low = daily_prices['low'].dropna()
-                volume = daily_prices['volume'].dropna()
+        while True:
+            item = write_queue.get()
+            if item is None:
+                break
+            symbol, last_date, indicators, states, streamed_columns = item
+            try:
+                # On a refresh only the new bars (plus the look-ahead columns of the latest stored rows) are written
+                revised = None
+                if last_date is not None:
+                    indicators, revised = refresh_window(cursor, symbol, indicators, last_date, streamed_columns)
+
+                # Write the symbol's rows as batched multi-row INSERTs in a single transaction
+                insert_technical_data(insert_cursor, conn, indicators, upsert=last_date is not None)
+                if revised is not None and not revised.empty:
+                    insert_technical_data(revise_cursor, conn, revised, upsert=True)
+                for name, state in states.items():
+                    streamingindicators.save_state(symbol, state, name)
+                if COLUMNAR_STORE:
+                    if last_date is not None and not columnarstore.has_symbol(symbol):
+                        # A refresh only carries the new bars; a symbol without a file gets its whole stored history
+                        columnarstore.write_symbol(symbol, stored_history(cursor, symbol, list(indicators.columns)))
+                    else:
+                        for frame in [indicators, revised]:
+                            if frame is not None and not frame.empty:
+                                columnarstore.write_symbol(symbol, frame)
+            except Exception as e:
+                print(f"Failed to write data for {symbol}: {e}")
+            finally:
+                pending.release()
+    finally:
+        insert_cursor.close()
+        revise_cursor.close()
+        cursor.close()
+
+
+def run_pipeline(symbols, latest_dates, start_dates, end_date, benchmarks, universe, columns=None):
+    """
+    Fetches, computes and writes every symbol that needs new bars. Downloads run on FETCH_WORKERS threads
+    and land in the `universe` price panel. Every RATIO_BATCH_SIZE fetched symbols, their ratios against
+    SPY and their sector ETFs are computed in one broadcast and the batch is handed to a COMPUTE_WORKERS
+    process pool, so computing overlaps the remaining downloads; a single writer thread inserts the
+    indicator frames as they finish.
+    """
+    # Symbols whose sector has no ETF (e.g. 'Unknown') get NULL relative_sector_* columns
+    sectors = {symbol: sector for symbol, sector, _ in symbols}
+    pending = threading.BoundedSemaphore(MAX_PENDING_FRAMES)
+    write_queue = queue.Queue()
+    # Connections are not thread-safe, so the writer checks out its own from the pool
+    write_conn = dbpool.connect(MYSQL_CONFIG)
+    writer = threading.Thread(target=_write_worker, args=(write_conn, write_queue, pending), daemon=True)
+    writer.start()
+
+    def queue_result(symbol, last_date, future):
+        try:
+            indicators, states, streamed_columns = future.result()
+        except Exception as e:
+            print(f"Failed to compute indicators for {symbol}: {e}")
+            indicators = None
+        if indicators is None:
+            pending.release()
+        else:
+            write_queue.put((symbol, last_date, indicators, states, streamed_columns))
+
+    def compute_batch(compute_pool, batch):
+        batch_symbols = [symbol for symbol, _, _ in batch]
+        ratios = relativestrength.symbol_ratios(universe, benchmarks, 'SPY', [sectorlist.get(sectors[symbol]) for symbol in batch_symbols], batch_symbols)
+        for symbol, index_name, daily_prices in batch:
+            last_date = latest_dates.get(symbol)
+            pending.acquire()
+            try:
+                compute = compute_pool.submit(_compute_task, symbol, index_name, last_date, daily_prices, ratios[symbol])
+            except Exception:
+                pending.release()
+                raise
+            compute.add_done_callback(lambda f, symbol=symbol, last_date=last_date: queue_result(symbol, last_date, f))
 
-                if close.empty or high.empty or low.empty or volume.empty:
-                    print(f"Not enough valid data for {symbol} to calculate indicators.")
+    try:
+        with ProcessPoolExecutor(max_workers=COMPUTE_WORKERS, mp_context=COMPUTE_CONTEXT,
+                                 initializer=_init_compute_worker, initargs=(columns, STREAMING_STATE)) as compute_pool, \
+                ThreadPoolExecutor(max_workers=FETCH_WORKERS) as fetch_pool:
+            print(f"Fetching data for {len(symbols)} symbols...")
+            fetches = {fetch_pool.submit(_fetch_task, symbol, start_dates[symbol], end_date, universe): (symbol, sector, index_name)
+                       for symbol, sector, index_name in symbols}
+            batch = []
+            for future in as_completed(fetches):
+                symbol, sector, index_name = fetches[future]
+                try:
+                    daily_prices = future.result()
+                except Exception as e:
+                    print(f"Failed to fetch data for {symbol}: {e}")
                     continue
-
-            roc = talib.ROC(close, timeperiod = 10)
-            rsi = talib.RSI(close, timeperiod=14)
-            macd, macd_signal, macd_hist = talib.MACD(close, fastperiod=12, slowperiod=26, signalperiod=9)
-            ad = talib.AD(high, low, close, volume)
-            adosc = talib.ADOSC(high, low, close, volume, fastperiod=3, slowperiod=10)
-            adx = talib.ADX(high, low, close, timeperiod=14)
-            adxr = talib.ADXR(high, low, close, timeperiod=14)
-            apo = talib.APO(close, fastperiod=12, slowperiod=26, matype=0)
-            aroon_up, aroon_down = talib.AROON(high, low, timeperiod=14)
-            aroonosc = talib.AROONOSC(high, low, timeperiod=14)
-            atr = talib.ATR(high, low, close, timeperiod=14)
-            avgprice = talib.AVGPRICE(open_price, high, low, close)
-            bbands_upper, bbands_middle, bbands_lower = talib.BBANDS(close, timeperiod=20, nbdevup=2, nbdevdn=2, matype=0)
-            bop = talib.BOP(open_price, high, low, close)
-            cci = talib.CCI(high, low, close, timeperiod=14)
-            min_max = talib.MINMAX(close, timeperiod=30)
-            cmo = talib.CMO(close, timeperiod=14)
-            correl = talib.CORREL(high, low, timeperiod=30)
-            dema = talib.DEMA(close, timeperiod=30)
-            dx = talib.DX(high, low, close, timeperiod=14)
-            ema = talib.EMA(close, timeperiod=13)
-            ema_10 = talib.EMA(close, timeperiod=10)
-            ema_20 = talib.EMA(close, timeperiod=20)
-            ema_50 = talib.EMA(close, timeperiod=50)
-            ema_100 = talib.EMA(close, timeperiod=100)
-            ema_150 = talib.EMA(close, timeperiod=150)
-            ema_200 = talib.EMA(close, timeperiod=200)
-            kama = talib.KAMA(close, timeperiod=30)
-            ma = talib.MA(close, timeperiod=30, matype=0)
-            mom = talib.MOM(close, timeperiod=10)
-            willr = talib.WILLR(high, low, close, timeperiod=14)
-            sar = talib.SAR(high, low, acceleration=0.02, maximum=0.2)
-            ultosc = talib.ULTOSC(high, low, close, timeperiod1=7, timeperiod2=14, timeperiod3=28)
-            tsf = talib.TSF(close, timeperiod=14)
-            natr = talib.NATR(high, low, close, timeperiod=14)
-            obv = talib.OBV(close, volume)
-            tenkan_sen = (talib.MAX(high, 9) + talib.MIN(low, 9)) / 2
-            kijun_sen = (talib.MAX(high, 26) + talib.MIN(low, 26)) / 2
-            senkou_span_a = (tenkan_sen + kijun_sen) / 2
-            senkou_span_b = (talib.MAX(high, 52) + talib.MIN(low, 52)) / 2
-            chikou_span = close.shift(-26)
-            stdev = talib.STDDEV(close, timeperiod=5)
-            sma_10 = talib.SMA(close, timeperiod=10)
-            sma_20 = talib.SMA(close, timeperiod=20)
-            sma_50 = talib.SMA(close, timeperiod=50)
-            sma_100 = talib.SMA(close, timeperiod=100)
-            sma_150 = talib.SMA(close, timeperiod=150)                
-            sma_200 = talib.SMA(close, timeperiod=200)
-            roc_sma_50 = talib.ROC(sma_50, timeperiod=1)
-            roc_sma_200 = talib.ROC(sma_200, timeperiod=1)
-            mfi = talib.MFI(high, low, close, volume, timeperiod=14)
-            typical_price = (high + low + close) / 3
-            vwap = np.cumsum(volume * typical_price) / np.cumsum(volume)
-            prev_close = close.shift(1)
-            sma_volume_10 = talib.SMA(volume, timeperiod=10)
-            bbands_upper, bbands_middle, bbands_lower = talib.BBANDS(close, timeperiod=20, nbdevup=2, nbdevdn=2, matype=0)
-            bbands_percent_b = (close - bbands_lower) / (bbands_upper - bbands_lower)
-            macd_prev = macd.shift(1)
-            macd_hist_prev = macd_hist.shift(1)
-            macd_signal_prev = macd_signal.shift(1)
-
-            # Calculate the percentage difference between the close price and the 50-day and 200-day SMA
-            pct_diff_50d_sma = (close - sma_50) / sma_50 * 100
-            pct_diff_200d_sma = (close - sma_200) / sma_200 * 100
-
-            relative_close_spy = close / spy_close.reindex(close.index)
-            relative_open_spy = open_price / spy_open.reindex(open_price.index)
-            relative_high_spy = high / spy_high.reindex(high.index)
-            relative_low_spy = low / spy_low.reindex(low.index)
-            relative_volume_spy = volume / spy_volume.reindex(volume.index)
-
-            relative_price_rsi = talib.RSI(relative_close_spy, timeperiod=14)
-            relative_price_macd, relative_price_macd_signal, relative_price_macd_hist = talib.MACD(relative_close_spy, fastperiod=12, slowperiod=26, signalperiod=9)
-            relative_price_roc = talib.ROC(relative_close_spy, timeperiod=10)
-            relative_price_ad = talib.AD(relative_high_spy, relative_low_spy, relative_close_spy, relative_volume_spy)
-            relative_price_adosc = talib.ADOSC(relative_high_spy, relative_low_spy, relative_close_spy, relative_volume_spy, fastperiod=3, slowperiod=10)
-            relative_price_adx = talib.ADX(relative_high_spy, relative_low_spy, relative_close_spy, timeperiod=14)
-            relative_price_adxr = talib.ADXR(relative_high_spy, relative_low_spy, relative_close_spy, timeperiod=14)
-            relative_price_apo = talib.APO(relative_close_spy, fastperiod=12, slowperiod=26, matype=0)
-            relative_price_aroon_up, relative_price_aroon_down = talib.AROON(relative_high_spy, relative_low_spy, timeperiod=14)
-            relative_price_aroonosc = talib.AROONOSC(relative_high_spy, relative_low_spy, timeperiod=14)
-            relative_price_atr = talib.ATR(relative_high_spy, relative_low_spy, relative_close_spy, timeperiod=14)
-            relative_price_avgprice = talib.AVGPRICE(relative_open_spy, relative_high_spy, relative_low_spy, relative_close_spy)
-            relative_price_bbands_upper, relative_price_bbands_middle, relative_price_bbands_lower = talib.BBANDS(relative_close_spy, timeperiod=5, nbdevup=2, nbdevdn=2, matype=0)
-            relative_price_bop = talib.BOP(relative_open_spy, relative_high_spy, relative_low_spy, relative_close_spy)
-            relative_price_cci = talib.CCI(relative_high_spy, relative_low_spy, relative_close_spy, timeperiod=14)
-            relative_price_min = relative_close_spy.rolling(window=14).min()
-            relative_price_max = relative_close_spy.rolling(window=14).max()
-            relative_price_cmo = talib.CMO(relative_close_spy, timeperiod=14)
-            relative_price_correl = talib.CORREL(relative_high_spy, relative_close_spy, timeperiod=30)
-            relative_price_dema = talib.DEMA(relative_close_spy, timeperiod=30)
-            relative_price_dx = talib.DX(relative_high_spy, relative_low_spy, relative_close_spy, timeperiod=14)
-            relative_price_sma_10 = talib.SMA(relative_close_spy, timeperiod=10)
-            relative_price_sma_20 = talib.SMA(relative_close_spy, timeperiod=20)
-            relative_price_sma_50 = talib.SMA(relative_close_spy, timeperiod=50)
-            relative_price_sma_100 = talib.SMA(relative_close_spy, timeperiod=100)
-            relative_price_sma_150 = talib.SMA(relative_close_spy, timeperiod=150)
-            relative_price_sma_200 = talib.SMA(relative_close_spy, timeperiod=200)
-            relative_price_ema = talib.EMA(relative_close_spy, timeperiod=30)
-            relative_price_ema_10 = talib.EMA(relative_close_spy, timeperiod=10)
-            relative_price_ema_20 = talib.EMA(relative_close_spy, timeperiod=20)
-            relative_price_ema_50 = talib.EMA(relative_close_spy, timeperiod=50)
-            relative_price_ema_100 = talib.EMA(relative_close_spy, timeperiod=100)
-            relative_price_ema_150 = talib.EMA(relative_close_spy, timeperiod=150)
-            relative_price_ema_200 = talib.EMA(relative_close_spy, timeperiod=200)
-            relative_price_kama = talib.KAMA(relative_close_spy, timeperiod=30)
-            relative_price_ma = talib.MA(relative_close_spy, timeperiod=30)
-            relative_price_mom = talib.MOM(relative_close_spy, timeperiod=10)
-            relative_price_willr = talib.WILLR(relative_high_spy, relative_low_spy, relative_close_spy, timeperiod=14)
-            relative_price_sar = talib.SAR(relative_high_spy, relative_low_spy, acceleration=0.02, maximum=0.2)
-            relative_price_ultosc = talib.ULTOSC(relative_high_spy, relative_low_spy, relative_close_spy, timeperiod1=7, timeperiod2=14, timeperiod3=28)
-            relative_price_tsf = talib.TSF(relative_close_spy, timeperiod=14)
-            relative_price_natr = talib.NATR(relative_high_spy, relative_low_spy, relative_close_spy, timeperiod=14)
-            relative_price_obv = talib.OBV(relative_close_spy, relative_volume_spy)
-            relative_price_mfi = talib.MFI(relative_high_spy, relative_low_spy, relative_close_spy, relative_volume_spy, timeperiod=14)
-            relative_price_tenkan_sen = (talib.MAX(relative_close_spy, 9) + talib.MIN(relative_close_spy, 9)) / 2
-            relative_price_kijun_sen = (talib.MAX(relative_close_spy, 26) + talib.MIN(relative_close_spy, 26)) / 2
-            relative_price_senkou_span_a = (relative_price_tenkan_sen + relative_price_kijun_sen) / 2
-            relative_price_senkou_span_b = (talib.MAX(relative_close_spy, 52) + talib.MIN(relative_close_spy, 52)) / 2
-            relative_price_chikou_span = relative_close_spy.shift(-26)
-            relative_price_stdev = talib.STDDEV(relative_close_spy, timeperiod=10)
-
-            etf_close = etf_data[sector1]['close']
-            relative_sector_close = close / etf_close.reindex(close.index)
-            etf_open = etf_data[sector1]['open']
-            relative_sector_open = open_price / etf_open.reindex(open_price.index)
-            etf_high = etf_data[sector1]['high']
-            relative_sector_high = high / etf_high.reindex(high.index)
-            etf_low = etf_data[sector1]['low']
-            relative_sector_low = low / etf_low.reindex(low.index)
-            etf_volume = etf_data[sector1]['volume']
-            relative_sector_volume = volume / etf_volume.reindex(volume.index)
-
-            relative_sector_rsi = talib.RSI(relative_sector_close, timeperiod=14)
-            relative_sector_macd, relative_sector_macd_signal, relative_sector_macd_hist = talib.MACD(relative_sector_close, fastperiod=12, slowperiod=26, signalperiod=9)
-            relative_sector_roc = talib.ROC(relative_sector_close, timeperiod=10)
-            relative_sector_ad = talib.AD(relative_sector_high, relative_sector_low, relative_sector_close, relative_sector_volume)
-            relative_sector_adosc = talib.ADOSC(relative_sector_high, relative_sector_low, relative_sector_close, relative_sector_volume, fastperiod=3, slowperiod=10)
-            relative_sector_adx = talib.ADX(relative_sector_high, relative_sector_low, relative_sector_close, timeperiod=14)
-            relative_sector_adxr = talib.ADXR(relative_sector_high, relative_sector_low, relative_sector_close, timeperiod=14)
-            relative_sector_apo = talib.APO(relative_sector_close, fastperiod=12, slowperiod=26, matype=0)
-            relative_sector_aroon_up, relative_sector_aroon_down = talib.AROON(relative_sector_high, relative_sector_low, timeperiod=14)
-            relative_sector_aroonosc = talib.AROONOSC(relative_sector_high, relative_sector_low, timeperiod=14)
-            relative_sector_atr = talib.ATR(relative_sector_high, relative_sector_low, relative_sector_close, timeperiod=14)
-            relative_sector_avgprice = talib.AVGPRICE(relative_sector_open, relative_sector_high, relative_sector_low, relative_sector_close)
-            relative_sector_bbands_upper, relative_sector_bbands_middle, relative_sector_bbands_lower = talib.BBANDS(relative_sector_close, timeperiod=5, nbdevup=2, nbdevdn=2, matype=0)
-            relative_sector_bop = talib.BOP(relative_sector_open, relative_sector_high, relative_sector_low, relative_sector_close)
-            relative_sector_cci = talib.CCI(relative_sector_high, relative_sector_low, relative_sector_close, timeperiod=14)
-            relative_sector_min = relative_sector_close.rolling(window=14).min()
-            relative_sector_max = relative_sector_close.rolling(window=14).max()
-            relative_sector_cmo = talib.CMO(relative_sector_close, timeperiod=14)
-            relative_sector_correl = talib.CORREL(relative_sector_high, relative_sector_close, timeperiod=30)
-            relative_sector_dema = talib.DEMA(relative_sector_close, timeperiod=30)
-            relative_sector_dx = talib.DX(relative_sector_high, relative_sector_low, relative_sector_close, timeperiod=14)
-            relative_sector_sma_10 = talib.SMA(relative_sector_close, timeperiod=10)
-            relative_sector_sma_20 = talib.SMA(relative_sector_close, timeperiod=20)
-            relative_sector_sma_50 = talib.SMA(relative_sector_close, timeperiod=50)
-            relative_sector_sma_100 = talib.SMA(relative_sector_close, timeperiod=100)
-            relative_sector_sma_150 = talib.SMA(relative_sector_close, timeperiod=150)
-            relative_sector_sma_200 = talib.SMA(relative_sector_close, timeperiod=200)
-            relative_sector_ema = talib.EMA(relative_sector_close, timeperiod=30)
-            relative_sector_ema_10 = talib.EMA(relative_sector_close, timeperiod=10)
-            relative_sector_ema_20 = talib.EMA(relative_sector_close, timeperiod=20)
-            relative_sector_ema_50 = talib.EMA(relative_sector_close, timeperiod=50)
-            relative_sector_ema_100 = talib.EMA(relative_sector_close, timeperiod=100)
-            relative_sector_ema_150 = talib.EMA(relative_sector_close, timeperiod=150)
-            relative_sector_ema_200 = talib.EMA(relative_sector_close, timeperiod=200)
-            relative_sector_kama = talib.KAMA(relative_sector_close, timeperiod=30)
-            relative_sector_ma = talib.MA(relative_sector_close, timeperiod=30)
-            relative_sector_mom = talib.MOM(relative_sector_close, timeperiod=10)
-            relative_sector_willr = talib.WILLR(relative_sector_high, relative_sector_low, relative_sector_close, timeperiod=14)
-            relative_sector_sar = talib.SAR(relative_sector_high, relative_sector_low, acceleration=0.02, maximum=0.2)
-            relative_sector_ultosc = talib.ULTOSC(relative_sector_high, relative_sector_low, relative_sector_close, timeperiod1=7, timeperiod2=14, timeperiod3=28)
-            relative_sector_tsf = talib.TSF(relative_sector_close, timeperiod=14)
-            relative_sector_natr = talib.NATR(relative_sector_high, relative_sector_low, relative_sector_close, timeperiod=14)
-            relative_sector_obv = talib.OBV(relative_sector_close, relative_sector_volume)
-            relative_sector_mfi = talib.MFI(relative_sector_high, relative_sector_low, relative_sector_close, relative_sector_volume, timeperiod=14)
-            relative_sector_tenkan_sen = (talib.MAX(relative_sector_close, 9) + talib.MIN(relative_sector_close, 9)) / 2
-            relative_sector_kijun_sen = (talib.MAX(relative_sector_close, 26) + talib.MIN(relative_sector_close, 26)) / 2
-            relative_sector_senkou_span_a = (relative_sector_tenkan_sen + relative_sector_kijun_sen) / 2
-            relative_sector_senkou_span_b = (talib.MAX(relative_sector_close, 52) + talib.MIN(relative_sector_close, 52)) / 2
-            relative_sector_chikou_span = relative_sector_close.shift(-26)
-            relative_sector_stdev = talib.STDDEV(relative_sector_close, timeperiod=10)
-
-
-            # Combine all series into a DataFrame
-            indicators = pd.DataFrame({
-                'symbol': symbol,
-                'index_name': index_name,
-                'date': close.index,
-                'open_price': open_price,
-                'high': high,
-                'low': low,
-                'close': close,
-                'volume': volume,
-                'sma_volume_10': sma_volume_10,
-                'roc': roc,
-                'rsi': rsi,
-                'macd': macd,
-                'macd_signal':macd_signal,
-                'macd_hist':macd_hist,
-                'ad': ad,
-                'adosc': adosc,
-                'adx': adx,
-                'adxr': adxr,
-                'apo': apo,
-                'aroon_up': aroon_up,
-                'aroon_down': aroon_down,
-                'aroonosc': aroonosc,
-                'atr': atr,
-                'avgprice': avgprice,
-                'bbands_upper': bbands_upper,
-                'bbands_middle': bbands_middle,
-                'bbands_lower': bbands_lower,
-                'bop': bop,
-                'cci': cci,
-                'min': min_max[0],
-                'max': min_max[1],
-                'cmo': cmo,
-                'correl': correl,
-                'dema': dema,
-                'dx': dx,
-                'ema': ema,
-                'ema_10': ema_10,
-                'ema_20': ema_20,                        
-                'ema_50': ema_50,  
-                'ema_100': ema_100,  
-                'ema_150': ema_150,  
-                'ema_200': ema_200,  
-                'kama': kama,
-                'ma': ma,
-                'mom': mom,
-                'willr': willr,
-                'sar': sar,
-                'ultosc': ultosc,
-                'tsf': tsf,
-                'natr': natr,
-                'obv': obv,
-                'tenkan_sen': tenkan_sen,
-                'kijun_sen': kijun_sen,
-                'senkou_span_a': senkou_span_a,
-                'senkou_span_b': senkou_span_b,
-                'chikou_span': chikou_span,
-                'stdev': stdev,
-                'sma_10': sma_10,
-                'sma_20': sma_20,
-                'sma_50': sma_50,
-                'sma_100': sma_100,
-                'sma_150': sma_150,
-                'sma_200': sma_200,
-                'roc_sma_50': roc_sma_50,
-                'roc_sma_200': roc_sma_200,
-                'mfi': mfi,
-                'vwap':vwap,
-                'bbands_percent_b': bbands_percent_b,
-                'macd_prev': macd_prev,
-                'macd_hist_prev': macd_hist_prev,
-                'macd_signal_prev': macd_signal_prev,
-                'prev_close': prev_close,
-                'pct_diff_50d_sma': pct_diff_50d_sma,
-                'pct_diff_200d_sma': pct_diff_200d_sma,
-                'relative_close_spy' : relative_close_spy,
-                'relative_price_rsi': relative_price_rsi,
-                'relative_price_macd': relative_price_macd,
-                'relative_price_macd_signal': relative_price_macd_signal,
-                'relative_price_macd_hist': relative_price_macd_hist,
-                'relative_price_roc': relative_price_roc,
-                'relative_price_ad': relative_price_ad,
-                'relative_price_adosc': relative_price_adosc,
-                'relative_price_adx': relative_price_adx,
-                'relative_price_adxr': relative_price_adxr,
-                'relative_price_apo': relative_price_apo,
-                'relative_price_aroon_up': relative_price_aroon_up,
-                'relative_price_aroon_down': relative_price_aroon_down,
-                'relative_price_aroonosc': relative_price_aroonosc,
-                'relative_price_atr': relative_price_atr,
-                'relative_price_avgprice': relative_price_avgprice,
-                'relative_price_bbands_upper': relative_price_bbands_upper,
-                'relative_price_bbands_middle': relative_price_bbands_middle,
-                'relative_price_bbands_lower': relative_price_bbands_lower,
-                'relative_price_bop': relative_price_bop,
-                'relative_price_cci': relative_price_cci,
-                'relative_price_min': relative_price_min,
-                'relative_price_max': relative_price_max,
-                'relative_price_cmo': relative_price_cmo,
-                'relative_price_correl': relative_price_correl,
-                'relative_price_dema': relative_price_dema,
-                'relative_price_dx': relative_price_dx,
-                'relative_price_ema': relative_price_ema,
-                'relative_price_sma_10': relative_price_sma_10,
-                'relative_price_sma_20': relative_price_sma_20,
-                'relative_price_sma_50': relative_price_sma_50,
-                'relative_price_sma_100': relative_price_sma_100,
-                'relative_price_sma_150': relative_price_sma_150,
-                'relative_price_sma_200': relative_price_sma_200,
-                'relative_price_ema_10': relative_price_ema_10,
-                'relative_price_ema_20': relative_price_ema_20,                        
-                'relative_price_ema_50': relative_price_ema_50,  
-                'relative_price_ema_100': relative_price_ema_100,  
-                'relative_price_ema_150': relative_price_ema_150,  
-                'relative_price_ema_200': relative_price_ema_200,  
-                'relative_price_kama': relative_price_kama,
-                'relative_price_ma': relative_price_ma,
-                'relative_price_mom': relative_price_mom,
-                'relative_price_willr': relative_price_willr,
-                'relative_price_sar': relative_price_sar,
-                'relative_price_ultosc': relative_price_ultosc,
-                'relative_price_tsf': relative_price_tsf,
-                'relative_price_natr': relative_price_natr,
-                'relative_price_obv': relative_price_obv,
-                'relative_price_mfi': relative_price_mfi,
-                'relative_price_tenkan_sen': relative_price_tenkan_sen,
-                'relative_price_kijun_sen': relative_price_kijun_sen,
-                'relative_price_senkou_span_a': relative_price_senkou_span_a,
-                'relative_price_senkou_span_b': relative_price_senkou_span_b,
-                'relative_price_chikou_span': relative_price_chikou_span,
-                'relative_price_stdev': relative_price_stdev,
-                'relative_sector_close': relative_sector_close,
-                'relative_sector_open': relative_sector_open,
-                'relative_sector_high': relative_sector_high,
-                'relative_sector_low': relative_sector_low,
-                'relative_sector_volume': relative_sector_volume,
-                'relative_sector_rsi': relative_sector_rsi,
-                'relative_sector_macd': relative_sector_macd,
-                'relative_sector_macd_signal': relative_sector_macd_signal,
-                'relative_sector_macd_hist': relative_sector_macd_hist,
-                'relative_sector_roc': relative_sector_roc,
-                'relative_sector_ad': relative_sector_ad,
-                'relative_sector_adosc': relative_sector_adosc,
-                'relative_sector_adx': relative_sector_adx,
-                'relative_sector_adxr': relative_sector_adxr,
-                'relative_sector_apo': relative_sector_apo,
-                'relative_sector_aroon_up': relative_sector_aroon_up,
-                'relative_sector_aroon_down': relative_sector_aroon_down,
-                'relative_sector_aroonosc': relative_sector_aroonosc,
-                'relative_sector_atr': relative_sector_atr,
-                'relative_sector_avgprice': relative_sector_avgprice,
-                'relative_sector_bbands_upper': relative_sector_bbands_upper,
-                'relative_sector_bbands_middle': relative_sector_bbands_middle,
-                'relative_sector_bbands_lower': relative_sector_bbands_lower,
-                'relative_sector_bop': relative_sector_bop,
-                'relative_sector_cci': relative_sector_cci,
-                'relative_sector_min': relative_sector_min,
-                'relative_sector_max': relative_sector_max,
-                'relative_sector_cmo': relative_sector_cmo,
-                'relative_sector_correl': relative_sector_correl,
-                'relative_sector_dema': relative_sector_dema,
-                'relative_sector_dx': relative_sector_dx,
-                'relative_sector_sma_10': relative_sector_sma_10,
-                'relative_sector_sma_20': relative_sector_sma_20,
-                'relative_sector_sma_50': relative_sector_sma_50,
-                'relative_sector_sma_100': relative_sector_sma_100,
-                'relative_sector_sma_150': relative_sector_sma_150,
-                'relative_sector_sma_200': relative_sector_sma_200,
-                'relative_sector_ema': relative_sector_ema,
-                'relative_sector_ema_10': relative_sector_ema_10,
-                'relative_sector_ema_20': relative_sector_ema_20,
-                'relative_sector_ema_50': relative_sector_ema_50,
-                'relative_sector_ema_100': relative_sector_ema_100,
-                'relative_sector_ema_150': relative_sector_ema_150,
-                'relative_sector_ema_200': relative_sector_ema_200,
-                'relative_sector_kama': relative_sector_kama,
-                'relative_sector_ma': relative_sector_ma,
-                'relative_sector_mom': relative_sector_mom,
-                'relative_sector_willr': relative_sector_willr,
-                'relative_sector_sar': relative_sector_sar,
-                'relative_sector_ultosc': relative_sector_ultosc,
-                'relative_sector_tsf': relative_sector_tsf,
-                'relative_sector_natr': relative_sector_natr,
-                'relative_sector_obv': relative_sector_obv,
-                'relative_sector_mfi': relative_sector_mfi,
-                'relative_sector_tenkan_sen': relative_sector_tenkan_sen,
-                'relative_sector_kijun_sen': relative_sector_kijun_sen,
-                'relative_sector_senkou_span_a': relative_sector_senkou_span_a,
-                'relative_sector_senkou_span_b': relative_sector_senkou_span_b,
-                'relative_sector_chikou_span': relative_sector_chikou_span,
-                'relative_sector_stdev': relative_sector_stdev
-            })
-
-            # Drop rows with any missing values
-            indicators = indicators.replace({np.nan: None})
-
-            # Insert each row into the 'ta' table in the database
-            for i, row in indicators.iterrows():
-                row = row.to_dict()  # Convert the row to a dictionary
-                cursor.execute("""
-                    INSERT INTO technical_data (
-                        symbol, index_name, date, open_price, high, low, close, volume, sma_volume_10, roc, rsi, macd, macd_signal, macd_hist, ad, adosc, adx, adxr, apo, aroon_up,
-                        aroon_down, aroonosc, atr, avgprice, bbands_upper, bbands_middle, bbands_lower, bop, cci, min, max, cmo, correl,
-                        dema, dx, ema, ema_10, ema_20, ema_50, ema_100, ema_150, ema_200, kama, ma, mom, willr, sar, ultosc, tsf, natr, obv, tenkan_sen, kijun_sen, senkou_span_a, senkou_span_b, chikou_span, stdev, 
-                        sma_10, sma_20, sma_50, sma_100, sma_150, sma_200, roc_sma_50, roc_sma_200, mfi, vwap, bbands_percent_b, prev_close, macd_prev, macd_hist_prev, macd_signal_prev, pct_diff_50d_sma, pct_diff_200d_sma, 
-                        relative_close_spy, relative_price_rsi, relative_price_macd, relative_price_macd_signal, 
-                        relative_price_macd_hist, relative_price_roc, relative_price_ad, relative_price_adosc, relative_price_adx, relative_price_adxr, relative_price_apo, relative_price_aroon_up, relative_price_aroon_down, relative_price_aroonosc, 
-                        relative_price_atr, relative_price_avgprice, relative_price_bbands_upper, relative_price_bbands_middle, relative_price_bbands_lower, relative_price_bop, relative_price_cci, 
-                        relative_price_min, relative_price_max, relative_price_cmo, relative_price_correl, relative_price_dema, relative_price_dx, relative_price_ema,     relative_price_sma_10,
-                        relative_price_sma_20, relative_price_sma_50, relative_price_sma_100, relative_price_sma_150, relative_price_sma_200, 
-                        relative_price_ema_10, relative_price_ema_20, relative_price_ema_50, relative_price_ema_100, relative_price_ema_150, relative_price_ema_200,  
-                        relative_price_kama, relative_price_ma, relative_price_mom, relative_price_willr, relative_price_sar, relative_price_ultosc, relative_price_tsf, relative_price_natr, relative_price_obv, 
-                        relative_price_mfi, relative_price_tenkan_sen, relative_price_kijun_sen, relative_price_senkou_span_a, relative_price_senkou_span_b, relative_price_chikou_span, relative_price_stdev, 
-                        relative_sector_close, relative_sector_open, relative_sector_high, relative_sector_low, relative_sector_volume, 
-                        relative_sector_rsi, relative_sector_macd, relative_sector_macd_signal, relative_sector_macd_hist, relative_sector_roc, relative_sector_ad,
-                        relative_sector_adosc, relative_sector_adx, relative_sector_adxr, relative_sector_apo, relative_sector_aroon_up, relative_sector_aroon_down, relative_sector_aroonosc, relative_sector_atr,
-                        relative_sector_avgprice, relative_sector_bbands_upper, relative_sector_bbands_middle, relative_sector_bbands_lower, relative_sector_bop,
-                        relative_sector_cci, relative_sector_min, relative_sector_max, relative_sector_cmo, relative_sector_correl, relative_sector_dema, relative_sector_dx, relative_sector_sma_10, relative_sector_sma_20,
-                        relative_sector_sma_50, relative_sector_sma_100, relative_sector_sma_150, relative_sector_sma_200,
-                        relative_sector_ema, relative_sector_ema_10, relative_sector_ema_20, relative_sector_ema_50, relative_sector_ema_100, relative_sector_ema_150, relative_sector_ema_200, relative_sector_kama, relative_sector_ma,
-                        relative_sector_mom, relative_sector_willr, relative_sector_sar, relative_sector_ultosc, relative_sector_tsf, relative_sector_natr, relative_sector_obv, 
-                        relative_sector_mfi, relative_sector_tenkan_sen, relative_sector_kijun_sen, relative_sector_senkou_span_a, relative_sector_senkou_span_b, relative_sector_chikou_span, relative_sector_stdev, last_updated
-                    ) VALUES (
-                        %(symbol)s, %(index_name)s, %(date)s, %(open_price)s, %(high)s, %(low)s, %(close)s, %(volume)s, %(sma_volume_10)s, %(roc)s, %(rsi)s, %(macd)s, %(macd_signal)s, %(macd_hist)s, %(ad)s,
-                        %(adosc)s, %(adx)s, %(adxr)s, %(apo)s, %(aroon_up)s, %(aroon_down)s, %(aroonosc)s, %(atr)s, %(avgprice)s,
-                        %(bbands_upper)s, %(bbands_middle)s, %(bbands_lower)s, %(bop)s, %(cci)s, %(min)s, %(max)s, %(cmo)s, %(correl)s,
-                        %(dema)s, %(dx)s, %(ema)s, %(ema_10)s, %(ema_20)s, %(ema_50)s, %(ema_100)s, %(ema_150)s,  %(ema_200)s, %(kama)s, %(ma)s, %(mom)s, %(willr)s, %(sar)s,  %(ultosc)s, %(tsf)s, %(natr)s, %(obv)s, %(tenkan_sen)s, %(kijun_sen)s,
-                        %(senkou_span_a)s, %(senkou_span_b)s, %(chikou_span)s, %(stdev)s, %(sma_10)s, %(sma_20)s, %(sma_50)s, %(sma_100)s, %(sma_150)s, 
-                        %(sma_200)s, %(roc_sma_50)s, %(roc_sma_200)s, %(mfi)s, %(vwap)s, %(bbands_percent_b)s, %(prev_close)s, %(macd_prev)s, %(macd_hist_prev)s,%(macd_signal_prev)s, %(pct_diff_50d_sma)s, %(pct_diff_200d_sma)s, 
-                        %(relative_close_spy)s, %(relative_price_rsi)s, %(relative_price_macd)s, %(relative_price_macd_signal)s, 
-                        %(relative_price_macd_hist)s, %(relative_price_roc)s,  %(relative_price_ad)s,  %(relative_price_adosc)s,  %(relative_price_adx)s,  %(relative_price_adxr)s,  %(relative_price_apo)s,  %(relative_price_aroon_up)s, %(relative_price_aroon_down)s,  
-                        %(relative_price_aroonosc)s, %(relative_price_atr)s, %(relative_price_avgprice)s, %(relative_price_bbands_upper)s, %(relative_price_bbands_middle)s, %(relative_price_bbands_lower)s, %(relative_price_bop)s, 
-                        %(relative_price_cci)s, %(relative_price_min)s, %(relative_price_max)s, %(relative_price_cmo)s, %(relative_price_correl)s, %(relative_price_dema)s, %(relative_price_dx)s, %(relative_price_ema)s, 
-                        %(relative_price_sma_10)s, %(relative_price_sma_20)s, %(relative_price_sma_50)s, %(relative_price_sma_100)s, %(relative_price_sma_150)s, %(relative_price_sma_200)s, 
-                        %(relative_price_ema_10)s, %(relative_price_ema_20)s, %(relative_price_ema_50)s, %(relative_price_ema_100)s, %(relative_price_ema_150)s, %(relative_price_ema_200)s, 
-                        %(relative_price_kama)s, %(relative_price_ma)s, %(relative_price_mom)s, %(relative_price_willr)s, %(relative_price_sar)s, %(relative_price_ultosc)s, %(relative_price_tsf)s, %(relative_price_natr)s, %(relative_price_obv)s,
-                        %(relative_price_mfi)s, %(relative_price_tenkan_sen)s, %(relative_price_kijun_sen)s, %(relative_price_senkou_span_a)s, %(relative_price_senkou_span_b)s, %(relative_price_chikou_span)s, %(relative_price_stdev)s, 
-                        %(relative_sector_close)s, %(relative_sector_open)s, %(relative_sector_high)s, %(relative_sector_low)s, %(relative_sector_volume)s, 
-                        %(relative_sector_rsi)s,%(relative_sector_macd)s,%(relative_sector_macd_signal)s, %(relative_sector_macd_hist)s, %(relative_sector_roc)s,
-                        %(relative_sector_ad)s, %(relative_sector_adosc)s, %(relative_sector_adx)s, %(relative_sector_adxr)s,
-                        %(relative_sector_apo)s, %(relative_sector_aroon_up)s, %(relative_sector_aroon_down)s, %(relative_sector_aroonosc)s, %(relative_sector_atr)s, %(relative_sector_avgprice)s, %(relative_sector_bbands_upper)s, 
-                        %(relative_sector_bbands_middle)s, %(relative_sector_bbands_lower)s, %(relative_sector_bop)s, %(relative_sector_cci)s, %(relative_sector_min)s, %(relative_sector_max)s,
-                        %(relative_sector_cmo)s, %(relative_sector_correl)s, %(relative_sector_dema)s, %(relative_sector_dx)s, %(relative_sector_sma_10)s, %(relative_sector_sma_20)s, %(relative_sector_sma_50)s,
-                        %(relative_sector_sma_100)s, %(relative_sector_sma_150)s, %(relative_sector_sma_200)s, %(relative_sector_ema)s, %(relative_sector_ema_10)s, %(relative_sector_ema_20)s, %(relative_sector_ema_50)s,
-                        %(relative_sector_ema_100)s, %(relative_sector_ema_150)s, %(relative_sector_ema_200)s, %(relative_sector_kama)s, %(relative_sector_ma)s, %(relative_sector_mom)s, %(relative_sector_willr)s, %(relative_sector_sar)s, %(relative_sector_ultosc)s, %(relative_sector_tsf)s, %(relative_sector_natr)s, %(relative_sector_obv)s, %(relative_sector_mfi)s,
-                        %(relative_sector_tenkan_sen)s, %(relative_sector_kijun_sen)s, %(relative_sector_senkou_span_a)s, %(relative_sector_senkou_span_b)s, %(relative_sector_chikou_span)s, %(relative_sector_stdev)s, NOW()
-                    )
-                """, row)
-                conn.commit()
-
-            time.sleep(0.2)  # Sleep to avoid rate limiting
-
-    except Exception as e:
-        print(f"Failed to fetch data for {symbol}: {e}")
-
-cursor.close()
-conn.close()
-
+                if daily_prices is not None:
+                    batch.append((symbol, index_name, daily_prices))
+                if len(batch) >= RATIO_BATCH_SIZE:
+                    compute_batch(compute_pool, batch)
+                    batch = []
+            compute_batch(compute_pool, batch)
+    finally:
+        write_queue.put(None)
+        writer.join()
+        write_conn.close()
+
+
+def main():
+    # Connect to the MySQL database
+    conn = dbpool.connect(MYSQL_CONFIG)
+    cursor = conn.cursor(buffered=True)
+
+    # Get all unique stock symbols along with their sector and industry
+    cursor.execute("SELECT DISTINCT symbol, sector, index_name FROM stock_symbols")
+    symbols_with_sector_and_industry = cursor.fetchall()
+
+    create_technical_data_table(cursor, conn)
+
+    # Latest stored bar per symbol; symbols missing here get the full history
+    latest_dates = {}
+    if INCREMENTAL:
+        cursor.execute("SELECT symbol, MAX(date) FROM technical_data GROUP BY symbol")
+        latest_dates = dict(cursor.fetchall())
+
+    end_date = datetime.now()
+    columns = profile_columns()
+    # Symbols whose streaming states continue from their latest stored date only need WARMUP_BARS
+    start_dates = {symbol: history_start(latest_dates.get(symbol), end_date, streaming_resumable(symbol, latest_dates.get(symbol), columns))
+                   for symbol, _, _ in symbols_with_sector_and_industry}
+    # Benchmarks must cover the earliest history any symbol will request
+    start_date = min(start_dates.values(), default=history_start(None, end_date))
+    benchmarks = load_benchmarks(start_date, end_date)
+    calendar = benchmarks.dates
+
+    # Only symbols with bars newer than their latest stored date need work
+    latest_bar_date = calendar.max().date()
+    stale_symbols = []
+    for symbol, sector, index_name in symbols_with_sector_and_industry:
+        last_date = latest_dates.get(symbol)
+        if last_date is not None and last_date >= latest_bar_date:
+            print(f"{symbol} is already up to date ({last_date}), skipping.")
+            continue
+        stale_symbols.append((symbol, sector, index_name))
+
+    # One panel on the SPY calendar holds every stale symbol's bars in float64
+    universe = pricepanel.PricePanel([symbol for symbol, _, _ in stale_symbols], calendar)
+    print(f"Price panel: {len(universe.symbols)} symbols x {len(calendar)} dates, {universe.nbytes / 1024 ** 2:.1f} MB")
+
+    run_pipeline(stale_symbols, latest_dates, start_dates, end_date, benchmarks, universe, columns)
+
+    # Publish the one-row-per-symbol snapshot the screener reads
+    refresh_latest_snapshot(cursor, conn)
+
+    stats = httpclient.connection_stats()
+    print(f"HTTP requests: {stats['requests']}, connections opened: {stats['connections_opened']}, reused: {stats['connections_reused']}")
+
+    cursor.close()
+    conn.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,185 @@
+import argparse
+import json
+import random
+from collections import deque
+from datetime import timedelta
+from types import SimpleNamespace
+
+import pandas as pd
+
+import lotledger
+
+# Checks the incremental lot ledger against a full replay of the order history, the way
+# loadwashsale.py worked before. An order-history fixture (synthetic, or a JSON file) is revealed
+# in runs: each run sees the orders submitted so far, with the status each had at that moment, and
+# the ledger fetches only what was submitted after its high-water mark, plus its pending orders by
+# id (get_order). The ledger goes through
+# its database row format between runs. Every run must give the same sells, open lots and
+# wash-sale set as replaying everything from scratch. Sells are compared symbol by symbol: lots are
+# consumed per symbol, and a pending order's sell can land after a sell of another symbol submitted
+# at the same instant.
+
+START = pd.Timestamp('2022-01-03 14:30', tz='UTC')
+
+
+def synthetic_fixture(n_orders, n_symbols, seed):
+    """
+    Random orders across n_symbols: fractional buys, sells that sometimes exceed the open lots,
+    canceled and expired orders, fills that arrive hours to days after submission, long-lived
+    orders (GTC limits, trailing stops) that stay open for weeks, identical submission timestamps
+    and nanosecond-precision timestamps.
+    """
+    rng = random.Random(seed)
+    symbols = [f"S{i:02d}" for i in range(n_symbols)]
+    prices = {symbol: rng.uniform(20, 500) for symbol in symbols}
+    held = {symbol: 0.0 for symbol in symbols}
+    orders = []
+    submitted = START
+    for i in range(n_orders):
+        if rng.random() > 0.05:  # otherwise same timestamp as the previous order
+            submitted += pd.Timedelta(seconds=rng.randint(60, 6 * 3600), nanoseconds=rng.randint(0, 999))
+        symbol = rng.choice(symbols)
+        prices[symbol] *= rng.uniform(0.93, 1.07)
+        side = 'sell' if held[symbol] >= 0.01 and rng.random() < 0.45 else 'buy'
+        qty = round(held[symbol] * rng.choice([0.3, 0.5, 1.0, 1.2]), 4) if side == 'sell' else round(rng.uniform(0.2, 30), 4)
+        status = rng.choices(['filled', 'canceled', 'expired', 'rejected'], [85, 8, 5, 2])[0]
+        if status == 'filled':
+            held[symbol] = max(0.0, held[symbol] + (qty if side == 'buy' else -qty))
+        open_minutes = rng.choice([0, 1, 30, 600, 3000])
+        if rng.random() < 0.02:
+            open_minutes = rng.randint(10, 60) * 1440
+        orders.append({
+            'id': f"o{i:05d}", 'symbol': symbol, 'side': side, 'submitted_at': submitted.isoformat(),
+            'created_at': submitted.isoformat(),
+            'resolved_at': (submitted + pd.Timedelta(minutes=open_minutes)).isoformat(),
+            'final_status': status, 'qty': qty, 'price': round(prices[symbol], 2)})
+    return orders
+
+
+def snapshot(fixture, now, after=None):
+    """Orders as list_orders would return them at `now`: submitted after `after`, oldest first, with their status at `now`."""
+    orders = []
+    for order in fixture:
+        submitted = pd.Timestamp(order['submitted_at'])
+        if submitted > now or (after is not None and submitted <= after):
+            continue
+        status = order['final_status'] if pd.Timestamp(order['resolved_at']) <= now else 'accepted'
+        filled = status == 'filled'
+        orders.append(SimpleNamespace(id=order['id'], symbol=order['symbol'], side=order['side'], status=status,
+                                      submitted_at=submitted, created_at=pd.Timestamp(order['created_at']),
+                                      filled_qty=str(order['qty']) if filled else '0',
+                                      filled_avg_price=str(order['price']) if filled else None))
+    return orders
+
+
+def by_id(fixture, now, order_ids):
+    """Orders as get_order would return them at `now`."""
+    return [order for order in snapshot(fixture, now) if order.id in order_ids]
+
+
+def full_replay(orders, now):
+    """The original calculate_fifo_gains loop over the whole history."""
+    buys = {}
+    sells = []
+    thirty_days_ago = now - timedelta(days=30)
+    wash_sale_symbols = set()
+    for order in orders:
+        symbol = order.symbol
+        if order.side == 'buy' and order.status == 'filled' and order.filled_qty:
+            buy_price = float(order.filled_avg_price)
+            buy_qty = float(order.filled_qty)
+            if symbol not in buys:
+                buys[symbol] = deque()
+            buys[symbol].append((buy_price, buy_qty))
+        elif order.side == 'sell' and order.status == 'filled' and order.filled_qty:
+            if symbol in buys and buys[symbol]:
+                sell_price = float(order.filled_avg_price)
+                sell_qty = float(order.filled_qty)
+                cost_basis = 0
+                remaining_qty = sell_qty
+                while remaining_qty > 0 and buys[symbol]:
+                    buy_price, buy_qty = buys[symbol].popleft()
+                    used_qty = min(buy_qty, remaining_qty)
+                    cost_basis += used_qty * buy_price
+                    remaining_qty -= used_qty
+                    if buy_qty > used_qty:
+                        buys[symbol].appendleft((buy_price, buy_qty - used_qty))
+                gain_loss = (sell_price - (cost_basis / sell_qty)) * sell_qty
+                sells.append((str(order.id), symbol, sell_qty, sell_price, cost_basis / sell_qty, gain_loss))
+                if gain_loss < 0 and order.created_at >= thirty_days_ago:
+                    wash_sale_symbols.add(symbol)
+    lots = {symbol: [list(lot) for lot in lots] for symbol, lots in buys.items() if lots}
+    return sells, lots, wash_sale_symbols
+
+
+def through_rows(ledger, stored):
+    """Saves the ledger into `stored` in its database row format and reloads it, the way loadwashsale.py does between runs."""
+    symbols, lot_rows = ledger.changed_lot_rows()
+    for symbol in symbols:
+        stored['lots'] = {key: row for key, row in stored['lots'].items() if key[0] != symbol}
+    stored['lots'].update({(row[0], row[1]): row for row in lot_rows})
+    stored['sells'].update({row[0]: row for row in ledger.unsaved_sell_rows()})
+    stored['state'] = ledger.state_row()
+    ledger.mark_saved()
+    return lotledger.LotLedger.from_rows(stored['lots'].values(), stored['sells'].values(), stored['state'])
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Checks the incremental wash-sale lot ledger against a full order replay.")
+    parser.add_argument('--fixture', help="JSON order-history fixture (default: synthetic)")
+    parser.add_argument('--save-fixture', help="write the synthetic fixture to this JSON file")
+    parser.add_argument('--orders', type=int, default=2000)
+    parser.add_argument('--symbols', type=int, default=25)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--run-every', type=float, default=1.0, help="days between incremental runs")
+    args = parser.parse_args()
+
+    if args.fixture:
+        with open(args.fixture) as f:
+            fixture = json.load(f)
+    else:
+        fixture = synthetic_fixture(args.orders, args.symbols, args.seed)
+        if args.save_fixture:
+            with open(args.save_fixture, 'w') as f:
+                json.dump(fixture, f, indent=1)
+
+    end = max(pd.Timestamp(order['resolved_at']) for order in fixture) + pd.Timedelta(days=1)
+    now = pd.Timestamp(fixture[0]['submitted_at']) + pd.Timedelta(hours=1)
+    ledger = lotledger.LotLedger()
+    stored = {'lots': {}, 'sells': {}, 'state': None}
+    runs = fetched = replayed = failures = 0
+    most_pending = 0
+    while True:
+        after = ledger.fetch_after(None)
+        orders = snapshot(fixture, now, after) + by_id(fixture, now, ledger.pending_ids)
+        fetched += len(orders)
+        _, current = ledger.advance(orders)
+        most_pending = max(most_pending, len(ledger.pending_ids))
+        ledger = through_rows(ledger, stored)
+
+        history = snapshot(fixture, now)
+        replayed += len(history)
+        sells, lots, wash = full_replay(history, now)
+        ledger_sells = [(sell['Order ID'], sell['Symbol'], sell['Quantity Sold'], sell['Sell Price'], sell['Cost Basis per Share'], sell['Gain/Loss'])
+                        for sell in current.sells]
+        ledger_lots = {symbol: [list(lot) for lot in symbol_lots] for symbol, symbol_lots in current.lots.items()}
+        by_symbol = lambda rows: sorted(rows, key=lambda row: row[1])  # stable: each symbol's sells keep their order
+        if by_symbol(ledger_sells) != by_symbol(sells) or ledger_lots != lots or current.wash_sale_symbols(now) != wash:
+            failures += 1
+            print(f"MISMATCH at {now}: sells {len(ledger_sells)} vs {len(sells)}, lots equal {ledger_lots == lots}, "
+                  f"wash sale {sorted(current.wash_sale_symbols(now))} vs {sorted(wash)}")
+        runs += 1
+        if now >= end:
+            break
+        now = min(end, now + pd.Timedelta(days=args.run_every))
+
+    print(f"{runs} incremental runs over {len(fixture)} orders: {fetched} orders fetched in total, "
+          f"against {replayed} for a full replay every run; at most {most_pending} orders pending")
+    print(f"Final state: {len(current.sells)} sells, {sum(len(l) for l in current.lots.values())} open lots, "
+          f"{len(current.wash_sale_symbols(end))} wash-sale symbols")
+    print("Incremental ledger matches the full replay at every run." if not failures else f"{failures} runs did not match the full replay.")
+    raise SystemExit(0 if not failures else 1)
+
+
+if __name__ == "__main__":
+    main()